@@ -10,9 +10,13 @@ from config import Config
 
 from routes.general_routes import api_bp
 from routes.alarm_routes import alarm_bp
+from routes.market_routes import market_bp
 
 from services.maintenance_service import start_scheduler, stop_scheduler, supervisor_check
+from services.alarm_partitions import start_partition_worker, stop_partition_worker
+from utils.notification_outbox import start_outbox_consumers, stop_outbox_consumers
 from utils.notification_service import register_fcm_token, send_test_notification, is_token_registered
+from utils import request_rate
 
 from utils.cache import renew_scheduler_lock, SCHEDULER_LOCK_KEY, SCHEDULER_LOCK_TTL
 
@@ -128,6 +132,15 @@ CORS(app, resources={r"/api/*": {"origins": "*"}})
 
 app.register_blueprint(api_bp)
 app.register_blueprint(alarm_bp)
+app.register_blueprint(market_bp)
+
+
+@app.after_request
+def _count_api_request(response):
+    # Dakikalık istek sayacı: broadcast sonrası açılış dalgası /api/metrics ve günlük raporda
+    if request.path.startswith('/api/'):
+        request_rate.record(request.url_rule.rule if request.url_rule else 'other')
+    return response
 
 _telegram_instance = None
 _telegram_lock = threading.Lock()
@@ -231,6 +244,14 @@ def background_initialization():
     else:
         logger.warning("⚠️ [Firebase] Push notification sistemi devre dışı!")
 
+    # Alarm parçaları scheduler lock'undan bağımsız: her process kendi payını lease'ler
+    if start_partition_worker():
+        logger.info(f"🧩 [Partition] Alarm partition worker başladı (PID: {current_pid})")
+
+    # Bildirim outbox'ı: her process consumer group'a katılır, gönderim scheduler'dan bağımsız
+    if start_outbox_consumers():
+        logger.info(f"📬 [Outbox] Bildirim consumer'ları başladı (PID: {current_pid})")
+
     try:
         redis_client = get_redis_client()
 
@@ -604,6 +625,8 @@ def on_exit():
 
     logger.info("🛑 Uygulama kapatılıyor...")
     stop_scheduler()
+    stop_partition_worker()
+    stop_outbox_consumers()
 
     try:
         from utils.cache import get_redis_client
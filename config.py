@@ -92,6 +92,48 @@ class Config:
     ALARM_CHECK_INTERVAL = 15
     ALARM_TTL = 30 * 24 * 60 * 60
     MAX_ALARMS_PER_USER = 50
+    FCM_TOKEN_MAP_TTL = 90 * 24 * 60 * 60
+    FCM_BATCH_SIZE = 500  # FCM multicast limiti
+    FCM_DISPATCH_THREADS = 8
+    FCM_RATE_PER_SEC = 5000  # FCM HTTP v1 kotası 600k/dk (10k/sn), yarısı — tüm process'ler toplamı (Redis bucket)
+    FCM_RATE_BURST = 1000
+    FCM_RATE_URGENT_RESERVE = 50  # Broadcast'in dokunamadığı, alarm push'larına ayrılan kota
+    FCM_MAX_RETRIES = 4
+    FCM_BACKOFF_BASE = 1.0
+    FCM_BACKOFF_MAX = 60.0
+    FCM_CLEANUP_DELETE_BATCH = 2000  # Geçersiz token'lar bu kadar birikince tek unregister_many
+    FCM_VALIDATE_CYCLE_HOURS = 168  # Tüm token set'i saatlik dilimlerle bu sürede bir kez taranır
+    FCM_VALIDATE_MIN_SLICE = 1000  # Saatlik dilimin alt sınırı (küçük kurulumlarda tur kısa sürer)
+    FCM_TOKEN_STALE_DAYS = 14  # Bu kadar gün görülmeyen / doğrulanmayan token'lar öncelikli kontrol edilir
+    NOTIFY_OUTBOX = os.environ.get("NOTIFY_OUTBOX", "true").lower() == "true"
+    NOTIFY_OUTBOX_GROUP = "notify-senders"
+    NOTIFY_LANE_CONSUMERS = {"alarm": 4, "broadcast": 2}  # process başına, lane'in eşzamanlılık bütçesi
+    NOTIFY_OUTBOX_READ_COUNT = 10
+    NOTIFY_OUTBOX_BLOCK_MS = 5000
+    NOTIFY_OUTBOX_CLAIM_IDLE_MS = 120_000
+    NOTIFY_OUTBOX_MAX_ATTEMPTS = 5
+    NOTIFY_OUTBOX_MAXLEN = 500_000
+    NOTIFY_OUTBOX_DEAD_MAXLEN = 50_000
+    NOTIFY_OUTBOX_JOB_TTL = 7 * 24 * 60 * 60
+    # Broadcast teslimi bu pencereye token hash kovalarıyla yayılır (0: hepsi hemen)
+    NOTIFY_BROADCAST_SPREAD_S = int(os.environ.get("NOTIFY_BROADCAST_SPREAD_S", 15 * 60))
+    NOTIFY_BROADCAST_BUCKETS = 15
+    REQUEST_RATE_FLUSH_S = 5
+    REQUEST_RATE_TTL = 3 * 24 * 60 * 60
+    ALARM_INDEX_MGET_BATCH = 500
+    ALARM_FETCH_BATCH = 300
+    ALARM_RECONCILE_INTERVAL_HOURS = 6
+    ALARM_ENGINE = os.environ.get("ALARM_ENGINE", "zset")  # zset | memory
+    ALARM_SWEEP_ENGINE = os.environ.get("ALARM_SWEEP_ENGINE", "columnar")  # columnar | ALARM_ENGINE
+    ALARM_INDEX_MAX_AGE = 6 * 60 * 60
+    ALARM_CHANGE_LOG_MAXLEN = 10000  # Peer görünümlerin yakalayabileceği son değişiklik sayısı; fazlası rebuild
+    ALARM_PARTITIONS = int(os.environ.get("ALARM_PARTITIONS", 0))  # 0: sadece scheduler process'i
+    ALARM_PARTITION_LEASE_TTL = 30
+    ALARM_PARTITION_POLL_SECONDS = 2
+    ALARM_PARTITION_THREADS = 4
+    ALARM_LATENCY_BUCKETS_MS = (100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000, 300000, 900000)
+    ALARM_LATENCY_WINDOW_HOURS = 24
+    ALARM_LATENCY_PRICE_HISTORY = 32  # Kod başına tutulan son fiyat değişimi (eşiğin ilk geçildiği yayını bulmak için)
 
     CALENDAR_CHECK_HOUR = 8
     CALENDAR_CHECK_MINUTE = 0
@@ -140,7 +182,25 @@ class Config:
         'calendar_notified_events': 'calendar:notified_events',
         'fcm_tokens': 'firebase:fcm_tokens',
         'fcm_last_notification': 'firebase:last_notification',
+        'fcm_token_seen': 'firebase:fcm_token_seen',
+        'fcm_validation': 'firebase:fcm_validation',
+        'fcm_rate_bucket': 'firebase:fcm_rate_bucket',
         'alarm_last_check': 'alarm:price:last_check',
+        'alarm_index_version': 'alarm:index:version',
+        'alarm_index_changes': 'alarm:index:changes',
+        'alarm_users': 'alarm:registry:users',
+        'alarm_zsets': 'alarm:registry:zsets',
+        'alarm_stats': 'alarm:stats:counters',
+        'alarm_users_hll': 'alarm:stats:users',
+        'alarm_partition_nodes': 'alarm:partition:nodes',
+        'alarm_partition_fences': 'alarm:partition:fences',
+        'alarm_latency': 'alarm:latency',
+        'notify_outbox': 'notify:outbox',
+        'notify_outbox_dead': 'notify:outbox:dead',
+        'notify_outbox_jobs': 'notify:outbox:job',
+        'notify_lane_wait': 'notify:outbox:wait',
+        'notify_outbox_delayed': 'notify:outbox:delayed',
+        'notify_last_broadcast': 'notify:outbox:last_broadcast',
         'market_closed_logged': 'market:closed:logged',
         'api_request_stats': 'api:request:stats',
         'circuit_breaker_state': 'circuit:breaker:state',
@@ -155,8 +215,31 @@ class Config:
         'daily_bayram': 'daily:bayram',
         'dynamic_margins': 'dynamic:margins',
         'margin_last_update': 'margin:last_update',
+        'daily_close': 'kurabak:daily_close',
+        'change_baselines': 'kurabak:change_baselines',
+        'market_movers': 'kurabak:market:movers',
+        'price_generation': 'kurabak:generation',
+        'cross_rates': 'kurabak:market:cross_rates',
+        'quote_index': 'kurabak:market:quotes',
+        'price_vectors': 'kurabak:market:vectors',
+        'price_history': 'kurabak:market:price_history',
     }
 
+    CHANGE_BASELINES = ["1d", "1w", "1m", "ytd"]
+    CHANGE_BASELINE_DAYS = {"1w": 7, "1m": 30}
+    DAILY_CLOSE_ARCHIVE_DAYS = 400
+    DAILY_CLOSE_LOOKBACK_DAYS = 7
+
+    MARKET_MOVERS_TOP_K = 5
+
+    # Push data payload'una gömülen fiyat özeti (uygulama açılışta listeyi yeniden çekmesin)
+    PUSH_PRICE_SNAPSHOT = os.environ.get("PUSH_PRICE_SNAPSHOT", "true").lower() == "true"
+    PUSH_SNAPSHOT_TOP_N = 12  # Broadcast'lerde mobil listenin ilk N varlığı
+    PUSH_SNAPSHOT_MAX_BYTES = 1024  # FCM data payload limiti 4 KB; başlık / gövdeye yer kalsın
+    CONVERT_BULK_MAX_PAIRS = 100
+    QUOTES_MAX_CODES = 50
+    PORTFOLIO_MAX_POSITIONS = 200
+
     TREND_HIGH_THRESHOLD = 5.0
     TREND_MEDIUM_THRESHOLD = 1.0
 
@@ -2,12 +2,13 @@ from flask import Blueprint, jsonify, request
 from flask_limiter.util import get_remote_address
 import logging
 import time
-import json
 import hashlib
 
 from config import Config
 from utils.cache import get_cache, set_cache, get_redis_client
-from services.alarm_service import save_fcm_token_mapping, get_all_alarm_keys_safe
+from services.alarm_index import notify_alarm_change, alarm_threshold
+from services import alarm_store
+from utils.token_validator import mark_seen
 
 logger = logging.getLogger(__name__)
 
@@ -41,24 +42,6 @@ def _resolve_user_key(data: dict) -> str:
         return _device_hash(device_id)
     return _token_hash(data['fcm_token'].strip())
 
-def create_alarm_key(user_key: str, currency_code: str, alarm_type: str, profile: str) -> str:
-    return f"alarm:{user_key}:{currency_code}:{alarm_type}:{profile}"
-
-def get_user_alarm_pattern(user_key: str) -> str:
-    return f"alarm:{user_key}:*"
-
-def scan_keys(redis_client, pattern: str) -> list:
-    """redis.keys() yerine SCAN kullan — production'da güvenli."""
-    keys = []
-    cursor = 0
-    while True:
-        cursor, batch = redis_client.scan(cursor, match=pattern, count=100)
-        keys.extend(batch)
-        if cursor == 0:
-            break
-    return keys
-
-
 def validate_alarm_data(data: dict) -> tuple:
     required_fields = ['fcm_token', 'currency_code', 'currency_name', 'target_price', 'alarm_type']
     for field in required_fields:
@@ -125,6 +108,7 @@ def validate_alarm_data(data: dict) -> tuple:
 
 def parse_alarm_data(data: dict) -> dict:
     alarm_mode = data.get('alarm_mode', 'PRICE').strip().upper()
+    created_at = int(time.time())
     obj = {
         'currency_code':     data['currency_code'].strip().upper(),
         'currency_name':     data['currency_name'].strip(),
@@ -133,11 +117,15 @@ def parse_alarm_data(data: dict) -> dict:
         'alarm_type':        data['alarm_type'].strip().upper(),
         'alarm_mode':        alarm_mode,
         'profile':           data.get('profile', 'jeweler').strip().lower(),
-        'created_at':        int(time.time()),
+        'created_at':        created_at,
+        'expires_at':        created_at + Config.ALARM_TTL,
         'is_active':         True,
         'percent_value':     float(data['percent_value'])              if alarm_mode == 'PERCENT' else None,
         'percent_direction': data['percent_direction'].strip().upper() if alarm_mode == 'PERCENT' else None,
     }
+    # PERCENT alarmları da mutlak eşikle saklanır: index / ZSET / kolon tablosu tek kuralla çalışır
+    threshold = alarm_threshold(obj)
+    obj['trigger_price'] = round(threshold[1], 6) if threshold else None
     return obj
 
 
@@ -169,17 +157,17 @@ def create_alarm():
         if not redis_client:
             return _no_redis()
 
-        user_alarms = scan_keys(redis_client, get_user_alarm_pattern(user_key))
-        if len(user_alarms) >= Config.MAX_ALARMS_PER_USER:
+        # Token mapping, limit, çakışma ve yazma tek round trip
+        alarm_obj = parse_alarm_data(data)
+        outcome   = alarm_store.create_alarm(redis_client, user_key, alarm_obj, fcm_token)
+
+        if outcome == 'limit':
             return jsonify({
                 "success": False,
                 "message": f"Maksimum {Config.MAX_ALARMS_PER_USER} alarm kurabilirsiniz"
             }), 400
 
-        alarm_key = create_alarm_key(user_key, currency_code, alarm_type, profile)
-        save_fcm_token_mapping(fcm_token, user_key)
-
-        if redis_client.exists(alarm_key):
+        if outcome == 'exists':
             alarm_type_tr = "yükseliş" if alarm_type == "HIGH" else "düşüş"
             profile_tr    = "ham" if profile == "raw" else "kuyumcu"
             return jsonify({
@@ -187,8 +175,13 @@ def create_alarm():
                 "message": f"Bu varlık için {profile_tr} fiyatında zaten bir {alarm_type_tr} alarmınız var"
             }), 409
 
-        alarm_obj = parse_alarm_data(data)
-        redis_client.setex(alarm_key, Config.ALARM_TTL, json.dumps(alarm_obj))
+        if outcome != 'created':
+            return jsonify({"success": False, "message": "Geçersiz alarm verisi"}), 400
+
+        mark_seen(redis_client, [fcm_token])
+
+        alarm_id = alarm_store.make_member(user_key, alarm_store.alarm_field(currency_code, alarm_type, profile))
+        notify_alarm_change(redis_client, upserts={alarm_id: alarm_obj})
 
         logger.info(
             f"✅ [ALARM] Oluşturuldu: {currency_code} ({alarm_type}, "
@@ -199,7 +192,7 @@ def create_alarm():
             "success": True,
             "message": "Alarm başarıyla oluşturuldu",
             "data": {
-                "alarm_id":          alarm_key,
+                "alarm_id":          alarm_id,
                 "currency_code":     currency_code,
                 "currency_name":     alarm_obj['currency_name'],
                 "target_price":      alarm_obj['target_price'],
@@ -230,21 +223,8 @@ def list_alarms():
         if not redis_client:
             return _no_redis()
 
-        user_key   = _resolve_user_key(data)
-        alarm_keys = scan_keys(redis_client, get_user_alarm_pattern(user_key))
-        alarms     = []
-
-        for key in alarm_keys:
-            try:
-                if isinstance(key, bytes):
-                    key = key.decode('utf-8')
-                raw = redis_client.get(key)
-                if raw:
-                    if isinstance(raw, bytes):
-                        raw = raw.decode('utf-8')
-                    alarms.append(json.loads(raw))
-            except Exception as e:
-                logger.warning(f"⚠️ [ALARM] Parse hatası ({key}): {e}")
+        user_key = _resolve_user_key(data)
+        alarms   = alarm_store.get_user_alarms(redis_client, user_key)
 
         alarms.sort(key=lambda x: x.get('created_at', 0), reverse=True)
         logger.info(f"📋 [ALARM] Liste çekildi: {len(alarms)} alarm")
@@ -281,11 +261,11 @@ def delete_alarm():
         if not redis_client:
             return _no_redis()
 
-        alarm_key = create_alarm_key(user_key, currency_code, alarm_type, profile)
-        if not redis_client.exists(alarm_key):
+        field = alarm_store.alarm_field(currency_code, alarm_type, profile)
+        if not alarm_store.remove_fields(redis_client, user_key, [field])[0]:
             return jsonify({"success": False, "message": "Alarm bulunamadı"}), 404
 
-        redis_client.delete(alarm_key)
+        notify_alarm_change(redis_client, removals=[alarm_store.make_member(user_key, field)])
         logger.info(f"🗑️ [ALARM] Silindi: {currency_code} ({alarm_type}, {profile})")
 
         return jsonify({
@@ -320,15 +300,8 @@ def sync_alarms():
         if not redis_client:
             return _no_redis()
 
-        save_fcm_token_mapping(fcm_token, user_key)
-
-        old_keys = scan_keys(redis_client, get_user_alarm_pattern(user_key))
-        if old_keys:
-            redis_client.delete(*old_keys)
-            logger.info(f"🧹 [ALARM] {len(old_keys)} eski alarm temizlendi")
-
-        synced_count = 0
         failed_count = 0
+        alarm_objs   = []
 
         for alarm in alarms:
             try:
@@ -338,27 +311,31 @@ def sync_alarms():
                     logger.warning(f"⚠️ [SYNC] Geçersiz alarm: {error_msg}")
                     failed_count += 1
                     continue
-
-                alarm_obj = parse_alarm_data(alarm)
-                alarm_key = create_alarm_key(
-                    user_key,
-                    alarm_obj['currency_code'],
-                    alarm_obj['alarm_type'],
-                    alarm_obj['profile']
-                )
-                redis_client.setex(alarm_key, Config.ALARM_TTL, json.dumps(alarm_obj))
-                synced_count += 1
+                alarm_objs.append(parse_alarm_data(alarm))
 
             except Exception as e:
-                logger.error(f"❌ [SYNC] Alarm kayıt hatası: {e}")
+                logger.error(f"❌ [SYNC] Alarm parse hatası: {e}")
                 failed_count += 1
 
-        logger.info(f"✅ [ALARM] Sync: {synced_count} başarılı, {failed_count} başarısız")
+        # Eski / yeni set farkı + token mapping tek Lua çağrısında
+        result        = alarm_store.sync_user_alarms(redis_client, user_key, alarm_objs, fcm_token)
+        removed       = result['removed']
+        synced_count  = len(result['written'])
+        failed_count += result['invalid']
+
+        notify_alarm_change(redis_client, upserts=result['written'], removals=removed)
+        mark_seen(redis_client, [fcm_token])
+
+        logger.info(
+            f"✅ [ALARM] Sync: {synced_count} başarılı ({result['added']} yeni, {result['changed']} değişen, "
+            f"{result['kept']} aynı), {len(removed)} kaldırıldı, {failed_count} başarısız"
+        )
 
         return jsonify({
             "success": True,
             "message": "Alarmlar senkronize edildi",
-            "data": {"synced": synced_count, "failed": failed_count, "total": len(alarms)}
+            "data": {"synced": synced_count, "failed": failed_count, "total": len(alarms),
+                     "added": result['added'], "changed": result['changed'], "removed": len(removed)}
         }), 200
 
     except Exception as e:
@@ -379,11 +356,11 @@ def delete_all_alarms():
             return _no_redis()
 
         user_key      = _resolve_user_key(data)
-        keys          = scan_keys(redis_client, get_user_alarm_pattern(user_key))
-        deleted_count = 0
+        removed       = alarm_store.delete_user_alarms(redis_client, user_key)
+        deleted_count = len(removed)
 
-        if keys:
-            deleted_count = redis_client.delete(*keys)
+        if removed:
+            notify_alarm_change(redis_client, removals=removed)
 
         logger.info(f"🗑️ [ALARM] Toplu silme: {deleted_count} alarm")
 
@@ -406,40 +383,15 @@ def alarm_stats():
         if not redis_client:
             return _no_redis()
 
-        all_keys = get_all_alarm_keys_safe(redis_client)
-
-        unique_users  = set()
-        high_count    = 0
-        low_count     = 0
-        raw_count     = 0
-        jeweler_count = 0
-
-        for key in all_keys:
-            try:
-                if isinstance(key, bytes):
-                    key = key.decode('utf-8')
-                parts = key.split(':')
-                if len(parts) >= 4:
-                    unique_users.add(parts[1])
-                    if parts[3] == 'HIGH':
-                        high_count += 1
-                    elif parts[3] == 'LOW':
-                        low_count += 1
-                if len(parts) >= 5:
-                    if parts[4] == 'raw':
-                        raw_count += 1
-                    elif parts[4] == 'jeweler':
-                        jeweler_count += 1
-            except Exception:
-                continue
+        stats = alarm_store.get_store_stats(redis_client)
 
         return jsonify({
             "success": True,
             "data": {
-                "total_alarms": len(all_keys),
-                "unique_users": len(unique_users),
-                "alarm_types":  {"HIGH": high_count, "LOW": low_count},
-                "profiles":     {"raw": raw_count, "jeweler": jeweler_count},
+                "total_alarms": stats["total_alarms"],
+                "unique_users": stats["unique_users"],
+                "alarm_types":  stats["alarm_types"],
+                "profiles":     stats["profiles"],
                 "max_per_user": Config.MAX_ALARMS_PER_USER,
                 "ttl_days":     Config.ALARM_TTL // (24 * 60 * 60)
             }
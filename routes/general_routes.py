@@ -134,6 +134,23 @@ def get_data_guaranteed(cache_key):
     return None
 
 
+def select_baselines(data_list: list) -> list:
+    """
+    ?baselines=1w,1m → her item'ın 'changes' alanı sadece istenen baseline'lara indirgenir.
+    Bilinmeyen değerler atlanır; parametre yoksa veya hiçbiri geçerli değilse (profile'daki gibi)
+    varsayılan: worker'ın ürettiği liste olduğu gibi döner.
+    """
+    requested = {b.strip() for b in request.args.get('baselines', '').lower().split(',')}
+    wanted    = [name for name in Config.CHANGE_BASELINES if name in requested]
+    if not wanted:
+        return data_list
+
+    return [
+        {**item, 'changes': {name: (item.get('changes') or {}).get(name) for name in wanted}}
+        for item in data_list
+    ]
+
+
 def check_user_agent():
     user_agent        = request.headers.get('User-Agent', 'Unknown')
     suspicious_agents = ['curl', 'wget', 'python-requests', 'scrapy']
@@ -183,7 +200,7 @@ def get_all_currencies():
                 "Veriler hazırlanıyor, lütfen 1-2 dakika sonra tekrar deneyin."
             )
 
-        data_list  = result.get('data', [])
+        data_list  = select_baselines(result.get('data', []))
         update_date = result.get('update_date')
         status      = result.get('status', 'OPEN')
         market_msg  = result.get('market_msg')
@@ -235,7 +252,7 @@ def get_all_golds():
                 "Veriler hazırlanıyor, lütfen 1-2 dakika sonra tekrar deneyin."
             )
 
-        data_list = result.get('data', [])
+        data_list = select_baselines(result.get('data', []))
         return create_response(
             data_list,
             200,
@@ -273,7 +290,7 @@ def get_all_silvers():
                 "Veriler hazırlanıyor, lütfen 1-2 dakika sonra tekrar deneyin."
             )
 
-        data_list = result.get('data', [])
+        data_list = select_baselines(result.get('data', []))
         return create_response(
             data_list,
             200,
@@ -559,6 +576,8 @@ def get_metrics():
     try:
         from services.financial_service import get_service_metrics
         from services.maintenance_service import get_scheduler_status
+        from services.alarm_latency import get_latency_report
+        from utils.notification_outbox import get_last_broadcast_status
 
         metrics   = get_service_metrics()
         scheduler = get_scheduler_status()
@@ -566,6 +585,8 @@ def get_metrics():
         return create_response(
             {
                 'api_metrics':      metrics,
+                'alarm_latency':    get_latency_report(),
+                'last_broadcast':   get_last_broadcast_status(),
                 'scheduler_status': scheduler,
                 'environment':      Config.ENVIRONMENT,
             },
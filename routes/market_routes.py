@@ -0,0 +1,283 @@
+"""
+Market Routes - Worker'ın önceden hesapladığı piyasa görünümleri
+==================================================
+✅ 📈 Top movers + piyasa özeti (pre-serialized cache)
+✅ 💱 Çapraz kur çevirici (tekli + toplu, N×N matris lookup)
+✅ 🔎 Tekli / toplu quote (code → item index, fragment'lar yeniden encode edilmez)
+✅ 💼 Portföy değerleme (fiyat / snapshot vektörleri ile dot product)
+"""
+from flask import Blueprint, request, current_app
+from datetime import datetime
+import json
+import logging
+import math
+
+from config import Config
+from services.market_service import (
+    get_market_movers_raw, get_cross_rates, convert_amount, get_quote_index, normalize_code,
+    get_price_vectors, value_portfolio
+)
+
+# ======================================
+# 🔥 S15 FIX: Limiter general_routes'tan import edildi (tek instance)
+# ======================================
+from routes.general_routes import limiter, create_response, check_user_agent, track_online_user
+
+logger = logging.getLogger(__name__)
+
+market_bp = Blueprint('market', __name__, url_prefix='/api')
+
+
+def _resolve_profile() -> str:
+    profile = request.args.get('profile', Config.DEFAULT_PRICE_PROFILE).lower()
+    if profile not in ["raw", "jeweler"]:
+        profile = "jeweler"
+    return profile
+
+
+@market_bp.route('/market/movers', methods=['GET'])
+@limiter.limit("60 per minute")
+def get_market_movers():
+    check_user_agent()
+    track_online_user()
+
+    try:
+        profile = _resolve_profile()
+        raw     = get_market_movers_raw(profile)
+
+        if not raw:
+            return create_response(
+                {},
+                503,
+                "Veriler hazırlanıyor, lütfen 1-2 dakika sonra tekrar deneyin."
+            )
+
+        # Worker zarfı zaten serialize etti, tekrar encode etme
+        return current_app.response_class(raw, status=200, mimetype='application/json')
+
+    except Exception as e:
+        logger.error(f"Market Movers Error: {e}")
+        return create_response({}, 500, "Sunucu hatası")
+
+
+def _parse_amount(value) -> float:
+    amount = float(value if value is not None else 1)
+    if not math.isfinite(amount) or amount < 0:
+        raise ValueError("invalid amount")
+    return amount
+
+
+@market_bp.route('/convert', methods=['GET'])
+@limiter.limit("300 per minute")
+def convert():
+    check_user_agent()
+
+    try:
+        from_code = request.args.get('from', '').strip()
+        to_code   = request.args.get('to', '').strip()
+        if not from_code or not to_code:
+            return create_response(None, 400, "from ve to parametreleri gerekli")
+
+        try:
+            amount = _parse_amount(request.args.get('amount'))
+        except (ValueError, TypeError):
+            return create_response(None, 400, "Geçersiz amount formatı")
+
+        profile = _resolve_profile()
+        view    = get_cross_rates(profile)
+        if not view:
+            return create_response(None, 503, "Veriler hazırlanıyor, lütfen 1-2 dakika sonra tekrar deneyin.")
+
+        result = convert_amount(view, from_code, to_code, amount)
+        if not result:
+            return create_response(None, 404, f"Desteklenmeyen kod: {from_code} → {to_code}")
+
+        return create_response(
+            result,
+            200,
+            f"Çeviri yapıldı ({profile})",
+            {'profile': profile, 'generation': view.get('generation'), 'last_update': view.get('last_update')}
+        )
+
+    except Exception as e:
+        logger.error(f"Convert Error: {e}")
+        return create_response(None, 500, "Sunucu hatası")
+
+
+@market_bp.route('/convert/bulk', methods=['POST'])
+@limiter.limit("60 per minute")
+def convert_bulk():
+    check_user_agent()
+
+    try:
+        data = request.get_json(silent=True)
+        if not data or not isinstance(data.get('pairs'), list):
+            return create_response(None, 400, "pairs listesi gerekli! Body: {\"pairs\": [{\"from\": \"USD\", \"to\": \"EUR\", \"amount\": 100}]}")
+
+        pairs = data['pairs']
+        if len(pairs) > Config.CONVERT_BULK_MAX_PAIRS:
+            return create_response(None, 400, f"Maksimum {Config.CONVERT_BULK_MAX_PAIRS} çift gönderilebilir")
+
+        profile = str(data.get('profile', Config.DEFAULT_PRICE_PROFILE)).lower()
+        if profile not in ["raw", "jeweler"]:
+            profile = "jeweler"
+
+        view = get_cross_rates(profile)
+        if not view:
+            return create_response(None, 503, "Veriler hazırlanıyor, lütfen 1-2 dakika sonra tekrar deneyin.")
+
+        results = []
+        failed  = 0
+        for pair in pairs:
+            try:
+                result = convert_amount(view, pair.get('from', ''), pair.get('to', ''), _parse_amount(pair.get('amount')))
+            except (ValueError, TypeError, AttributeError):
+                result = None
+            if result is None:
+                failed += 1
+                results.append({"from": pair.get('from') if isinstance(pair, dict) else None,
+                                "to":   pair.get('to')   if isinstance(pair, dict) else None,
+                                "error": "Geçersiz çift"})
+            else:
+                results.append(result)
+
+        return create_response(
+            results,
+            200,
+            f"{len(results) - failed} çeviri yapıldı ({profile})",
+            {'profile': profile, 'count': len(results), 'failed': failed,
+             'generation': view.get('generation'), 'last_update': view.get('last_update')}
+        )
+
+    except Exception as e:
+        logger.error(f"Convert Bulk Error: {e}")
+        return create_response(None, 500, "Sunucu hatası")
+
+
+def _raw_envelope(data_json: str, meta: dict, message: str) -> str:
+    """create_response ile aynı zarf; data kısmı hazır JSON fragment olarak eklenir."""
+    return (
+        '{"success": true, "data": ' + data_json +
+        ', "meta": ' + json.dumps(meta) +
+        ', "timestamp": ' + json.dumps(datetime.now().isoformat()) +
+        ', "message": ' + json.dumps(message) + '}'
+    )
+
+
+@market_bp.route('/quote/<code>', methods=['GET'])
+@limiter.limit("300 per minute")
+def get_quote(code):
+    check_user_agent()
+
+    try:
+        profile = _resolve_profile()
+        index   = get_quote_index(profile)
+        if not index:
+            return create_response(None, 503, "Veriler hazırlanıyor, lütfen 1-2 dakika sonra tekrar deneyin.")
+
+        normalized = normalize_code(code)
+        fragment   = index["fragments"].get(normalized)
+        if fragment is None:
+            return create_response(None, 404, f"Bilinmeyen kod: {code}")
+
+        body = _raw_envelope(
+            fragment,
+            {'profile': profile, 'generation': index["generation"]},
+            f"{normalized} getirildi ({profile})"
+        )
+        return current_app.response_class(body, status=200, mimetype='application/json')
+
+    except Exception as e:
+        logger.error(f"Quote Error: {e}")
+        return create_response(None, 500, "Sunucu hatası")
+
+
+@market_bp.route('/quotes', methods=['GET'])
+@limiter.limit("120 per minute")
+def get_quotes():
+    check_user_agent()
+
+    try:
+        raw_codes = [c for c in request.args.get('codes', '').split(',') if c.strip()]
+        if not raw_codes:
+            return create_response(None, 400, "codes parametresi gerekli (örn: codes=USD,GRA,AG)")
+        if len(raw_codes) > Config.QUOTES_MAX_CODES:
+            return create_response(None, 400, f"Maksimum {Config.QUOTES_MAX_CODES} kod gönderilebilir")
+
+        profile = _resolve_profile()
+        index   = get_quote_index(profile)
+        if not index:
+            return create_response(None, 503, "Veriler hazırlanıyor, lütfen 1-2 dakika sonra tekrar deneyin.")
+
+        fragments = index["fragments"]
+        parts     = []
+        missing   = []
+        seen      = set()
+        for raw_code in raw_codes:
+            code = normalize_code(raw_code)
+            if code in seen:
+                continue
+            seen.add(code)
+            fragment = fragments.get(code)
+            if fragment is None:
+                missing.append(raw_code.strip())
+            else:
+                parts.append(json.dumps(code) + ': ' + fragment)
+
+        body = _raw_envelope(
+            '{' + ', '.join(parts) + '}',
+            {'profile': profile, 'generation': index["generation"], 'count': len(parts), 'missing': missing},
+            f"{len(parts)} fiyat getirildi ({profile})"
+        )
+        return current_app.response_class(body, status=200, mimetype='application/json')
+
+    except Exception as e:
+        logger.error(f"Quotes Error: {e}")
+        return create_response(None, 500, "Sunucu hatası")
+
+
+@market_bp.route('/portfolio/value', methods=['POST'])
+@limiter.limit("60 per minute")
+def portfolio_value():
+    check_user_agent()
+
+    try:
+        data = request.get_json(silent=True)
+        if not data or not isinstance(data.get('holdings'), list):
+            return create_response(None, 400, "holdings listesi gerekli! Body: {\"holdings\": [{\"code\": \"USD\", \"quantity\": 100}], \"profile\": \"jeweler\"}")
+
+        holdings = data['holdings']
+        if len(holdings) > Config.PORTFOLIO_MAX_POSITIONS:
+            return create_response(None, 400, f"Maksimum {Config.PORTFOLIO_MAX_POSITIONS} pozisyon gönderilebilir")
+
+        profile = str(data.get('profile', Config.DEFAULT_PRICE_PROFILE)).lower()
+        if profile not in ["raw", "jeweler"]:
+            profile = "jeweler"
+
+        parsed = []
+        for holding in holdings:
+            try:
+                quantity = float(holding.get('quantity'))
+                if not math.isfinite(quantity) or quantity < 0:
+                    raise ValueError("invalid quantity")
+                parsed.append((str(holding.get('code', '')), quantity))
+            except (ValueError, TypeError, AttributeError):
+                return create_response(None, 400, f"Geçersiz pozisyon: {holding}")
+
+        view = get_price_vectors(profile)
+        if not view:
+            return create_response(None, 503, "Veriler hazırlanıyor, lütfen 1-2 dakika sonra tekrar deneyin.")
+
+        result = value_portfolio(view, parsed)
+
+        return create_response(
+            result,
+            200,
+            f"Portföy değerlendi ({profile})",
+            {'profile': profile, 'count': len(result['positions']), 'unknown': len(result['unknown']),
+             'generation': view.get('generation'), 'last_update': view.get('last_update')}
+        )
+
+    except Exception as e:
+        logger.error(f"Portfolio Value Error: {e}")
+        return create_response(None, 500, "Sunucu hatası")
@@ -0,0 +1,384 @@
+"""
+Alarm Benchmark - Sentetik alarm yükü + gün boyu fiyat replay'i
+================================================================
+✅ Yerel (boş, ayrılmış DB) Redis'e gerçekçi dağılımla alarm yükler:
+   kullanıcı başına alarm sayısı geometrik, kod popülerliği ağırlıklı (USD/EUR/GRA önde),
+   iki profil, PRICE + PERCENT, eşikler güncel fiyat etrafında
+✅ Bir günlük fiyat akışını (kayıtlı JSONL veya sentetik random walk) tick tick oynatır
+✅ Motor başına: tick gecikmesi (p50/p95/p99), Redis komut sayısı (INFO commandstats),
+   round trip, Redis / process belleği, saniyede tetik
+✅ Sonuç JSON: motor implementasyonlarını karşılaştırmak için
+
+Kullanım:
+    python -m services.alarm_benchmark --redis-url redis://localhost:6379/15 \\
+        --alarms 10000,100000 --engines zset,memory,columnar [--day day.jsonl] [--out results.json]
+
+Gün dosyası (JSONL, her satır bir fiyat seti):
+    {"t": 0, "prices": {"USD:raw": 41.02, "USD:jeweler": 41.65, ...}}
+
+Benchmark DB'si her motor için FLUSHDB edilir; dolu DB'de --force olmadan çalışmaz.
+"""
+
+import json
+import logging
+import math
+import os
+import platform
+import random
+import statistics
+import time
+from typing import Dict, List, Tuple
+
+import redis
+
+from config import Config
+
+logger = logging.getLogger("KuraBak.AlarmBenchmark")
+
+ENGINES = ("zset", "memory", "columnar")
+
+# Yaklaşık TL fiyatları (raw); jeweler ~%1.5 üstü
+_BASE_PRICES = {
+    "USD": 41.0, "EUR": 48.0, "GBP": 55.0, "CHF": 51.0, "CAD": 30.0, "AUD": 27.0, "RUB": 0.5,
+    "SAR": 11.0, "AED": 11.2, "KWD": 134.0, "BHD": 109.0, "OMR": 107.0, "QAR": 11.3,
+    "CNY": 5.7, "SEK": 4.3, "NOK": 4.1, "PLN": 11.2, "RON": 9.4, "CZK": 1.95, "EGP": 0.85,
+    "RSD": 0.41, "HUF": 0.12, "BAM": 24.5,
+    "GRA": 5600.0, "C22": 5200.0, "YAR": 9300.0, "TAM": 37000.0, "CUM": 37500.0, "ATA": 38000.0,
+    "AG": 70.0,
+}
+
+# Alarm kurulma ağırlıkları; listede olmayan kodlar 0.5
+_POPULARITY = {"USD": 30, "GRA": 20, "EUR": 18, "C22": 6, "ATA": 5, "AG": 5, "CUM": 4, "YAR": 4, "GBP": 4, "TAM": 3}
+
+_JEWELER_MARKUP = 1.015
+
+
+def benchmark_codes() -> List[str]:
+    return list(Config.MOBILE_CURRENCIES) + list(Config.MOBILE_GOLDS) + [Config.MOBILE_SILVER]
+
+
+def _is_gold(code: str) -> bool:
+    return code in Config.MOBILE_GOLDS or code == Config.MOBILE_SILVER
+
+
+# ─── Fiyat günü ───────────────────────────────────────────────────────────────
+
+def synthesize_day(ticks: int = 1440, seed: int = 42) -> List[Dict[Tuple[str, str], float]]:
+    """Dakikalık random walk; her tick'te kodların ~%60'ı güncellenir (egzotik kurlar seyrek)."""
+    rng   = random.Random(seed)
+    raw   = {code: _BASE_PRICES.get(code, 100.0) for code in benchmark_codes()}
+    day   = []
+    for _ in range(ticks):
+        for code in raw:
+            if rng.random() < 0.6:
+                vol = 0.0006 if _is_gold(code) else 0.0003
+                raw[code] *= math.exp(rng.gauss(0, vol))
+        prices = {}
+        for code, price in raw.items():
+            prices[(code, "raw")]     = round(price, 4)
+            prices[(code, "jeweler")] = round(price * _JEWELER_MARKUP, 4)
+        day.append(prices)
+    return day
+
+
+def load_day(path: str) -> List[Dict[Tuple[str, str], float]]:
+    day = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            prices = {}
+            for key, price in json.loads(line)["prices"].items():
+                code, _, profile = key.partition(':')
+                prices[(code, profile)] = float(price)
+            day.append(prices)
+    return day
+
+
+def save_day(day: List[Dict[Tuple[str, str], float]], path: str):
+    with open(path, "w", encoding="utf-8") as f:
+        for t, prices in enumerate(day):
+            f.write(json.dumps({"t": t * 60, "prices": {f"{c}:{p}": v for (c, p), v in prices.items()}}) + "\n")
+
+
+# ─── Alarm yükü ───────────────────────────────────────────────────────────────
+
+def synthesize_alarms(alarm_count: int, opening: Dict[Tuple[str, str], float], seed: int = 42):
+    """(user_key, alarm_obj) üretir; kullanıcı başına alarm ~ geometrik (ort. 3, en fazla MAX_ALARMS_PER_USER)."""
+    from services.alarm_index import alarm_threshold
+
+    rng     = random.Random(seed)
+    codes   = [code for code in benchmark_codes() if (code, "raw") in opening and (code, "jeweler") in opening]
+    weights = [_POPULARITY.get(code, 0.5) for code in codes]
+    now     = int(time.time())
+    made    = 0
+    user_no = 0
+
+    while made < alarm_count:
+        user_key = f"bench{user_no:08x}"
+        user_no += 1
+        wanted   = min(1 + int(rng.expovariate(1 / 2)), Config.MAX_ALARMS_PER_USER, alarm_count - made)
+        seen     = set()
+
+        for _ in range(wanted * 3):
+            if len(seen) >= wanted:
+                break
+            code    = rng.choices(codes, weights)[0]
+            profile = "jeweler" if rng.random() < 0.7 else "raw"
+            price   = opening[(code, profile)]
+            created = now - rng.randint(0, Config.ALARM_TTL // 2)
+
+            if rng.random() < 0.8:
+                alarm_type = rng.choice(("HIGH", "LOW"))
+                offset     = abs(rng.gauss(0, 0.03)) + 0.0005
+                alarm = {
+                    "alarm_mode":   "PRICE",
+                    "alarm_type":   alarm_type,
+                    "target_price": round(price * (1 + offset if alarm_type == "HIGH" else 1 - offset), 4),
+                    "start_price":  price,
+                    "percent_value": None, "percent_direction": None,
+                }
+            else:
+                direction = rng.choice(("UP", "DOWN"))
+                alarm = {
+                    "alarm_mode":        "PERCENT",
+                    "alarm_type":        "HIGH" if direction == "UP" else "LOW",
+                    "target_price":      price,
+                    "start_price":       round(price * (1 + rng.gauss(0, 0.005)), 4),
+                    "percent_value":     rng.choice((1.0, 2.0, 3.0, 5.0, 10.0)),
+                    "percent_direction": direction,
+                }
+
+            field = (code, alarm["alarm_type"], profile)
+            if field in seen:
+                continue
+            seen.add(field)
+
+            alarm.update({
+                "currency_code": code, "currency_name": code, "profile": profile,
+                "created_at": created, "expires_at": created + Config.ALARM_TTL, "is_active": True,
+            })
+            alarm["trigger_price"] = round(alarm_threshold(alarm)[1], 6)
+            made += 1
+            yield user_key, alarm
+
+
+def populate(redis_client, alarm_count: int, opening: Dict[Tuple[str, str], float], seed: int = 42) -> dict:
+    """Store'a pipeline ile yazar (route'ların yazdığı format), sonra sayaçlar bir kez kurulur."""
+    from services import alarm_store
+
+    start = time.perf_counter()
+    users = set()
+    pipe  = redis_client.pipeline(transaction=False)
+    queued = 0
+    for user_key, alarm_obj in synthesize_alarms(alarm_count, opening, seed):
+        alarm_store._queue_add(pipe, user_key, alarm_obj)
+        if user_key not in users:
+            users.add(user_key)
+            pipe.setex(alarm_store.token_map_key(user_key), Config.FCM_TOKEN_MAP_TTL, f"bench-token-{user_key}")
+        queued += 1
+        if queued % 5000 == 0:
+            pipe.execute()
+    pipe.execute()
+    alarm_store.rebuild_stats(redis_client)
+
+    return {"users": len(users), "populate_s": round(time.perf_counter() - start, 2)}
+
+
+# ─── Ölçüm ────────────────────────────────────────────────────────────────────
+
+class _CountingConnection(redis.Connection):
+    """Her gönderilen paket (tekil komut, pipeline, script) bir round trip."""
+
+    round_trips = 0
+
+    def send_packed_command(self, command, check_health=True):
+        _CountingConnection.round_trips += 1
+        return super().send_packed_command(command, check_health)
+
+
+def _command_calls(redis_client) -> Dict[str, int]:
+    stats = redis_client.info("commandstats")
+    return {name.replace("cmdstat_", ""): int(v.get("calls", 0)) for name, v in stats.items()}
+
+
+def _rss_bytes() -> int:
+    try:
+        import psutil
+        return psutil.Process(os.getpid()).memory_info().rss
+    except Exception:
+        return 0
+
+
+def _percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(int(round(q * (len(ordered) - 1))), len(ordered) - 1)]
+
+
+def run_engine(redis_client, engine: str, alarm_count: int, day, seed: int = 42) -> dict:
+    """Boş DB'ye yükle, günü oynat. zset/memory: değişen fiyatlar (event), columnar: her tick tam tarama."""
+    from services import alarm_service
+    from services.alarm_index import alarm_index
+    from services.alarm_table import alarm_table
+
+    redis_client.flushdb()
+    loaded     = populate(redis_client, alarm_count, day[0], seed)
+    redis_mem  = int(redis_client.info("memory").get("used_memory", 0))
+
+    Config.ALARM_ENGINE       = "memory" if engine == "memory" else "zset"
+    Config.ALARM_SWEEP_ENGINE = "columnar" if engine == "columnar" else Config.ALARM_ENGINE
+    Config.NOTIFY_OUTBOX      = False  # Gönderim sayılır, outbox'a yazılmaz
+
+    rss_before = _rss_bytes()
+    view_start = time.perf_counter()
+    if engine == "memory":
+        alarm_index.rebuild(redis_client)
+    elif engine == "columnar":
+        alarm_table.rebuild(redis_client)
+    view_build_s = time.perf_counter() - view_start
+    view_rss     = _rss_bytes() - rss_before
+
+    sent     = []
+    current  = {}
+    patched  = {
+        "get_redis_client":              lambda: redis_client,
+        "send_alarm_notification_v2":    lambda token, alarm_obj, price, **timing: sent.append(price) or True,
+        "build_price_map":               lambda: dict(current),
+        "_is_monday_transition_window":  lambda: False,
+    }
+    originals = {name: getattr(alarm_service, name) for name in patched}
+    for name, fn in patched.items():
+        setattr(alarm_service, name, fn)
+
+    latencies   = []
+    calls_start = _command_calls(redis_client)
+    trips_start = _CountingConnection.round_trips
+    try:
+        previous = {}
+        for prices in day:
+            current.clear()
+            current.update(prices)
+            tick_start = time.perf_counter()
+            if engine == "columnar":
+                alarm_service.check_all_alarms()
+            else:
+                moved = {key: price for key, price in prices.items() if previous.get(key) != price}
+                if moved:
+                    alarm_service.check_all_alarms(prices=moved)
+            latencies.append((time.perf_counter() - tick_start) * 1000)
+            previous = prices
+    finally:
+        for name, fn in originals.items():
+            setattr(alarm_service, name, fn)
+
+    trips     = _CountingConnection.round_trips - trips_start
+    calls_end = _command_calls(redis_client)
+    ops       = {cmd: calls_end.get(cmd, 0) - calls_start.get(cmd, 0) for cmd in calls_end}
+    ops.pop("info", None)
+    ops       = {cmd: n for cmd, n in ops.items() if n > 0}
+    eval_s    = sum(latencies) / 1000
+    ticks     = len(day)
+
+    return {
+        "engine":              engine,
+        "alarms":              alarm_count,
+        "users":               loaded["users"],
+        "ticks":               ticks,
+        "populate_s":          loaded["populate_s"],
+        "redis_memory_bytes":  redis_mem,
+        "bytes_per_alarm":     round(redis_mem / alarm_count, 1) if alarm_count else 0,
+        "view_build_s":        round(view_build_s, 3),
+        "view_rss_bytes":      view_rss,
+        "latency_ms": {
+            "mean": round(statistics.mean(latencies), 3) if latencies else 0,
+            "p50":  round(_percentile(latencies, 0.50), 3),
+            "p95":  round(_percentile(latencies, 0.95), 3),
+            "p99":  round(_percentile(latencies, 0.99), 3),
+            "max":  round(max(latencies), 3) if latencies else 0,
+        },
+        "triggered":           len(sent),
+        "triggers_per_sec":    round(len(sent) / eval_s, 1) if eval_s else 0,
+        "redis_ops_total":     sum(ops.values()),
+        "redis_ops_per_run":   round(sum(ops.values()) / ticks, 1) if ticks else 0,
+        "round_trips_per_run": round(trips / ticks, 1) if ticks else 0,
+        "top_commands":        dict(sorted(ops.items(), key=lambda kv: -kv[1])[:10]),
+    }
+
+
+def run_suite(redis_url: str, alarm_counts: List[int], engines: List[str], day, seed: int = 42,
+              force: bool = False) -> dict:
+    pool   = redis.ConnectionPool.from_url(redis_url, decode_responses=True, connection_class=_CountingConnection)
+    client = redis.Redis(connection_pool=pool)
+
+    if client.dbsize() and not force:
+        raise RuntimeError(f"{redis_url} boş değil; benchmark DB'yi FLUSHDB eder (--force ile zorla)")
+
+    try:
+        import numpy
+        numpy_version = numpy.__version__
+    except ImportError:
+        numpy_version = None
+
+    runs = []
+    for alarm_count in alarm_counts:
+        for engine in engines:
+            logger.info(f"⏱️ [BENCH] {engine} / {alarm_count} alarm / {len(day)} tick...")
+            result = run_engine(client, engine, alarm_count, day, seed)
+            logger.info(
+                f"   p50 {result['latency_ms']['p50']}ms, p99 {result['latency_ms']['p99']}ms, "
+                f"{result['redis_ops_per_run']} op/tick, {result['triggered']} tetik"
+            )
+            runs.append(result)
+    client.flushdb()
+
+    return {
+        "meta": {
+            "redis_version": client.info("server").get("redis_version"),
+            "python":        platform.python_version(),
+            "numpy":         numpy_version,
+            "seed":          seed,
+            "ticks":         len(day),
+            "codes":         len(benchmark_codes()),
+            "timestamp":     int(time.time()),
+        },
+        "runs": runs,
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    parser = argparse.ArgumentParser(description="Alarm motoru benchmark'ı")
+    parser.add_argument("--redis-url", default="redis://localhost:6379/15")
+    parser.add_argument("--alarms", default="10000,100000")
+    parser.add_argument("--engines", default=",".join(ENGINES))
+    parser.add_argument("--ticks", type=int, default=1440, help="Sentetik gün uzunluğu (dakika)")
+    parser.add_argument("--day", help="Kayıtlı gün (JSONL)")
+    parser.add_argument("--save-day", help="Sentetik günü JSONL olarak yaz")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", help="Sonuç JSON dosyası (yoksa stdout)")
+    parser.add_argument("--force", action="store_true", help="Dolu DB'yi de FLUSHDB et")
+    args = parser.parse_args()
+
+    engines = [e.strip() for e in args.engines.split(",") if e.strip()]
+    unknown = set(engines) - set(ENGINES)
+    if unknown:
+        parser.error(f"Bilinmeyen motor: {', '.join(sorted(unknown))}")
+
+    day = load_day(args.day) if args.day else synthesize_day(args.ticks, args.seed)
+    if args.save_day:
+        save_day(day, args.save_day)
+
+    results = run_suite(args.redis_url, [int(n) for n in args.alarms.split(",")], engines, day, args.seed, args.force)
+    output  = json.dumps(results, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(output)
+        logger.info(f"💾 [BENCH] Sonuçlar: {args.out}")
+    else:
+        print(output)
@@ -0,0 +1,343 @@
+"""
+Alarm Index - Fiyat bazlı in-memory alarm motoru
+=================================================
+✅ (currency_code, profile, HIGH/LOW) başına sıralı eşik dizisi (ALARM_ENGINE="memory")
+✅ Diziler alarm partition'ına göre parçalı: node sadece sahip olduğu parçaları tarar
+✅ Fiyat geldiğinde bisect ile sadece geçilen alarmlar: O(log n + tetiklenen)
+✅ Route'lar değişiklikte Redis version sayacını artırır ve değişikliği (upsert / silme) version'lı
+   change stream'e yazar; diğer process'ler aradaki değişiklikleri uygular, sadece boşlukta rebuild
+✅ AlarmView: process içi alarm görünümleri için ortak bakım (index, columnar tablo)
+✅ Periyodik tam rebuild (TTL ile düşen alarmlar için)
+"""
+
+import abc
+import bisect
+import json
+import logging
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from config import Config
+from services.alarm_partitions import partition_of
+from services.market_service import normalize_code
+
+logger = logging.getLogger("KuraBak.AlarmIndex")
+
+HIGH = "HIGH"
+LOW  = "LOW"
+
+
+def alarm_threshold(alarm_obj: dict) -> Optional[Tuple[str, float]]:
+    """
+    Alarmın tetikleneceği fiyat ve yönü. check_alarm_trigger ile aynı kural:
+    PRICE  → HIGH: fiyat >= hedef, LOW: fiyat <= hedef
+    PERCENT → UP: fiyat >= start*(1+p/100) (HIGH), DOWN: fiyat <= start*(1-p/100) (LOW)
+    Oluşturulurken kaydedilmiş trigger_price varsa o kullanılır.
+    """
+    try:
+        alarm_mode = (alarm_obj.get('alarm_mode') or 'PRICE').upper()
+
+        trigger_price = float(alarm_obj.get('trigger_price') or 0)
+        if trigger_price > 0:
+            if alarm_mode == 'PERCENT':
+                direction = (alarm_obj.get('percent_direction') or '').upper()
+                side      = HIGH if direction == 'UP' else LOW if direction == 'DOWN' else None
+            else:
+                side = (alarm_obj.get('alarm_type') or '').upper()
+            if side in (HIGH, LOW):
+                return side, trigger_price
+
+        if alarm_mode == 'PERCENT':
+            start_price   = float(alarm_obj.get('start_price') or 0)
+            percent_value = float(alarm_obj.get('percent_value') or 0)
+            direction     = (alarm_obj.get('percent_direction') or '').upper()
+            if start_price <= 0 or percent_value <= 0:
+                return None
+            if direction == 'UP':
+                return HIGH, start_price * (1 + percent_value / 100)
+            if direction == 'DOWN':
+                return LOW, start_price * (1 - percent_value / 100)
+            return None
+
+        target_price = float(alarm_obj.get('target_price') or 0)
+        alarm_type   = (alarm_obj.get('alarm_type') or '').upper()
+        if target_price <= 0 or alarm_type not in (HIGH, LOW):
+            return None
+        return alarm_type, target_price
+
+    except (TypeError, ValueError):
+        return None
+
+
+class _SortedThresholds:
+    """Paralel diziler: thresholds sıralı, keys aynı sırada."""
+
+    __slots__ = ("thresholds", "keys")
+
+    def __init__(self):
+        self.thresholds: List[float] = []
+        self.keys: List[str] = []
+
+    def insert(self, threshold: float, key: str):
+        i = bisect.bisect_right(self.thresholds, threshold)
+        self.thresholds.insert(i, threshold)
+        self.keys.insert(i, key)
+
+    def remove(self, threshold: float, key: str) -> bool:
+        i = bisect.bisect_left(self.thresholds, threshold)
+        while i < len(self.thresholds) and self.thresholds[i] == threshold:
+            if self.keys[i] == key:
+                del self.thresholds[i]
+                del self.keys[i]
+                return True
+            i += 1
+        return False
+
+    def crossed(self, side: str, price: float) -> List[str]:
+        if side == HIGH:
+            return self.keys[:bisect.bisect_right(self.thresholds, price)]
+        return self.keys[bisect.bisect_left(self.thresholds, price):]
+
+    def __len__(self):
+        return len(self.keys)
+
+
+class AlarmView(abc.ABC):
+    """
+    Alarm store'un process içi görünümleri için ortak bakım: rebuild, version takibi,
+    route olaylarından artımlı güncelleme. Alt sınıflar _clear/_add/_remove_locked yazar.
+    """
+
+    name = "ALARM VIEW"
+
+    def __init__(self):
+        self._lock     = threading.RLock()
+        self._version  = None
+        self._built_at = 0.0
+
+    @abc.abstractmethod
+    def _clear_locked(self):
+        ...
+
+    @abc.abstractmethod
+    def _add_locked(self, key: str, alarm_obj: dict):
+        ...
+
+    @abc.abstractmethod
+    def _remove_locked(self, key: str):
+        ...
+
+    def rebuild(self, redis_client) -> int:
+        """Tüm alarmları alarm store'dan (kullanıcı hash'leri, pipeline) okuyup sıfırdan kurar."""
+        from services.alarm_store import iter_all_alarms
+
+        start   = time.time()
+        version = _read_version(redis_client)
+        loaded  = dict(iter_all_alarms(redis_client))
+
+        with self._lock:
+            self._clear_locked()
+            for key, alarm_obj in loaded.items():
+                self._add_locked(key, alarm_obj)
+            self._version  = version
+            self._built_at = time.time()
+
+        logger.info(f"🧭 [{self.name}] Rebuild: {len(self)} alarm ({(time.time() - start) * 1000:.0f}ms)")
+        return len(self)
+
+    def ensure_fresh(self, redis_client):
+        """
+        Başka process alarm değiştirdiyse aradaki değişiklikler change stream'den uygulanır; stream'de boşluk
+        varsa (kırpılmış / okunamadı), görünüm hiç kurulmadıysa veya eskidiyse rebuild.
+        """
+        version = _read_version(redis_client)
+        too_old = time.time() - self._built_at > Config.ALARM_INDEX_MAX_AGE
+        if self._version is None or too_old or version < self._version:
+            self.rebuild(redis_client)
+        elif version != self._version and not self._catch_up(redis_client, version):
+            self.rebuild(redis_client)
+
+    def _catch_up(self, redis_client, version: int) -> bool:
+        """self._version + 1 .. version arası change stream kayıtları sırayla uygulanır; eksik varsa False."""
+        start = self._version
+        if version - start > Config.ALARM_CHANGE_LOG_MAXLEN:
+            return False
+        try:
+            entries = redis_client.xrange(Config.CACHE_KEYS['alarm_index_changes'], min=str(start + 1), max=str(version))
+            changes = [(int(entry_id.split('-')[0]), json.loads(fields.get('upserts') or '{}'),
+                        json.loads(fields.get('removals') or '[]')) for entry_id, fields in entries]
+        except Exception as e:
+            logger.warning(f"⚠️ [{self.name}] Change stream okunamadı: {e}")
+            return False
+
+        if [v for v, _, _ in changes] != list(range(start + 1, version + 1)):
+            return False
+        for new_version, upserts, removals in changes:
+            self.apply_change(new_version, upserts, removals)
+        # Arada yerel apply_change ile ilerlemiş olabilir
+        return self._version is not None and self._version >= version
+
+    def apply_change(self, new_version: int, upserts: Optional[Dict[str, dict]], removals: Optional[List[str]]):
+        """Görünüm bir önceki version'daysa değişiklik yerinde uygulanır, değilse sonraki kontrolde yakalanır."""
+        with self._lock:
+            if self._version is None or new_version != self._version + 1:
+                return
+            for key in removals or []:
+                self._remove_locked(key)
+            for key, alarm_obj in (upserts or {}).items():
+                self._add_locked(key, alarm_obj)
+            self._version = new_version
+
+    def discard(self, key: str):
+        """Tetiklenen / geçersiz alarmı sadece yerel görünümden çıkarır (store'dan zaten silindi)."""
+        with self._lock:
+            self._remove_locked(key)
+
+    @abc.abstractmethod
+    def __len__(self):
+        ...
+
+
+_views: List[AlarmView] = []
+
+
+def register_view(view: AlarmView) -> AlarmView:
+    _views.append(view)
+    return view
+
+
+def _read_version(redis_client) -> int:
+    try:
+        return int(redis_client.get(Config.CACHE_KEYS['alarm_index_version']) or 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+# Version +1 ve değişiklik aynı anda: stream entry id'si = version (peer'lar boşluğu id'den anlar)
+# KEYS: version, change stream — ARGV: upserts JSON, removals JSON, maxlen
+_PUBLISH_LUA = """
+local version = redis.call('INCR', KEYS[1])
+local entry   = {'MAXLEN', '~', ARGV[3], version .. '-1', 'upserts', ARGV[1], 'removals', ARGV[2]}
+local ok = redis.pcall('XADD', KEYS[2], unpack(entry))
+if type(ok) == 'table' and ok.err then
+    -- Version sıfırlanmış, stream'de daha büyük id var: eski kayıtlar geçersiz
+    redis.call('DEL', KEYS[2])
+    redis.call('XADD', KEYS[2], unpack(entry))
+end
+return version
+"""
+
+
+def notify_alarm_change(redis_client, upserts: Optional[Dict[str, dict]] = None, removals: Optional[List[str]] = None):
+    """
+    Route'lar store'a yazdıktan sonra çağırır: version +1 ve değişiklik change stream'e,
+    bu process'in görünümlerine hemen uygulanır; diğer process'ler ensure_fresh'te stream'den alır.
+    """
+    from services.alarm_store import _script
+
+    try:
+        new_version = int(_script(redis_client, _PUBLISH_LUA)(
+            keys=[Config.CACHE_KEYS['alarm_index_version'], Config.CACHE_KEYS['alarm_index_changes']],
+            args=[json.dumps(upserts or {}, default=str), json.dumps(list(removals or [])),
+                  Config.ALARM_CHANGE_LOG_MAXLEN],
+        ))
+    except Exception as e:
+        logger.warning(f"⚠️ [ALARM INDEX] Değişiklik yayınlanamadı: {e}")
+        return
+
+    for view in _views:
+        view.apply_change(new_version, upserts, removals)
+
+
+def discard_from_views(key: str):
+    for view in _views:
+        view.discard(key)
+
+
+class AlarmIndex(AlarmView):
+    name = "ALARM INDEX"
+
+    def __init__(self):
+        super().__init__()
+        self._buckets: Dict[Tuple[str, str, str], Dict[int, _SortedThresholds]] = {}
+        self._alarms: Dict[str, dict] = {}
+        self._entries: Dict[str, Tuple[Tuple[str, str, str], int, float]] = {}
+
+    # ─── Bakım ────────────────────────────────────────────────────────────────
+
+    def _clear_locked(self):
+        self._buckets.clear()
+        self._alarms.clear()
+        self._entries.clear()
+
+    def _add_locked(self, key: str, alarm_obj: dict):
+        self._remove_locked(key)
+
+        threshold = alarm_threshold(alarm_obj)
+        code      = (alarm_obj.get('currency_code') or '').upper()
+        if threshold is None or not code:
+            return
+
+        side, price = threshold
+        bucket_key  = (normalize_code(code), alarm_obj.get('profile', 'jeweler'), side)
+        partition   = partition_of(key)
+        shards      = self._buckets.setdefault(bucket_key, {})
+        bucket      = shards.get(partition)
+        if bucket is None:
+            bucket = shards[partition] = _SortedThresholds()
+
+        bucket.insert(price, key)
+        self._alarms[key]  = alarm_obj
+        self._entries[key] = (bucket_key, partition, price)
+
+    def _remove_locked(self, key: str):
+        entry = self._entries.pop(key, None)
+        self._alarms.pop(key, None)
+        if entry is None:
+            return
+        bucket_key, partition, price = entry
+        shards = self._buckets.get(bucket_key, {})
+        bucket = shards.get(partition)
+        if bucket is not None:
+            bucket.remove(price, key)
+            if not bucket:
+                del shards[partition]
+                if not shards:
+                    del self._buckets[bucket_key]
+
+    # ─── Sorgu ────────────────────────────────────────────────────────────────
+
+    def assets(self) -> List[Tuple[str, str]]:
+        with self._lock:
+            return sorted({(code, profile) for code, profile, _ in self._buckets})
+
+    def crossed(self, code: str, profile: str, price: float,
+                partitions: Optional[Iterable[int]] = None) -> List[Tuple[str, dict]]:
+        """Bu fiyatta tetiklenen alarmlar: (member id, alarm_obj). partitions: sadece bu parçalar."""
+        with self._lock:
+            result = []
+            for side in (HIGH, LOW):
+                shards = self._buckets.get((code, profile, side))
+                if not shards:
+                    continue
+                owned = shards.items() if partitions is None else \
+                    ((p, shards[p]) for p in partitions if p in shards)
+                for _, bucket in owned:
+                    result.extend((key, self._alarms[key]) for key in bucket.crossed(side, price))
+            return result
+
+    def __len__(self):
+        return len(self._alarms)
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {
+                "alarms":   len(self._alarms),
+                "buckets":  len(self._buckets),
+                "version":  self._version,
+                "built_at": self._built_at,
+            }
+
+
+alarm_index = register_view(AlarmIndex())
@@ -0,0 +1,69 @@
+"""
+Alarm Latency - Fiyat yayını → tespit → FCM kabulü gecikme ölçümü
+==================================================================
+✅ Tetiklenen her alarm için üç an: eşiği geçen fiyatın worker tarafından yayınlandığı an,
+   check_all_alarms'ın tespit ettiği an, FCM'in push'u kabul ettiği an
+✅ Yayın anı eşiğin ilk geçildiği generation'dır: kod başına son fiyat değişimleri geriye doğru
+   taranır, sweep'in geç yakaladığı alarmlarda gecikme eksik ölçülmez
+✅ Aşamalar: detect (yayın → tespit), deliver (tespit → FCM), total (yayın → FCM)
+✅ Histogram utils.latency_histogram'da; tur sonunda tek pipeline ile saatlik Redis hash'ine yazılır
+✅ p50/p95/p99 kovalardan doğrusal interpolasyonla (/api/metrics, günlük Telegram raporu)
+"""
+
+import json
+import logging
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from config import Config
+from utils.latency_histogram import LatencyHistogram
+
+logger = logging.getLogger("KuraBak.AlarmLatency")
+
+STAGES = ("detect", "deliver", "total")
+
+
+_alarm_histogram = LatencyHistogram(Config.CACHE_KEYS['alarm_latency'], STAGES)
+
+
+def price_histories(redis_client, keys: Iterable[Tuple[str, str]]) -> Dict[Tuple[str, str], List[Tuple[float, float]]]:
+    """(code, profile) → son fiyat değişimleri [(yayın anı, fiyat), ...] eskiden yeniye; tek HMGET."""
+    keys = list(keys)
+    if not keys:
+        return {}
+    try:
+        values = redis_client.hmget(Config.CACHE_KEYS['price_history'], [f"{code}:{profile}" for code, profile in keys])
+        return {key: [tuple(entry) for entry in json.loads(value)] for key, value in zip(keys, values) if value}
+    except Exception as e:
+        logger.warning(f"⚠️ [LATENCY] Fiyat geçmişi okunamadı: {e}")
+        return {}
+
+
+def first_crossing_at(history: List[Tuple[float, float]], crossed: Callable[[float], bool]) -> Optional[float]:
+    """
+    Eşiğin kesintisiz geçili olduğu ilk yayın anı: en yeni değişimden geriye, crossed(fiyat) bozulana kadar.
+    Geçmişin tamamı geçiliyse bilinen en eski an (alt sınır).
+    """
+    first = None
+    for published_at, price in reversed(history):
+        if not crossed(price):
+            break
+        first = published_at
+    return first
+
+
+def observe(published_at: Optional[float], detected_at: float, accepted_at: Optional[float] = None):
+    """FCM kabulünden sonra çağrılır; yayın anı bilinmiyorsa sadece deliver ölçülür."""
+    accepted_at = accepted_at or time.time()
+    _alarm_histogram.observe_ms("deliver", (accepted_at - detected_at) * 1000)
+    if published_at:
+        _alarm_histogram.observe_ms("detect", (detected_at - published_at) * 1000)
+        _alarm_histogram.observe_ms("total", (accepted_at - published_at) * 1000)
+
+
+def flush(redis_client):
+    _alarm_histogram.flush(redis_client)
+
+
+def get_latency_report(redis_client=None, hours: Optional[int] = None) -> dict:
+    return _alarm_histogram.report(redis_client, hours)
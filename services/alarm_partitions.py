@@ -0,0 +1,272 @@
+"""
+Alarm Partitions - Alarm değerlendirmesinin process / node'lar arasında bölünmesi
+==================================================================================
+✅ Member'lar user_key hash'ine göre ALARM_PARTITIONS parçaya bölünür
+✅ Her process parçaları Redis lease'i ile alır (SET NX PX), node başına adil pay
+✅ Fencing token: lease sahibi {node}:{sayaç}; claim scripti lease'i kontrol eder,
+   lease'i kaybetmiş (takılmış) node alarm silemez → bildirim de gönderemez
+✅ Takılan node'un lease'i TTL ile düşer, heartbeat'i kesilince pay yeniden hesaplanır
+✅ Kapanışta lease'ler geri verilir, diğer node'lar hemen devralır
+
+ALARM_PARTITIONS=0 (varsayılan): eski davranış, alarm job'ları sadece scheduler process'inde.
+"""
+
+import logging
+import math
+import os
+import socket
+import threading
+import time
+import uuid
+import zlib
+from typing import Dict, Optional, Tuple
+
+from config import Config
+
+logger = logging.getLogger("KuraBak.AlarmPartitions")
+
+LEASE_PREFIX = "alarm_lease:"
+
+# KEYS: lease, fence hash — ARGV: node id, ttl ms, partition. Dönüş: sahip değeri veya nil
+_ACQUIRE_LUA = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    return false
+end
+local owner = ARGV[1] .. ':' .. redis.call('HINCRBY', KEYS[2], ARGV[3], 1)
+redis.call('SET', KEYS[1], owner, 'PX', ARGV[2])
+return owner
+"""
+
+# KEYS: lease — ARGV: sahip değeri, ttl ms
+_RENEW_LUA = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+# KEYS: lease — ARGV: sahip değeri
+_RELEASE_LUA = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+def lease_key(partition: int) -> str:
+    return f"{LEASE_PREFIX}{partition}"
+
+
+def partition_of(member: str) -> int:
+    """Member id veya user_key → partition. Aynı kullanıcının tüm alarmları aynı parçada."""
+    user_key = member.partition(':')[0]
+    return zlib.crc32(user_key.encode()) % max(Config.ALARM_PARTITIONS, 1)
+
+
+class PartitionLeaser:
+    """Bu process'in tuttuğu partition lease'leri: {partition: sahip değeri}."""
+
+    def __init__(self, redis_client, partitions: int, lease_ttl: int):
+        self.redis_client = redis_client
+        self.partitions   = partitions
+        self.lease_ttl    = lease_ttl
+        self.node_id      = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self._owned: Dict[int, str] = {}
+        self._lock        = threading.Lock()
+
+        self._acquire = redis_client.register_script(_ACQUIRE_LUA)
+        self._renew   = redis_client.register_script(_RENEW_LUA)
+        self._release = redis_client.register_script(_RELEASE_LUA)
+
+    def owned(self) -> Dict[int, Tuple[str, str]]:
+        """check_all_alarms için: {partition: (lease key, sahip değeri)} — claim bununla fence'lenir."""
+        with self._lock:
+            return {p: (lease_key(p), owner) for p, owner in self._owned.items()}
+
+    def _live_nodes(self) -> int:
+        now  = time.time()
+        key  = Config.CACHE_KEYS['alarm_partition_nodes']
+        pipe = self.redis_client.pipeline(transaction=False)
+        pipe.zadd(key, {self.node_id: now})
+        pipe.zremrangebyscore(key, '-inf', now - self.lease_ttl)
+        pipe.zcard(key)
+        return max(pipe.execute()[-1] or 1, 1)
+
+    def rebalance(self):
+        """Heartbeat + lease yenileme; pay fazlası geri verilir, boştaki parçalar pay dolana kadar alınır."""
+        ttl_ms = self.lease_ttl * 1000
+        share  = math.ceil(self.partitions / self._live_nodes())
+
+        with self._lock:
+            owned = dict(self._owned)
+
+        if owned:
+            pipe = self.redis_client.pipeline(transaction=False)
+            for p, owner in owned.items():
+                self._renew(keys=[lease_key(p)], args=[owner, ttl_ms], client=pipe)
+            for (p, _), renewed in zip(list(owned.items()), pipe.execute()):
+                if not renewed:
+                    logger.warning(f"⚠️ [PARTITION] Lease kaybedildi: #{p} ({self.node_id})")
+                    owned.pop(p)
+
+        # Yeni node katıldıysa fazlası bırakılır
+        for p in sorted(owned, reverse=True)[:max(len(owned) - share, 0)]:
+            self._release(keys=[lease_key(p)], args=[owned.pop(p)])
+            logger.info(f"↩️ [PARTITION] #{p} geri verildi (pay: {share})")
+
+        if len(owned) < share:
+            # Boş lease'ler tek MGET ile bulunur; node'lar farklı noktadan başlar
+            current = self.redis_client.mget([lease_key(p) for p in range(self.partitions)])
+            start   = zlib.crc32(self.node_id.encode()) % self.partitions
+            for i in range(self.partitions):
+                p = (start + i) % self.partitions
+                if len(owned) >= share:
+                    break
+                if p in owned or current[p]:
+                    continue
+                owner = self._acquire(
+                    keys=[lease_key(p), Config.CACHE_KEYS['alarm_partition_fences']],
+                    args=[self.node_id, ttl_ms, p],
+                )
+                if owner:
+                    owned[p] = owner.decode('utf-8') if isinstance(owner, bytes) else owner
+                    logger.info(f"📥 [PARTITION] #{p} alındı → {owned[p]}")
+
+        with self._lock:
+            gained      = [p for p in owned if p not in self._owned]
+            self._owned = owned
+
+        if gained:
+            from services.alarm_service import invalidate_last_prices
+            invalidate_last_prices(gained)
+
+    def release_all(self):
+        with self._lock:
+            owned, self._owned = self._owned, {}
+        try:
+            pipe = self.redis_client.pipeline(transaction=False)
+            for p, owner in owned.items():
+                self._release(keys=[lease_key(p)], args=[owner], client=pipe)
+            pipe.zrem(Config.CACHE_KEYS['alarm_partition_nodes'], self.node_id)
+            pipe.execute()
+            logger.info(f"🔓 [PARTITION] {len(owned)} lease geri verildi ({self.node_id})")
+        except Exception as e:
+            logger.warning(f"⚠️ [PARTITION] Lease bırakma hatası: {e}")
+
+
+class PartitionWorker(threading.Thread):
+    """
+    Her process'te çalışır: lease'leri yeniler, yeni fiyat generation'ında değişen kodları,
+    ALARM_CHECK_INTERVAL'de tam taramayı sadece sahip olunan parçalar için değerlendirir.
+    """
+
+    def __init__(self, leaser: PartitionLeaser):
+        super().__init__(daemon=True, name=f"AlarmPartitions-{os.getpid()}")
+        self.leaser           = leaser
+        self._stop_event      = threading.Event()
+        self._last_generation = None
+        self._last_sweep      = time.time()
+        self._last_rebalance  = 0.0
+
+    def run(self):
+        logger.info(f"🧩 [PARTITION] Worker başladı: {self.leaser.node_id} ({self.leaser.partitions} parça)")
+        while not self._stop_event.wait(Config.ALARM_PARTITION_POLL_SECONDS):
+            try:
+                self._tick()
+            except Exception as e:
+                logger.error(f"❌ [PARTITION] Tur hatası: {e}")
+        self.leaser.release_all()
+
+    def stop(self, timeout: float = 5.0):
+        self._stop_event.set()
+        self.join(timeout)
+
+    def _tick(self):
+        now = time.time()
+        if now - self._last_rebalance >= self.leaser.lease_ttl / 3:
+            self.leaser.rebalance()
+            self._last_rebalance = now
+
+        owned = self.leaser.owned()
+        if not owned:
+            return
+
+        from services.maintenance_service import _is_weekend_alarm_now
+        if _is_weekend_alarm_now():
+            return
+
+        from services.alarm_service import check_all_alarms, evaluate_moved_alarms
+        from services.market_service import current_generation
+        from utils.cache import set_cache
+
+        if now - self._last_sweep >= Config.ALARM_CHECK_INTERVAL * 60:
+            self._last_sweep = now
+            result = check_all_alarms(partitions=owned)
+            logger.info(
+                f"✅ [PARTITION] Tam tarama ({len(owned)} parça): {result.get('checked', 0)} kontrol, "
+                f"{result.get('triggered', 0)} tetiklendi ({result.get('duration_ms', 0):.2f}ms)"
+            )
+        else:
+            generation = current_generation()
+            if generation == self._last_generation:
+                return
+            self._last_generation = generation
+            result = evaluate_moved_alarms(partitions=owned)
+            if result.get('triggered', 0) or result.get('failed', 0):
+                logger.info(
+                    f"⚡ [PARTITION] gen {generation}: {result.get('moved', 0)} fiyat değişti, "
+                    f"{result.get('triggered', 0)} tetiklendi, {result.get('failed', 0)} hata"
+                )
+
+        set_cache(Config.CACHE_KEYS['alarm_last_check'], str(time.time()), ttl=0)
+
+
+_worker: Optional[PartitionWorker] = None
+_worker_lock = threading.Lock()
+
+
+def partitions_enabled() -> bool:
+    return Config.ALARM_PARTITIONS > 0
+
+
+def start_partition_worker() -> bool:
+    """Her process çağırır (scheduler lock'undan bağımsız)."""
+    global _worker
+    if not partitions_enabled():
+        return False
+
+    from utils.cache import get_redis_client
+    redis_client = get_redis_client()
+    if not redis_client:
+        logger.warning("⚠️ [PARTITION] Redis yok, partition worker başlatılmadı")
+        return False
+
+    with _worker_lock:
+        if _worker and _worker.is_alive():
+            return True
+        leaser  = PartitionLeaser(redis_client, Config.ALARM_PARTITIONS, Config.ALARM_PARTITION_LEASE_TTL)
+        _worker = PartitionWorker(leaser)
+        _worker.start()
+    return True
+
+
+def stop_partition_worker():
+    global _worker
+    with _worker_lock:
+        if _worker:
+            _worker.stop()
+            _worker = None
+
+
+def get_partition_status() -> dict:
+    with _worker_lock:
+        if not _worker:
+            return {"enabled": partitions_enabled(), "running": False}
+        return {
+            "enabled":    True,
+            "running":    _worker.is_alive(),
+            "node_id":    _worker.leaser.node_id,
+            "partitions": Config.ALARM_PARTITIONS,
+            "owned":      sorted(_worker.leaser.owned()),
+        }
@@ -1,53 +1,43 @@
 import logging
-import json
 import time
-from typing import List, Dict, Optional
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Optional, Tuple
 from datetime import datetime
 
 from config import Config
 from utils.cache import get_cache, get_redis_client
+from services.market_service import normalize_code, get_quote_index
+from services.alarm_index import alarm_index, discard_from_views, alarm_threshold
+from services.alarm_table import alarm_table
+from services.alarm_partitions import partition_of
+from services import alarm_store, alarm_latency
 
 logger = logging.getLogger("KuraBak.AlarmService")
 
 
 def get_current_price(currency_code: str, profile: str = "jeweler") -> Optional[float]:
     try:
-        original_code = currency_code
-        if currency_code.startswith("FOREX_"):
-            currency_code = currency_code.replace("FOREX_", "")
-        elif currency_code.startswith("SILVER_"):
-            currency_code = currency_code.replace("SILVER_", "")
-        elif currency_code.startswith("GOLD_"):
-            currency_code = currency_code.replace("GOLD_", "")
-
-        if profile == "raw":
-            currencies_key = Config.CACHE_KEYS['currencies_all']
-            golds_key = Config.CACHE_KEYS['golds_all']
-            silvers_key = Config.CACHE_KEYS['silvers_all']
-        else:
-            currencies_key = Config.CACHE_KEYS['currencies_jeweler']
-            golds_key = Config.CACHE_KEYS['golds_jeweler']
-            silvers_key = Config.CACHE_KEYS['silvers_jeweler']
-
-        currencies_data = get_cache(currencies_key)
-        if currencies_data:
-            for item in currencies_data.get('data', []):
-                if item.get('code') == currency_code:
-                    return item.get('selling', 0)
-
-        golds_data = get_cache(golds_key)
-        if golds_data:
-            for item in golds_data.get('data', []):
-                if item.get('code') == currency_code:
-                    return item.get('selling', 0)
-
-        silvers_data = get_cache(silvers_key)
-        if silvers_data:
-            for item in silvers_data.get('data', []):
-                if item.get('code') == currency_code:
-                    return item.get('selling', 0)
-
-        logger.debug(f"🔍 [ALARM] Fiyat aranıyor: {original_code} → {currency_code} ({profile})")
+        code  = normalize_code(currency_code)
+        index = get_quote_index(profile)
+
+        if index:
+            item = index["items"].get(code)
+            if item:
+                return item.get('selling', 0)
+            logger.debug(f"🔍 [ALARM] Fiyat bulunamadı: {currency_code} → {code} ({profile})")
+            return None
+
+        # Index henüz yayınlanmadıysa (ilk worker turu) listelerden bul
+        suffix = "all" if profile == "raw" else "jeweler"
+        for asset_class in ("currencies", "golds", "silvers"):
+            data = get_cache(Config.CACHE_KEYS[f'{asset_class}_{suffix}'])
+            if data:
+                for item in data.get('data', []):
+                    if item.get('code') == code:
+                        return item.get('selling', 0)
+
+        logger.debug(f"🔍 [ALARM] Fiyat aranıyor: {currency_code} → {code} ({profile})")
         return None
 
     except Exception as e:
@@ -55,14 +45,18 @@ def get_current_price(currency_code: str, profile: str = "jeweler") -> Optional[
         return None
 
 
-def extract_fcm_token_from_key(alarm_key: str) -> Optional[str]:
-    try:
-        parts = alarm_key.split(':')
-        if len(parts) >= 2:
-            return parts[1]
-        return None
-    except:
-        return None
+def build_price_map() -> Dict[Tuple[str, str], float]:
+    """(code, profile) → fiyat; her kontrol turunda quote index'ten bir kez kurulur."""
+    prices = {}
+    for profile in ("raw", "jeweler"):
+        index = get_quote_index(profile)
+        if not index:
+            continue
+        for code, item in index["items"].items():
+            price = item.get('selling', 0) or 0
+            if price > 0:
+                prices[(code, profile)] = price
+    return prices
 
 
 def get_fcm_token_from_hash(token_hash: str) -> Optional[str]:
@@ -86,14 +80,33 @@ def get_fcm_token_from_hash(token_hash: str) -> Optional[str]:
         return None
 
 
+def get_fcm_tokens_for_users(redis_client, user_keys: List[str]) -> Dict[str, str]:
+    """fcm_token_map:{user_key} lookup'ları MGET batch'leri ile: {user_key: token}."""
+    tokens = {}
+    for i in range(0, len(user_keys), Config.ALARM_FETCH_BATCH):
+        batch = user_keys[i:i + Config.ALARM_FETCH_BATCH]
+        try:
+            values = redis_client.mget([f"fcm_token_map:{user_key}" for user_key in batch])
+        except Exception as e:
+            logger.error(f"❌ [ALARM] Token mapping batch hatası: {e}")
+            continue
+        for user_key, token in zip(batch, values):
+            if token:
+                tokens[user_key] = token.decode('utf-8') if isinstance(token, bytes) else token
+    return tokens
+
+
 def save_fcm_token_mapping(fcm_token: str, token_hash: str):
     try:
         redis_client = get_redis_client()
         if not redis_client:
             return
 
-        mapping_key = f"fcm_token_map:{token_hash}"
-        redis_client.setex(mapping_key, 90 * 24 * 60 * 60, fcm_token)
+        # Ters kayıt: token → cihaz, unregister SCAN yapmaz
+        pipe = redis_client.pipeline(transaction=False)
+        pipe.setex(alarm_store.token_map_key(token_hash), Config.FCM_TOKEN_MAP_TTL, fcm_token)
+        pipe.setex(alarm_store.token_rev_key(fcm_token), Config.FCM_TOKEN_MAP_TTL, token_hash)
+        pipe.execute()
 
     except Exception as e:
         logger.warning(f"⚠️ [ALARM] Token mapping kayıt hatası: {e}")
@@ -123,6 +136,12 @@ def check_alarm_trigger(alarm_data: dict, current_price: float) -> bool:
     try:
         alarm_mode = alarm_data.get('alarm_mode', 'PRICE').upper()
 
+        # Normalize edilmiş alarm (trigger_price): iki mod da mutlak eşikle karşılaştırılır
+        trigger = alarm_threshold(alarm_data) if alarm_data.get('trigger_price') else None
+        if trigger:
+            side, trigger_price = trigger
+            return current_price >= trigger_price if side == 'HIGH' else current_price <= trigger_price
+
         if alarm_mode == 'PERCENT':
             start_price = alarm_data.get('start_price', 0)
             percent_value = alarm_data.get('percent_value', 0)
@@ -156,13 +175,25 @@ def check_alarm_trigger(alarm_data: dict, current_price: float) -> bool:
         return False
 
 
-def send_alarm_notification_v2(fcm_token: str, alarm_obj: dict, current_price: float) -> bool:
+def send_alarm_notification_v2(fcm_token: str, alarm_obj: dict, current_price: float,
+                               published_at: Optional[float] = None, detected_at: Optional[float] = None) -> bool:
     """
     🔥 DÜZELTİLDİ: PRICE ve PERCENT modlarını doğru parametrelerle iletir.
+    detected_at verilirse FCM kabulünde gecikme ölçülür (published_at: fiyatın ilk yayın anı).
     """
-    try:
-        from utils.notification_service import send_alarm_notification
+    from utils.notification_service import ALARM_SENT
+
+    status, _ = deliver_alarm_notification(fcm_token, alarm_obj, current_price, published_at, detected_at)
+    return status == ALARM_SENT
+
 
+def deliver_alarm_notification(fcm_token: str, alarm_obj: dict, current_price: float,
+                               published_at: Optional[float] = None,
+                               detected_at: Optional[float] = None) -> Tuple[str, Optional[Exception]]:
+    """send_alarm_notification_v2'nin (durum, hata) dönen hali; outbox yeniden denemeyi buna göre yapar."""
+    from utils.notification_service import send_alarm_notification_status, ALARM_SENT, ALARM_BAD_BODY
+
+    try:
         alarm_mode      = alarm_obj.get('alarm_mode', 'PRICE').upper()
         currency_code   = alarm_obj.get('currency_code', '')
         currency_name   = alarm_obj.get('currency_name', 'Varlık')
@@ -174,13 +205,13 @@ def send_alarm_notification_v2(fcm_token: str, alarm_obj: dict, current_price: f
 
             if not percent_value or not percent_direction:
                 logger.error(f"❌ [ALARM] PERCENT modunda percent_value veya percent_direction eksik!")
-                return False
+                return ALARM_BAD_BODY, None
 
             if start_price <= 0:
                 logger.error(f"❌ [ALARM] PERCENT modunda start_price geçersiz: {start_price}")
-                return False
+                return ALARM_BAD_BODY, None
 
-            success = send_alarm_notification(
+            status, error = send_alarm_notification_status(
                 fcm_token=fcm_token,
                 currency_code=currency_code,
                 currency_name=currency_name,
@@ -188,7 +219,8 @@ def send_alarm_notification_v2(fcm_token: str, alarm_obj: dict, current_price: f
                 alarm_mode='PERCENT',
                 start_price=start_price,
                 percent_value=percent_value,
-                percent_direction=percent_direction
+                percent_direction=percent_direction,
+                profile=alarm_obj.get('profile', 'jeweler')
             )
 
         else:
@@ -197,13 +229,13 @@ def send_alarm_notification_v2(fcm_token: str, alarm_obj: dict, current_price: f
 
             if target_price <= 0:
                 logger.error(f"❌ [ALARM] PRICE modunda target_price geçersiz: {target_price}")
-                return False
+                return ALARM_BAD_BODY, None
 
             if start_price <= 0:
                 start_price = current_price
                 logger.warning(f"⚠️ [ALARM] start_price sıfır, current_price kullanıldı: {current_price}")
 
-            success = send_alarm_notification(
+            status, error = send_alarm_notification_status(
                 fcm_token=fcm_token,
                 currency_code=currency_code,
                 currency_name=currency_name,
@@ -211,19 +243,23 @@ def send_alarm_notification_v2(fcm_token: str, alarm_obj: dict, current_price: f
                 alarm_mode='PRICE',
                 target_price=target_price,
                 start_price=start_price,
-                alarm_type=alarm_type
+                alarm_type=alarm_type,
+                profile=alarm_obj.get('profile', 'jeweler')
             )
 
-        if success:
+        if status == ALARM_SENT and detected_at:
+            alarm_latency.observe(published_at, detected_at)
+
+        if status == ALARM_SENT:
             logger.info(f"✅ [ALARM] Bildirim gönderildi: {currency_name} ({alarm_mode}) → ₺{current_price:,.2f}")
         else:
-            logger.error(f"❌ [ALARM] Bildirim gönderilemedi: {currency_name} ({alarm_mode})")
+            logger.error(f"❌ [ALARM] Bildirim gönderilemedi: {currency_name} ({alarm_mode}) → {status}")
 
-        return success
+        return status, error
 
     except Exception as e:
         logger.error(f"❌ [ALARM] Bildirim gönderme hatası: {e}")
-        return False
+        return ALARM_BAD_BODY, e
 
 
 def get_all_alarm_keys_safe(redis_client) -> List[str]:
@@ -279,11 +315,124 @@ def _is_monday_transition_window() -> bool:
     )
 
 
-def check_all_alarms() -> Dict:
+def _first_crossings(redis_client, to_fire: list) -> Dict[str, float]:
+    """member → eşiğin ilk geçildiği generation'ın yayın anı (sweep'in geç yakaladığı alarmlar dahil)."""
+    def key(alarm_obj):
+        return normalize_code(alarm_obj.get('currency_code')), alarm_obj.get('profile', 'jeweler')
+
+    histories = alarm_latency.price_histories(redis_client, {key(alarm_obj) for _, alarm_obj, _ in to_fire})
+    published = {}
+    for member, alarm_obj, _ in to_fire:
+        history = histories.get(key(alarm_obj))
+        if history:
+            crossed = alarm_latency.first_crossing_at(history, lambda price: check_alarm_trigger(alarm_obj, price))
+            published[member] = crossed or history[-1][0]
+    return published
+
+
+def _claim_and_send(redis_client, expired: List[str], to_fire: list,
+                    fence: Optional[Tuple[str, str]] = None,
+                    timing: Optional[Tuple[Dict[Tuple[str, str], float], float]] = None) -> Tuple[int, int]:
+    """
+    Claim (önce sil) + token lookup'ları batch halinde, sonra outbox'a yazma veya doğrudan gönderim.
+    Dönüş: (tetiklenen / kuyruğa alınan, hata).
+    timing: ({member: eşiğin ilk geçildiği yayın anı}, tespit anı) — gecikme ölçümü için.
+    """
+    published, detected_at = timing or ({}, None)
+    triggered_count = 0
+    failed_count    = 0
+
+    for member in expired:
+        discard_from_views(member)
+    alarm_store.claim_members(redis_client, expired, fence)
+
+    for member, _, _ in to_fire:
+        discard_from_views(member)
+    claimed = alarm_store.claim_members(redis_client, [member for member, _, _ in to_fire], fence)
+
+    # False dönen claim: alarm başka bir yerde silinmiş (veya lease el değiştirmiş), bildirim yok
+    to_fire = [entry for entry in to_fire if claimed.get(entry[0])]
+    tokens  = get_fcm_tokens_for_users(
+        redis_client,
+        list({alarm_store.split_member(member)[0] for member, _, _ in to_fire})
+    )
+
+    deliveries = []
+    for member, alarm_obj, current_price in to_fire:
+        currency_code = alarm_obj.get('currency_code')
+        logger.info(f"🎯 [ALARM] Tetiklendi: {currency_code} ({alarm_obj.get('profile')}) → {current_price}")
+
+        fcm_token = tokens.get(alarm_store.split_member(member)[0])
+        if not fcm_token:
+            logger.info(f"🗑️ [ALARM] Geçersiz alarm silindi: {member}")
+            failed_count += 1
+            continue
+
+        # Alarm fiyat yayınından sonra kurulduysa gecikme kurulduğu andan sayılır
+        published_at = published.get(member)
+        if published_at:
+            published_at = max(published_at, float(alarm_obj.get('created_at') or 0))
+        deliveries.append((member, fcm_token, alarm_obj, current_price, published_at))
+
+    # Outbox: push'lar stream'e, consumer'lar gönderir (restart'ta kaybolmaz); yazılamazsa doğrudan
+    from utils.notification_outbox import outbox_enabled, enqueue_alarms
+    if deliveries and outbox_enabled() and enqueue_alarms(redis_client, [
+        {"token": fcm_token, "alarm": alarm_obj, "price": current_price,
+         "published_at": published_at, "detected_at": detected_at}
+        for _, fcm_token, alarm_obj, current_price, published_at in deliveries
+    ]):
+        return triggered_count + len(deliveries), failed_count
+
+    for member, fcm_token, alarm_obj, current_price, published_at in deliveries:
+        try:
+            # 🔥 DÜZELTİLDİ: send_alarm_notification_v2 kullanılıyor
+            notification_sent = send_alarm_notification_v2(
+                fcm_token,
+                alarm_obj,
+                current_price,
+                published_at=published_at,
+                detected_at=detected_at
+            )
+
+            if notification_sent:
+                triggered_count += 1
+            else:
+                failed_count += 1
+
+        except Exception as alarm_err:
+            logger.error(f"❌ [ALARM] Gönderim hatası ({member}): {alarm_err}")
+            failed_count += 1
+            continue
+
+    return triggered_count, failed_count
+
+
+def _drop_orphans(redis_client, orphans: List[str], partitions: Optional[Dict[int, Tuple[str, str]]]):
+    """Gövdesi düşmüş ZSET üyeleri; partition'lı çalışmada her parça kendi lease'i ile fence'lenir."""
+    if partitions is None:
+        alarm_store.drop_orphan_members(redis_client, orphans)
+        return
+    groups = {}
+    for member in orphans:
+        groups.setdefault(partition_of(member), []).append(member)
+    for partition, members in groups.items():
+        alarm_store.drop_orphan_members(redis_client, members, fence=partitions[partition])
+
+
+def check_all_alarms(prices: Optional[Dict[Tuple[str, str], float]] = None,
+                     partitions: Optional[Dict[int, Tuple[str, str]]] = None) -> Dict:
+    """
+    prices verilmezse tam tarama (tüm kodlar). Event tarafı sadece fiyatı değişen
+    (code, profile) çiftlerini verir.
+    partitions: {partition: (lease key, sahip)} — sadece bu parçalar değerlendirilir, her parça
+    kendi lease'i ile fence'lenip paralel claim / gönderilir. None: tüm alarmlar (tek process).
+    """
     start_time = time.time()
+    full_sweep = prices is None
 
     try:
-        logger.info("🔔 [ALARM] Periyodik kontrol başlatıldı...")
+        if full_sweep:
+            logger.info("🔔 [ALARM] Periyodik kontrol başlatıldı...")
 
         # DEĞİŞİKLİK: Pazartesi geçiş penceresi kontrolü.
         # PRICE alarmları her zaman çalışır.
@@ -307,8 +456,34 @@ def check_all_alarms() -> Dict:
                 'error': 'Redis connection failed'
             }
 
-        alarm_keys = get_all_alarm_keys_safe(redis_client)
-        total_alarms = len(alarm_keys)
+        if full_sweep:
+            prices = build_price_map()
+
+        # Sahip olunmayan parçalar başka process / node'un işi: aday üretilmeden elenir
+        owned = None if partitions is None else set(partitions)
+
+        if full_sweep and Config.ALARM_SWEEP_ENGINE == "columnar":
+            # Tam tarama: kolon tablosu, sahip olunan satırlar tek vektörel karşılaştırmada
+            alarm_table.ensure_fresh(redis_client)
+            total_alarms = len(alarm_table)
+            candidates   = alarm_table.evaluate(prices, partitions=owned)
+        elif Config.ALARM_ENGINE == "memory":
+            alarm_index.ensure_fresh(redis_client)
+            total_alarms = len(alarm_index)
+            candidates   = [
+                (member, alarm_obj, price)
+                for (code, profile), price in prices.items()
+                for member, alarm_obj in alarm_index.crossed(code, profile, price, partitions=owned)
+            ]
+        else:
+            # ZRANGEBYSCORE: sadece eşiği geçilen üyeler, tek pipeline
+            triggered, total_alarms = alarm_store.find_triggered(redis_client, prices)
+            if owned is not None:
+                triggered = [entry for entry in triggered if partition_of(entry[0]) in owned]
+            bodies     = alarm_store.load_bodies(redis_client, [member for member, _, _, _ in triggered])
+            orphans    = [member for member, body in bodies.items() if body is None]
+            _drop_orphans(redis_client, orphans, partitions)
+            candidates = [(member, bodies[member], price) for member, _, _, price in triggered if bodies.get(member)]
 
         if total_alarms == 0:
             return {
@@ -316,97 +491,77 @@ def check_all_alarms() -> Dict:
                 'checked': 0,
                 'triggered': 0,
                 'failed': 0,
-                'duration_ms': 0
+                'duration_ms': round((time.time() - start_time) * 1000, 2)
             }
 
-        logger.info(f"📊 [ALARM] {total_alarms} alarm kontrol ediliyor...")
+        if full_sweep or candidates:
+            logger.info(
+                f"📊 [ALARM] {total_alarms} alarm, {len(prices)} fiyat, "
+                f"{len(candidates)} eşik geçildi "
+                f"({Config.ALARM_SWEEP_ENGINE if full_sweep else Config.ALARM_ENGINE})"
+            )
 
         checked_count   = 0
         triggered_count = 0
         failed_count    = 0
         skipped_count   = 0
+        now             = time.time()
+        expired         = []
+        to_fire         = []
 
-        for key in alarm_keys:
-            try:
-                alarm_data = redis_client.get(key)
-
-                if not alarm_data:
-                    failed_count += 1
-                    continue
-
-                if isinstance(alarm_data, bytes):
-                    alarm_data = alarm_data.decode('utf-8')
-
-                alarm_obj = json.loads(alarm_data)
-
-                if not alarm_obj.get('is_active', True):
-                    continue
-
-                # DEĞİŞİKLİK: Pazartesi geçiş penceresinde PERCENT alarmlarını atla.
-                # PRICE alarmları (mutlak hedef fiyat) her zaman çalışır —
-                # kullanıcı o fiyata gerçekten ulaşıldığını bilmek ister.
-                alarm_mode = alarm_obj.get('alarm_mode', 'PRICE').upper()
-                if monday_transition and alarm_mode == 'PERCENT':
-                    skipped_count += 1
-                    logger.debug(
-                        f"⏸️ [ALARM] Pazartesi geçiş — PERCENT atlandı: "
-                        f"{alarm_obj.get('currency_code')} ({alarm_obj.get('currency_name')})"
-                    )
-                    continue
-
-                checked_count += 1
-
-                currency_code = alarm_obj.get('currency_code')
-                if not currency_code:
-                    failed_count += 1
-                    continue
-
-                alarm_profile = alarm_obj.get('profile', 'jeweler')
-                current_price = get_current_price(currency_code, profile=alarm_profile)
-
-                if current_price is None or current_price <= 0:
-                    failed_count += 1
-                    continue
-
-                should_trigger = check_alarm_trigger(alarm_obj, current_price)
-
-                if should_trigger:
-                    logger.info(f"🎯 [ALARM] Tetiklendi: {currency_code} ({alarm_profile}) → {current_price}")
-
-                    token_hash = extract_fcm_token_from_key(key)
-                    if not token_hash:
-                        failed_count += 1
-                        continue
+        # 1) Bellekte eleme — Redis'e gitmeden
+        for member, alarm_obj, current_price in candidates:
+            if not alarm_obj.get('is_active', True):
+                continue
 
-                    fcm_token = get_fcm_token_from_hash(token_hash)
-                    if not fcm_token:
-                        redis_client.delete(key)
-                        logger.info(f"🗑️ [ALARM] Geçersiz alarm silindi: {key}")
-                        failed_count += 1
-                        continue
+            if alarm_store.is_expired(alarm_obj, now):
+                expired.append(member)
+                continue
 
-                    # 🔥 DÜZELTİLDİ: send_alarm_notification_v2 kullanılıyor
-                    notification_sent = send_alarm_notification_v2(
-                        fcm_token,
-                        alarm_obj,
-                        current_price
-                    )
+            # DEĞİŞİKLİK: Pazartesi geçiş penceresinde PERCENT alarmlarını atla.
+            # PRICE alarmları (mutlak hedef fiyat) her zaman çalışır —
+            # kullanıcı o fiyata gerçekten ulaşıldığını bilmek ister.
+            alarm_mode = alarm_obj.get('alarm_mode', 'PRICE').upper()
+            if monday_transition and alarm_mode == 'PERCENT':
+                skipped_count += 1
+                logger.debug(
+                    f"⏸️ [ALARM] Pazartesi geçiş — PERCENT atlandı: "
+                    f"{alarm_obj.get('currency_code')} ({alarm_obj.get('currency_name')})"
+                )
+                continue
 
-                    redis_client.delete(key)
+            checked_count += 1
+            if check_alarm_trigger(alarm_obj, current_price):
+                to_fire.append((member, alarm_obj, current_price))
 
-                    if notification_sent:
-                        triggered_count += 1
-                    else:
-                        failed_count += 1
+        detected_at = time.time()
+        published   = _first_crossings(redis_client, to_fire)
 
-            except json.JSONDecodeError:
-                failed_count += 1
-                continue
+        # 2) Claim + 3) gönderim — parça başına, parçalar paralel
+        if partitions is None:
+            groups = {None: (expired, to_fire)}
+        else:
+            groups = {}
+            for member in expired:
+                groups.setdefault(partition_of(member), ([], []))[0].append(member)
+            for entry in to_fire:
+                groups.setdefault(partition_of(entry[0]), ([], []))[1].append(entry)
+
+        jobs = [(partitions.get(p) if partitions else None, group) for p, group in groups.items()]
+        if len(jobs) > 1:
+            with ThreadPoolExecutor(max_workers=min(Config.ALARM_PARTITION_THREADS, len(jobs))) as pool:
+                results = list(pool.map(
+                    lambda job: _claim_and_send(redis_client, *job[1], fence=job[0], timing=(published, detected_at)),
+                    jobs
+                ))
+        else:
+            results = [_claim_and_send(redis_client, *group, fence=fence, timing=(published, detected_at))
+                       for fence, group in jobs]
+        alarm_latency.flush(redis_client)
 
-            except Exception as alarm_err:
-                logger.error(f"❌ [ALARM] Kontrol hatası ({key}): {alarm_err}")
-                failed_count += 1
-                continue
+        for sent, failed in results:
+            triggered_count += sent
+            failed_count    += failed
 
         duration_ms = (time.time() - start_time) * 1000
 
@@ -452,37 +607,11 @@ def get_alarm_stats() -> Dict:
                 'alarm_types': {'HIGH': 0, 'LOW': 0}
             }
 
-        alarm_keys = get_all_alarm_keys_safe(redis_client)
-        total_alarms = len(alarm_keys)
-
-        unique_users = set()
-        high_count   = 0
-        low_count    = 0
-
-        for key in alarm_keys:
-            try:
-                parts = key.split(':')
-                if len(parts) >= 4:
-                    token_hash = parts[1]
-                    alarm_type = parts[3]
-
-                    unique_users.add(token_hash)
-
-                    if alarm_type == 'HIGH':
-                        high_count += 1
-                    elif alarm_type == 'LOW':
-                        low_count += 1
-
-            except:
-                continue
-
+        stats = alarm_store.get_store_stats(redis_client)
         return {
-            'total_alarms': total_alarms,
-            'unique_users': len(unique_users),
-            'alarm_types': {
-                'HIGH': high_count,
-                'LOW': low_count
-            }
+            'total_alarms': stats['total_alarms'],
+            'unique_users': stats['unique_users'],
+            'alarm_types':  stats['alarm_types']
         }
 
     except Exception as e:
@@ -494,6 +623,56 @@ def get_alarm_stats() -> Dict:
         }
 
 
+# Event tarafı: parça başına (partition'sız çalışmada None) son başarıyla değerlendirilen fiyatlar, delta için
+_last_prices: Dict[Optional[int], Dict[Tuple[str, str], float]] = {}
+_last_prices_lock = threading.Lock()
+
+
+def invalidate_last_prices(partitions):
+    """Yeni alınan parçalar: önceki sahibin değerlendirdiği fiyatlar bilinmez, ilk turda tüm fiyatlar değerlendirilir."""
+    with _last_prices_lock:
+        for partition in partitions:
+            _last_prices.pop(partition, None)
+
+
+def evaluate_moved_alarms(partitions: Optional[Dict[int, Tuple[str, str]]] = None) -> Dict:
+    """
+    Yeni generation sonrası: sadece fiyatı son değerlendirmeden beri değişen
+    (code, profile) çiftleri için alarm sorgusu. Fiyatı değişmeyen kod yeni eşik geçemez.
+    Son fiyatlar ancak değerlendirme hatasız bitince güncellenir; hata olursa aynı hareket sonraki turda tekrar denenir.
+    """
+    prices = build_price_map()
+    owned  = [None] if partitions is None else list(partitions)
+
+    # Aynı delta'yı gören parçalar tek check_all_alarms çağrısında
+    groups: Dict[frozenset, List[Optional[int]]] = {}
+    with _last_prices_lock:
+        for stale in [p for p in _last_prices if p not in owned]:
+            del _last_prices[stale]
+        for partition in owned:
+            last  = _last_prices.get(partition, {})
+            moved = frozenset(key for key, price in prices.items() if last.get(key) != price)
+            if moved:
+                groups.setdefault(moved, []).append(partition)
+
+    total = {'total_alarms': 0, 'checked': 0, 'triggered': 0, 'failed': 0, 'duration_ms': 0, 'moved': 0}
+    for moved, members in groups.items():
+        scope  = None if partitions is None else {p: partitions[p] for p in members}
+        result = check_all_alarms(prices={key: prices[key] for key in moved}, partitions=scope)
+        for field in ('checked', 'triggered', 'failed', 'duration_ms'):
+            total[field] += result.get(field, 0)
+        total['total_alarms'] = max(total['total_alarms'], result.get('total_alarms', 0))
+        total['moved']        = max(total['moved'], len(moved))
+        if 'error' in result:
+            total['error'] = result['error']
+            continue
+        with _last_prices_lock:
+            for partition in members:
+                _last_prices.setdefault(partition, {}).update({key: prices[key] for key in moved})
+
+    return total
+
+
 def trigger_immediate_check() -> Dict:
     logger.info("🚀 [ALARM] Manuel kontrol tetiklendi")
     return check_all_alarms()
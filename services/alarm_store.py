@@ -0,0 +1,949 @@
+"""
+Alarm Store - Hash + ZSET tabanlı alarm depolama
+=================================================
+✅ Alarm gövdeleri kullanıcı başına HASH: alarms:{user_key} → field {code}:{type}:{profile}
+✅ (code, profile, HIGH/LOW) başına ZSET, skor = tetik fiyatı
+✅ ZRANGEBYSCORE ile sadece tetiklenen alarmlar (keyspace SCAN yok)
+✅ Tüm yazmalar MULTI/EXEC ile atomik (hash + ZSET birlikte)
+✅ create / sync / delete-all: Lua script, tek script çağrısı (limit + çakışma + token mapping dahil)
+✅ Script'lerin dokunduğu tüm key'ler KEYS'te bildirilir; cluster modundaki Redis'te çalışmayı reddeder
+✅ Sync eski ve yeni seti karşılaştırır: sadece eklenen / değişen / kalkan alarmlar ZSET'e dokunur
+✅ Kullanıcı ve ZSET kayıt set'leri: rebuild / uzlaştırma keyspace SCAN'i yapmaz
+✅ İstatistik sayaçları (HASH) + tekil kullanıcı HyperLogLog'u her yazmada script içinde güncellenir
+✅ Uzlaştırma (reconcile): TTL ile düşen hash'lerin ZSET artıklarını temizler
+✅ Ters token index'i: fcm_token_rev:{token hash} → cihaz (token silme SCAN'siz)
+✅ Eski alarm:{user}:{code}:{type}:{profile} key'leri için migration aracı
+
+Kullanım:
+    python -m services.alarm_store migrate [--dry-run]
+    python -m services.alarm_store reconcile [--rebuild-registry]
+    python -m services.alarm_store reindex-tokens
+"""
+
+import hashlib
+import json
+import logging
+import time
+from typing import Dict, List, Optional, Tuple
+
+from config import Config
+from services.market_service import normalize_code, _CODE_PREFIXES, _CODE_ALIASES
+from services.alarm_index import alarm_threshold, HIGH, LOW
+
+logger = logging.getLogger("KuraBak.AlarmStore")
+
+USER_PREFIX = "alarms:"
+ZSET_PREFIX = "alarm_z:"
+
+USERS_REGISTRY = Config.CACHE_KEYS['alarm_users']
+ZSETS_REGISTRY = Config.CACHE_KEYS['alarm_zsets']
+STATS_KEY      = Config.CACHE_KEYS['alarm_stats']
+USERS_HLL      = Config.CACHE_KEYS['alarm_users_hll']
+
+TOKEN_MAP_PREFIX = "fcm_token_map:"
+TOKEN_REV_PREFIX = "fcm_token_rev:"
+
+
+def _text(value) -> Optional[str]:
+    return value.decode('utf-8') if isinstance(value, bytes) else value
+
+
+def user_key_name(user_key: str) -> str:
+    return f"{USER_PREFIX}{user_key}"
+
+
+def alarm_field(currency_code: str, alarm_type: str, profile: str) -> str:
+    return f"{currency_code}:{alarm_type}:{profile}"
+
+
+def make_member(user_key: str, field: str) -> str:
+    return f"{user_key}:{field}"
+
+
+def split_member(member: str) -> Tuple[str, str]:
+    user_key, _, field = member.partition(':')
+    return user_key, field
+
+
+def token_map_key(user_key: str) -> str:
+    return f"{TOKEN_MAP_PREFIX}{user_key}"
+
+
+def token_rev_key(fcm_token: str) -> str:
+    return f"{TOKEN_REV_PREFIX}{hashlib.sha256(fcm_token.encode()).hexdigest()[:32]}"
+
+
+def zset_key(currency_code: str, profile: str, side: str) -> str:
+    return f"{ZSET_PREFIX}{normalize_code(currency_code)}:{profile}:{side}"
+
+
+def is_expired(alarm_obj: dict, now: Optional[float] = None) -> bool:
+    expires_at = alarm_obj.get('expires_at')
+    return bool(expires_at) and expires_at <= (now or time.time())
+
+
+def _queue_add(pipe, user_key: str, alarm_obj: dict) -> bool:
+    threshold = alarm_threshold(alarm_obj)
+    if threshold is None:
+        return False
+    side, price = threshold
+    field = alarm_field(alarm_obj['currency_code'], alarm_obj['alarm_type'], alarm_obj['profile'])
+    key   = zset_key(alarm_obj['currency_code'], alarm_obj['profile'], side)
+    pipe.hset(user_key_name(user_key), field, json.dumps(alarm_obj))
+    pipe.zadd(key, {make_member(user_key, field): price})
+    pipe.sadd(USERS_REGISTRY, user_key)
+    pipe.sadd(ZSETS_REGISTRY, key)
+    return True
+
+
+def _decode_bodies(raw: dict) -> Dict[str, dict]:
+    bodies = {}
+    for field, body in (raw or {}).items():
+        try:
+            bodies[_text(field)] = json.loads(_text(body))
+        except (ValueError, TypeError):
+            continue
+    return bodies
+
+
+# ─── Lua scriptleri ───────────────────────────────────────────────────────────
+# Alanların ZSET key'leri script içinde field'dan türetilir (normalize_code ile aynı önek / alias
+# tablosu Python sabitlerinden üretilir) ama sadece KEYS'te bildirilmişse kullanılır: istemci
+# hash'in mevcut alanlarını HKEYS ile okuyup key'leri gönderir, arada alan eklendiyse script
+# hiçbir şey yazmadan false döner ve istemci yeniden dener.
+# İstatistik sayaçları sadece ZSET üyeliği gerçekten değiştiğinde güncellenir (ZADD / ZREM dönüşü).
+
+def _lua_table(values) -> str:
+    return "{" + ", ".join(json.dumps(v) for v in values) + "}"
+
+
+_LUA_PRELUDE = """
+local ZSET_PREFIX = %(zset_prefix)s
+local PREFIXES    = %(prefixes)s
+local ALIASES     = {%(aliases)s}
+
+-- Her script'te KEYS[1] = istatistik sayaçları, KEYS[2] = tekil kullanıcı HLL'i
+local STATS_KEY, USERS_HLL = KEYS[1], KEYS[2]
+local DECLARED = {}
+
+local function bind_keys(first)
+    for i = first, #KEYS do
+        DECLARED[KEYS[i]] = true
+    end
+end
+
+local function zset_keys(field)
+    local code, profile = string.match(field, '^([^:]*):[^:]*:(.*)$')
+    for _, prefix in ipairs(PREFIXES) do
+        if string.sub(code, 1, #prefix) == prefix then
+            code = string.sub(code, #prefix + 1)
+            break
+        end
+    end
+    code = ALIASES[code] or code
+    local base = ZSET_PREFIX .. code .. ':' .. profile .. ':'
+    return base .. 'HIGH', base .. 'LOW'
+end
+
+-- Yazmadan önce: alanların ZSET key'lerinin hepsi KEYS'te mi
+local function declared(fields)
+    for _, field in ipairs(fields) do
+        local high, low = zset_keys(field)
+        if not DECLARED[high] or not DECLARED[low] then
+            return false
+        end
+    end
+    return true
+end
+
+-- true: süresi dolmuş, false: canlı, nil: çözülemeyen gövde (Python tarafı gibi yok sayılır)
+local function expired(body, now)
+    local ok, obj = pcall(cjson.decode, body)
+    if not ok or type(obj) ~= 'table' then
+        return nil
+    end
+    local expires_at = tonumber(obj['expires_at'])
+    return expires_at ~= nil and expires_at > 0 and expires_at <= now
+end
+
+local function count(field, side, delta)
+    local profile = string.match(field, ':([^:]*)$')
+    redis.call('HINCRBY', STATS_KEY, 'total', delta)
+    redis.call('HINCRBY', STATS_KEY, 'side:' .. side, delta)
+    redis.call('HINCRBY', STATS_KEY, 'profile:' .. profile, delta)
+end
+
+-- Dönüş: HDEL sonucu (claim için 1 = bu çağrı sildi)
+local function remove(hash_key, user_key, field)
+    local high, low = zset_keys(field)
+    local member    = user_key .. ':' .. field
+    local removed   = redis.call('HDEL', hash_key, field)
+    if redis.call('ZREM', high, member) == 1 then
+        count(field, 'HIGH', -1)
+    end
+    if redis.call('ZREM', low, member) == 1 then
+        count(field, 'LOW', -1)
+    end
+    return removed
+end
+
+local function add(hash_key, users_registry, zsets_registry, user_key, field, body, zkey, score)
+    redis.call('HSET', hash_key, field, body)
+    if redis.call('ZADD', zkey, score, user_key .. ':' .. field) == 1 then
+        count(field, string.match(zkey, '([^:]*)$'), 1)
+    end
+    redis.call('SADD', users_registry, user_key)
+    redis.call('SADD', zsets_registry, zkey)
+    redis.call('PFADD', USERS_HLL, user_key)
+end
+
+local function save_token(token_key, rev_key, user_key, token, token_ttl)
+    if token ~= '' then
+        redis.call('SETEX', token_key, token_ttl, token)
+        redis.call('SETEX', rev_key, token_ttl, user_key)
+    end
+end
+""" % {
+    "zset_prefix": json.dumps(ZSET_PREFIX),
+    "prefixes":    _lua_table(_CODE_PREFIXES),
+    "aliases":     ", ".join(f"[{json.dumps(k)}] = {json.dumps(v)}" for k, v in _CODE_ALIASES.items()),
+}
+
+# KEYS: stats, users HLL, hash, users registry, zsets registry, token map, ters token index,
+#       ZSET'ler (mevcut + yeni alanlar)
+# ARGV: user_key, field, body, zset key, score, now, max alarms, ttl, token, token ttl
+_CREATE_LUA = _LUA_PRELUDE + """
+local hash_key, user_key, field = KEYS[3], ARGV[1], ARGV[2]
+local now = tonumber(ARGV[6])
+bind_keys(8)
+
+local raw    = redis.call('HGETALL', hash_key)
+local fields = {field}
+for i = 1, #raw, 2 do
+    table.insert(fields, raw[i])
+end
+if not declared(fields) then
+    return false
+end
+
+save_token(KEYS[6], KEYS[7], user_key, ARGV[9], ARGV[10])
+
+local live = 0
+local dead = {}
+for i = 1, #raw, 2 do
+    local state = expired(raw[i + 1], now)
+    if state == true then
+        table.insert(dead, raw[i])
+    elseif state == false then
+        if raw[i] == field then
+            return 'exists'
+        end
+        live = live + 1
+    end
+end
+
+if live >= tonumber(ARGV[7]) then
+    return 'limit'
+end
+
+for _, dead_field in ipairs(dead) do
+    remove(hash_key, user_key, dead_field)
+end
+-- Çözülemeyen eski gövde aynı field'daysa ZSET artığı kalmasın
+remove(hash_key, user_key, field)
+add(hash_key, KEYS[4], KEYS[5], user_key, field, ARGV[3], ARGV[4], ARGV[5])
+redis.call('EXPIRE', hash_key, ARGV[8])
+return 'created'
+"""
+
+# KEYS: stats, users HLL, hash, users registry, zsets registry, token map, ters token index,
+#       ZSET'ler (mevcut + yeni alanlar)
+# ARGV: user_key, now, ttl, token, token ttl, (field, body, zset key, score)*
+# Dönüş: {kalkan field'lar, eklenen, değişen, korunan}; bildirilmemiş alan varsa false
+_SYNC_LUA = _LUA_PRELUDE + """
+local hash_key, user_key = KEYS[3], ARGV[1]
+local now = tonumber(ARGV[2])
+bind_keys(8)
+
+local old    = {}
+local fields = {}
+local raw    = redis.call('HGETALL', hash_key)
+for i = 1, #raw, 2 do
+    old[raw[i]] = raw[i + 1]
+    table.insert(fields, raw[i])
+end
+for i = 6, #ARGV, 4 do
+    table.insert(fields, ARGV[i])
+end
+if not declared(fields) then
+    return false
+end
+
+save_token(KEYS[6], KEYS[7], user_key, ARGV[4], ARGV[5])
+
+local added, changed, kept = 0, 0, 0
+local wanted = {}
+for i = 6, #ARGV, 4 do
+    local field, body, zkey, score = ARGV[i], ARGV[i + 1], ARGV[i + 2], ARGV[i + 3]
+    local previous = old[field]
+    wanted[field] = true
+
+    if previous and expired(previous, now) == false
+       and tonumber(redis.call('ZSCORE', zkey, user_key .. ':' .. field)) == tonumber(score) then
+        -- Aynı yön ve eşik: ZSET'e dokunmadan sadece gövde (expires_at) yenilenir
+        redis.call('HSET', hash_key, field, body)
+        kept = kept + 1
+    else
+        if previous then
+            remove(hash_key, user_key, field)
+            changed = changed + 1
+        else
+            added = added + 1
+        end
+        add(hash_key, KEYS[4], KEYS[5], user_key, field, body, zkey, score)
+    end
+end
+
+local removed = {}
+for field, _ in pairs(old) do
+    if not wanted[field] then
+        remove(hash_key, user_key, field)
+        table.insert(removed, field)
+    end
+end
+
+if added + changed + kept > 0 then
+    redis.call('EXPIRE', hash_key, ARGV[3])
+else
+    redis.call('DEL', hash_key)
+    redis.call('SREM', KEYS[4], user_key)
+end
+return {removed, added, changed, kept}
+"""
+
+# KEYS: stats, users HLL, hash, users registry, ZSET'ler — ARGV: user_key
+# Dönüş: silinen field'lar (bildirilmemiş alan varsa false)
+_DELETE_ALL_LUA = _LUA_PRELUDE + """
+local hash_key, user_key = KEYS[3], ARGV[1]
+bind_keys(5)
+local fields = redis.call('HKEYS', hash_key)
+if not declared(fields) then
+    return false
+end
+for _, field in ipairs(fields) do
+    remove(hash_key, user_key, field)
+end
+redis.call('DEL', hash_key)
+redis.call('SREM', KEYS[4], user_key)
+return fields
+"""
+
+# KEYS: stats, users HLL, (opsiyonel) partition lease'i, member'ların hash'leri ve ZSET'leri
+# ARGV: beklenen lease sahibi ('' = fence yok), stale_now ('' = koşulsuz), member id'leri ({user_key}:{field})
+# Lease verildiyse ve sahibi değiştiyse (fencing) hiçbir şey silinmez, nil döner.
+# stale_now verilirse sadece gövdesi olmayan / çözülemeyen / stale_now'da süresi dolmuş üyeler silinir;
+# kontrol silmeyle aynı script'te, arada yeniden kurulan alarm silinmez.
+# Dönüş: member başına HDEL sonucu (stale modda: 1 temizlendi, 0 canlı olduğu için atlandı)
+_REMOVE_LUA = _LUA_PRELUDE + """
+local USER_PREFIX = %s
+local fenced    = ARGV[1] ~= ''
+local stale_now = tonumber(ARGV[2])
+if fenced and redis.call('GET', KEYS[3]) ~= ARGV[1] then
+    return false
+end
+bind_keys(fenced and 4 or 3)
+
+local targets = {}
+local fields  = {}
+for i = 3, #ARGV do
+    local user_key, field = string.match(ARGV[i], '^([^:]*):(.*)$')
+    if not DECLARED[USER_PREFIX .. user_key] then
+        return redis.error_reply('undeclared key: ' .. USER_PREFIX .. user_key)
+    end
+    table.insert(targets, {user_key, field})
+    table.insert(fields, field)
+end
+if not declared(fields) then
+    return redis.error_reply('undeclared ZSET key')
+end
+
+local result = {}
+for i, target in ipairs(targets) do
+    local hash_key = USER_PREFIX .. target[1]
+    if stale_now then
+        local body = redis.call('HGET', hash_key, target[2])
+        if body and expired(body, stale_now) == false then
+            result[i] = 0
+        else
+            remove(hash_key, target[1], target[2])
+            result[i] = 1
+        end
+    else
+        result[i] = remove(hash_key, target[1], target[2])
+    end
+end
+return result
+""" % json.dumps(USER_PREFIX)
+
+_scripts: Dict[Tuple[int, str], object] = {}
+_checked_clients = set()
+
+# Bildirilmemiş alan çıkarsa (arada başka istek alan ekledi) HKEYS + script yeniden
+_SCRIPT_ATTEMPTS = 3
+
+
+def _ensure_single_node(redis_client):
+    """Script'ler çok key'li (hash + ZSET'ler + kayıtlar): cluster'da slot'lar ayrışır, çalışmayı reddet."""
+    if id(redis_client) in _checked_clients:
+        return
+    try:
+        cluster_enabled = int((redis_client.info("cluster") or {}).get("cluster_enabled", 0))
+    except Exception:
+        cluster_enabled = 0  # INFO desteklemeyen proxy / test client'ı
+    if cluster_enabled:
+        raise RuntimeError("Alarm store Redis Cluster'da çalışamaz: script'ler tek slot'a sığmayan key'lere yazar")
+    _checked_clients.add(id(redis_client))
+
+
+def _script(redis_client, source: str):
+    """register_script client başına bir kez; EVALSHA, NOSCRIPT'te otomatik EVAL."""
+    key = (id(redis_client), source)
+    if key not in _scripts:
+        _ensure_single_node(redis_client)
+        _scripts[key] = redis_client.register_script(source)
+    return _scripts[key]
+
+
+def field_zset_keys(fields) -> List[str]:
+    """Alanların (code:type:profile) HIGH ve LOW ZSET key'leri; script'lerin KEYS listesi için."""
+    keys = []
+    for field in fields:
+        code, _, profile = _text(field).split(':', 2)
+        keys.extend((zset_key(code, profile, HIGH), zset_key(code, profile, LOW)))
+    return list(dict.fromkeys(keys))
+
+
+def _entry_args(user_key: str, alarm_obj: dict) -> Optional[List[str]]:
+    """Alarm → script argümanları (field, body, zset key, skor); geçersizse None."""
+    threshold = alarm_threshold(alarm_obj)
+    if threshold is None:
+        return None
+    side, price = threshold
+    field = alarm_field(alarm_obj['currency_code'], alarm_obj['alarm_type'], alarm_obj['profile'])
+    return [field, json.dumps(alarm_obj), zset_key(alarm_obj['currency_code'], alarm_obj['profile'], side), repr(float(price))]
+
+
+# ─── Kullanıcı işlemleri ──────────────────────────────────────────────────────
+
+def get_user_alarms(redis_client, user_key: str) -> List[dict]:
+    """Kullanıcının alarmları; süresi dolanlar listeden çıkarılıp silinir."""
+    bodies  = _decode_bodies(redis_client.hgetall(user_key_name(user_key)))
+    now     = time.time()
+    expired = [field for field, obj in bodies.items() if is_expired(obj, now)]
+
+    if expired:
+        remove_fields(redis_client, user_key, expired)
+
+    return [obj for field, obj in bodies.items() if field not in expired]
+
+
+def create_alarm(redis_client, user_key: str, alarm_obj: dict, fcm_token: str = "") -> str:
+    """
+    Limit + çakışma kontrolü, süresi dolanların temizliği, yazma ve token mapping tek Lua çağrısında.
+    Dönüş: 'created' | 'exists' | 'limit' | 'invalid'
+    """
+    entry = _entry_args(user_key, alarm_obj)
+    if entry is None:
+        return 'invalid'
+
+    field, body, key, score = entry
+    hash_key = user_key_name(user_key)
+    for _ in range(_SCRIPT_ATTEMPTS):
+        result = _script(redis_client, _CREATE_LUA)(
+            keys=[STATS_KEY, USERS_HLL, hash_key, USERS_REGISTRY, ZSETS_REGISTRY,
+                  token_map_key(user_key), token_rev_key(fcm_token or "")]
+                 + field_zset_keys([field, *redis_client.hkeys(hash_key)]),
+            args=[user_key, field, body, key, score, time.time(), Config.MAX_ALARMS_PER_USER,
+                  Config.ALARM_TTL, fcm_token or "", Config.FCM_TOKEN_MAP_TTL],
+        )
+        if result:
+            return _text(result)
+    logger.warning(f"⚠️ [ALARM STORE] {user_key} alanları sürekli değişiyor, alarm yazılamadı")
+    return 'invalid'
+
+
+def remove_members(redis_client, members: List[str], fence: Optional[Tuple[str, str]] = None,
+                   stale_now: Optional[float] = None) -> List[bool]:
+    """
+    Hash + ZSET'lerden atomik silme (ALARM_FETCH_BATCH'lik script çağrıları); her member için HDEL gerçekten sildiyse True.
+    fence: (lease key, sahip değeri) — lease artık bu sahipte değilse hiçbiri silinmez.
+    stale_now: sadece script içinde hâlâ gövdesiz / süresi dolmuş görülenler silinir (True = temizlendi).
+    """
+    if not members:
+        return []
+    if len(members) > Config.ALARM_FETCH_BATCH:
+        # Toplu süre dolumu sonrası tek dev script Redis'i uzun süre bloklamasın: load_bodies gibi parça parça
+        results = []
+        for i in range(0, len(members), Config.ALARM_FETCH_BATCH):
+            results.extend(remove_members(redis_client, members[i:i + Config.ALARM_FETCH_BATCH], fence, stale_now))
+        return results
+    lease_key, owner = fence or (None, "")
+    user_keys = list(dict.fromkeys(split_member(member)[0] for member in members))
+    keys      = [STATS_KEY, USERS_HLL] + ([lease_key] if lease_key else []) \
+                + [user_key_name(user_key) for user_key in user_keys] \
+                + field_zset_keys(split_member(member)[1] for member in members)
+    args    = [owner if lease_key else "", "" if stale_now is None else stale_now] + list(members)
+    results = _script(redis_client, _REMOVE_LUA)(keys=keys, args=args)
+    if results is None:
+        logger.warning(f"⚠️ [ALARM STORE] Lease el değiştirdi ({lease_key}), {len(members)} alarm claim edilmedi")
+        return [False] * len(members)
+    return [bool(result) for result in results]
+
+
+def remove_fields(redis_client, user_key: str, fields: List[str]) -> List[bool]:
+    return remove_members(redis_client, [make_member(user_key, field) for field in fields])
+
+
+def delete_user_alarms(redis_client, user_key: str) -> List[str]:
+    """Kullanıcının tüm alarmlarını tek Lua çağrısında siler, silinen member id'lerini döner."""
+    return delete_alarms_for_users(redis_client, [user_key])
+
+
+def delete_alarms_for_users(redis_client, user_keys: List[str]) -> List[str]:
+    """
+    Birden fazla kullanıcının tüm alarmları: HKEYS'ler bir pipeline, delete-all scriptleri bir pipeline.
+    Arada alan eklenen kullanıcılar (script false döner) yeniden denenir.
+    """
+    script  = _script(redis_client, _DELETE_ALL_LUA) if user_keys else None
+    pending = list(dict.fromkeys(user_keys))
+    removed = []
+    for _ in range(_SCRIPT_ATTEMPTS):
+        if not pending:
+            break
+        pipe = redis_client.pipeline(transaction=False)
+        for user_key in pending:
+            pipe.hkeys(user_key_name(user_key))
+        fields_of = pipe.execute()
+
+        pipe = redis_client.pipeline(transaction=False)
+        for user_key, fields in zip(pending, fields_of):
+            script(keys=[STATS_KEY, USERS_HLL, user_key_name(user_key), USERS_REGISTRY] + field_zset_keys(fields),
+                   args=[user_key], client=pipe)
+
+        retry = []
+        for user_key, fields in zip(pending, pipe.execute()):
+            if fields is None:
+                retry.append(user_key)
+            else:
+                removed.extend(make_member(user_key, _text(field)) for field in fields)
+        pending = retry
+
+    if pending:
+        logger.warning(f"⚠️ [ALARM STORE] {len(pending)} kullanıcının alarmları değişmeye devam etti, silinemedi")
+    return removed
+
+
+def sync_user_alarms(redis_client, user_key: str, alarm_objs: List[dict], fcm_token: str = "") -> dict:
+    """
+    Sync: eski ve yeni set script içinde karşılaştırılır, tek round trip.
+    - Kalkan alarmlar → HDEL + ZREM
+    - Yeni / yönü veya eşiği değişen alarmlar → HSET + ZADD
+    - Aynı kalanlar → sadece gövde yenilenir (ZSET'e dokunulmaz)
+    Dönüş: {removed: [member], written: {member: alarm_obj}, added, changed, kept, invalid}
+    """
+    entries = {}
+    invalid = 0
+    for alarm_obj in alarm_objs:
+        entry = _entry_args(user_key, alarm_obj)
+        if entry is None:
+            invalid += 1
+            continue
+        entries[entry[0]] = (entry, alarm_obj)  # Aynı field tekrarında sonuncusu geçerli
+
+    args = [user_key, time.time(), Config.ALARM_TTL, fcm_token or "", Config.FCM_TOKEN_MAP_TTL]
+    for entry, _ in entries.values():
+        args.extend(entry)
+
+    hash_key = user_key_name(user_key)
+    result   = None
+    for _ in range(_SCRIPT_ATTEMPTS):
+        result = _script(redis_client, _SYNC_LUA)(
+            keys=[STATS_KEY, USERS_HLL, hash_key, USERS_REGISTRY, ZSETS_REGISTRY,
+                  token_map_key(user_key), token_rev_key(fcm_token or "")]
+                 + field_zset_keys([*entries, *redis_client.hkeys(hash_key)]),
+            args=args,
+        )
+        if result:
+            break
+    if not result:
+        raise RuntimeError(f"{user_key} alanları sync sırasında sürekli değişti")
+    removed, added, changed, kept = result
+
+    return {
+        "removed": [make_member(user_key, _text(field)) for field in removed or []],
+        # Korunanlar da görünümlere gider: gövdedeki expires_at yenilendi
+        "written": {make_member(user_key, field): alarm_obj for field, (_, alarm_obj) in entries.items()},
+        "added":   int(added),
+        "changed": int(changed),
+        "kept":    int(kept),
+        "invalid": invalid,
+    }
+
+
+# ─── Tetik sorguları ──────────────────────────────────────────────────────────
+
+def find_triggered(redis_client, prices: Dict[Tuple[str, str], float]) -> Tuple[List[Tuple[str, str, str, float]], int]:
+    """
+    prices: {(code, profile): fiyat}. Tek pipeline:
+    HIGH → ZRANGEBYSCORE -inf..fiyat, LOW → ZRANGEBYSCORE fiyat..+inf, ayrıca ZCARD (toplam için).
+    Dönüş: ([(member, code, profile, fiyat)], toplam alarm sayısı)
+    """
+    pipe  = redis_client.pipeline(transaction=False)
+    order = []
+    for (code, profile), price in prices.items():
+        high_key = zset_key(code, profile, HIGH)
+        low_key  = zset_key(code, profile, LOW)
+        pipe.zrangebyscore(high_key, '-inf', price)
+        pipe.zrangebyscore(low_key, price, '+inf')
+        pipe.zcard(high_key)
+        pipe.zcard(low_key)
+        order.append((code, profile, price))
+
+    results   = pipe.execute() if order else []
+    triggered = []
+    total     = 0
+    for i, (code, profile, price) in enumerate(order):
+        high, low, high_count, low_count = results[i * 4:(i + 1) * 4]
+        total += (high_count or 0) + (low_count or 0)
+        for member in list(high or []) + list(low or []):
+            triggered.append((_text(member), code, profile, price))
+    return triggered, total
+
+
+def load_bodies(redis_client, members: List[str]) -> Dict[str, Optional[dict]]:
+    """member id → alarm gövdesi; HGET'ler ALARM_FETCH_BATCH'lik pipeline'larda. Gövdesi olmayan None."""
+    bodies = {}
+    for i in range(0, len(members), Config.ALARM_FETCH_BATCH):
+        batch = members[i:i + Config.ALARM_FETCH_BATCH]
+        pipe  = redis_client.pipeline(transaction=False)
+        for member in batch:
+            user_key, field = split_member(member)
+            pipe.hget(user_key_name(user_key), field)
+
+        for member, raw in zip(batch, pipe.execute()):
+            try:
+                bodies[member] = json.loads(_text(raw)) if raw else None
+            except (ValueError, TypeError):
+                bodies[member] = None
+    return bodies
+
+
+def claim_members(redis_client, members: List[str], fence: Optional[Tuple[str, str]] = None) -> Dict[str, bool]:
+    """
+    Tetiklenen alarmları atomik siler (claim). HDEL 1 dönen alarm bu çalıştırmaya aittir;
+    0 dönen başka bir yerde silinmiştir, bildirim gönderilmez.
+    """
+    members = list(dict.fromkeys(members))
+    return dict(zip(members, remove_members(redis_client, members, fence)))
+
+
+def drop_orphan_members(redis_client, members: List[str], fence: Optional[Tuple[str, str]] = None):
+    """
+    Gövdesi olmayan ZSET üyelerini (hash TTL ile düşmüş) temizler; sayaçlar da düşer. fence: claim ile aynı.
+    Gövde script içinde yeniden kontrol edilir: arada yeniden kurulan alarm silinmez.
+    """
+    remove_members(redis_client, members, fence, stale_now=time.time())
+
+
+# ─── Toplu okuma / istatistik ─────────────────────────────────────────────────
+
+def _scan(redis_client, pattern: str) -> List[str]:
+    keys   = []
+    cursor = 0
+    while True:
+        cursor, batch = redis_client.scan(cursor=cursor, match=pattern, count=500)
+        keys.extend(_text(k) for k in batch)
+        if cursor == 0:
+            break
+    return keys
+
+
+def _registry_members(redis_client, registry: str) -> List[str]:
+    members = []
+    cursor  = 0
+    while True:
+        cursor, batch = redis_client.sscan(registry, cursor=cursor, count=500)
+        members.extend(_text(m) for m in batch)
+        if cursor == 0:
+            break
+    return members
+
+
+def iter_all_alarms(redis_client):
+    """(member id, alarm_obj) — in-memory görünüm rebuild'i için; kullanıcı hash'leri pipeline ile okunur."""
+    user_keys  = _registry_members(redis_client, USERS_REGISTRY)
+    batch_size = Config.ALARM_INDEX_MGET_BATCH
+    now        = time.time()
+
+    for i in range(0, len(user_keys), batch_size):
+        batch = user_keys[i:i + batch_size]
+        pipe  = redis_client.pipeline(transaction=False)
+        for user_key in batch:
+            pipe.hgetall(user_key_name(user_key))
+        for user_key, raw in zip(batch, pipe.execute()):
+            for field, alarm_obj in _decode_bodies(raw).items():
+                if not is_expired(alarm_obj, now):
+                    yield make_member(user_key, field), alarm_obj
+
+
+def _counter(counters: dict, name: str) -> int:
+    try:
+        return max(int(counters.get(name) or 0), 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+def get_store_stats(redis_client) -> dict:
+    """Sayaç hash'i + HyperLogLog: O(1). Sayaçlar hiç yazılmamışsa bir kereliğine hesaplanır."""
+    pipe = redis_client.pipeline(transaction=False)
+    pipe.hgetall(STATS_KEY)
+    pipe.pfcount(USERS_HLL)
+    raw, unique_users = pipe.execute()
+
+    counters = {_text(k): _text(v) for k, v in (raw or {}).items()}
+    if not counters:
+        counters, unique_users = rebuild_stats(redis_client)
+
+    return {
+        "total_alarms": _counter(counters, "total"),
+        "unique_users": unique_users or 0,
+        "alarm_types":  {HIGH: _counter(counters, f"side:{HIGH}"), LOW: _counter(counters, f"side:{LOW}")},
+        "profiles":     {"raw": _counter(counters, "profile:raw"), "jeweler": _counter(counters, "profile:jeweler")},
+    }
+
+
+def rebuild_stats(redis_client, zset_counts: Optional[Dict[str, int]] = None,
+                  users: Optional[List[str]] = None) -> Tuple[dict, int]:
+    """
+    Sayaçları ZSET kardinalitelerinden, HLL'i kayıtlı kullanıcılardan yeniden yazar.
+    Uzlaştırma kendi hesapladığı sayıları verir; arada yapılan yazmalar bir sonraki turda düzelir.
+    """
+    if zset_counts is None:
+        zkeys = _registry_members(redis_client, ZSETS_REGISTRY)
+        pipe  = redis_client.pipeline(transaction=False)
+        for key in zkeys:
+            pipe.zcard(key)
+        zset_counts = dict(zip(zkeys, pipe.execute() if zkeys else []))
+    if users is None:
+        users = _registry_members(redis_client, USERS_REGISTRY)
+
+    counters = {"total": 0, f"side:{HIGH}": 0, f"side:{LOW}": 0, "profile:raw": 0, "profile:jeweler": 0}
+    for key, count in zset_counts.items():
+        _, profile, side = key[len(ZSET_PREFIX):].rsplit(':', 2)
+        counters["total"]                += count or 0
+        counters[f"side:{side}"]          = counters.get(f"side:{side}", 0) + (count or 0)
+        counters[f"profile:{profile}"]    = counters.get(f"profile:{profile}", 0) + (count or 0)
+
+    pipe = redis_client.pipeline(transaction=True)
+    pipe.delete(STATS_KEY, USERS_HLL)
+    pipe.hset(STATS_KEY, mapping=counters)
+    for i in range(0, len(users), Config.ALARM_INDEX_MGET_BATCH):
+        pipe.pfadd(USERS_HLL, *users[i:i + Config.ALARM_INDEX_MGET_BATCH])
+    pipe.execute()
+
+    return {k: str(v) for k, v in counters.items()}, len(users)
+
+
+# ─── Uzlaştırma ───────────────────────────────────────────────────────────────
+
+def reconcile_store(redis_client, rebuild_registry: bool = False) -> dict:
+    """
+    TTL kaynaklı kaymaları onarır:
+    - Hash'i düşmüş / gövdesi olmayan / süresi dolmuş ZSET üyeleri → HDEL + ZREM
+    - Boş ZSET'ler ve hash'i olmayan kullanıcılar kayıt set'lerinden çıkarılır
+    - İstatistik sayaçları ve tekil kullanıcı HLL'i kesin sayılarla yeniden yazılır
+    rebuild_registry: kayıt set'lerini bir kereliğine keyspace SCAN ile doldurur (eski kurulumlar için).
+    """
+    start = time.time()
+    stats = {"zsets": 0, "members": 0, "removed": 0, "users_dropped": 0, "zsets_dropped": 0}
+    removed_members = []
+
+    if rebuild_registry:
+        users = [key[len(USER_PREFIX):] for key in _scan(redis_client, f"{USER_PREFIX}*")]
+        zkeys = _scan(redis_client, f"{ZSET_PREFIX}*")
+        pipe  = redis_client.pipeline(transaction=False)
+        if users:
+            pipe.sadd(USERS_REGISTRY, *users)
+        if zkeys:
+            pipe.sadd(ZSETS_REGISTRY, *zkeys)
+        pipe.execute()
+
+    now   = time.time()
+    zkeys = _registry_members(redis_client, ZSETS_REGISTRY)
+    stats["zsets"] = len(zkeys)
+
+    for key in zkeys:
+        cursor = 0
+        while True:
+            cursor, batch = redis_client.zscan(key, cursor=cursor, count=Config.ALARM_FETCH_BATCH)
+            members = [_text(member) for member, _ in batch]
+            stats["members"] += len(members)
+
+            bodies = load_bodies(redis_client, members)
+            stale  = [m for m in members if bodies.get(m) is None or is_expired(bodies[m], now)]
+            if stale:
+                # Aday listesi; silme kararı script içinde yeniden verilir (arada yeniden kurulan alarm kalır)
+                removed = remove_members(redis_client, stale, stale_now=now)
+                removed_members.extend(m for m, done in zip(stale, removed) if done)
+
+            if cursor == 0:
+                break
+
+    # Boş ZSET'ler ve hash'i kalmamış kullanıcılar
+    pipe = redis_client.pipeline(transaction=False)
+    for key in zkeys:
+        pipe.zcard(key)
+    zset_counts = dict(zip(zkeys, pipe.execute() if zkeys else []))
+    empty_zsets = [key for key, count in zset_counts.items() if not count]
+
+    users = _registry_members(redis_client, USERS_REGISTRY)
+    pipe  = redis_client.pipeline(transaction=False)
+    for user_key in users:
+        pipe.exists(user_key_name(user_key))
+    gone_users = [u for u, exists in zip(users, pipe.execute() if users else []) if not exists]
+
+    pipe = redis_client.pipeline(transaction=False)
+    if empty_zsets:
+        pipe.srem(ZSETS_REGISTRY, *empty_zsets)
+    if gone_users:
+        pipe.srem(USERS_REGISTRY, *gone_users)
+    pipe.execute()
+
+    # Sayaç / HLL kayması (TTL, yarım kalan eski yazmalar) burada sıfırlanır
+    gone = set(gone_users)
+    rebuild_stats(redis_client, zset_counts, [u for u in users if u not in gone])
+
+    stats["removed"]       = len(removed_members)
+    stats["zsets_dropped"] = len(empty_zsets)
+    stats["users_dropped"] = len(gone_users)
+    stats["removed_members"] = removed_members
+    stats["duration_ms"]   = round((time.time() - start) * 1000, 2)
+
+    logger.info(
+        f"🧽 [ALARM STORE] Reconcile: {stats['removed']}/{stats['members']} üye temizlendi, "
+        f"{stats['zsets_dropped']} boş ZSET, {stats['users_dropped']} kullanıcı kayıttan düştü "
+        f"({stats['duration_ms']:.0f}ms)"
+    )
+    return stats
+
+
+# ─── Token index ──────────────────────────────────────────────────────────────
+
+def rebuild_token_index(redis_client) -> dict:
+    """Ters index öncesi yazılmış fcm_token_map:* kayıtları için bir kerelik backfill (kalan TTL korunur)."""
+    keys    = _scan(redis_client, f"{TOKEN_MAP_PREFIX}*")
+    written = 0
+    for i in range(0, len(keys), Config.ALARM_INDEX_MGET_BATCH):
+        batch = keys[i:i + Config.ALARM_INDEX_MGET_BATCH]
+        pipe  = redis_client.pipeline(transaction=False)
+        for key in batch:
+            pipe.get(key)
+            pipe.ttl(key)
+        results = pipe.execute()
+
+        pipe = redis_client.pipeline(transaction=False)
+        for n, key in enumerate(batch):
+            token, ttl = _text(results[n * 2]), results[n * 2 + 1]
+            if not token:
+                continue
+            pipe.setex(token_rev_key(token), ttl if ttl and ttl > 0 else Config.FCM_TOKEN_MAP_TTL,
+                       key[len(TOKEN_MAP_PREFIX):])
+            written += 1
+        pipe.execute()
+
+    logger.info(f"🔑 [ALARM STORE] Token index: {written}/{len(keys)} mapping için ters kayıt yazıldı")
+    return {"mappings": len(keys), "written": written}
+
+
+# ─── Migration ────────────────────────────────────────────────────────────────
+
+def migrate_legacy_alarms(redis_client, dry_run: bool = False) -> dict:
+    """
+    alarm:{user}:{code}:{type}:{profile} string key'lerini hash + ZSET düzenine taşır.
+    Kalan TTL expires_at olarak gövdeye yazılır; her alarm kendi MULTI'sinde taşınıp eski key silinir.
+    """
+    from services.alarm_service import get_all_alarm_keys_safe
+
+    keys   = get_all_alarm_keys_safe(redis_client)
+    stats  = {"found": len(keys), "migrated": 0, "skipped": 0, "dry_run": dry_run}
+    batch_size = Config.ALARM_INDEX_MGET_BATCH
+
+    for i in range(0, len(keys), batch_size):
+        batch = keys[i:i + batch_size]
+
+        pipe = redis_client.pipeline(transaction=False)
+        for key in batch:
+            pipe.get(key)
+            pipe.ttl(key)
+        results = pipe.execute()
+
+        for n, key in enumerate(batch):
+            raw, ttl = results[n * 2], results[n * 2 + 1]
+            try:
+                alarm_obj = json.loads(_text(raw)) if raw else None
+            except (ValueError, TypeError):
+                alarm_obj = None
+
+            parts = key.split(':')
+            if not alarm_obj or len(parts) < 5 or alarm_threshold(alarm_obj) is None:
+                stats["skipped"] += 1
+                continue
+
+            user_key = parts[1]
+            alarm_obj.setdefault('profile', parts[4])
+            if not alarm_obj.get('trigger_price'):
+                alarm_obj['trigger_price'] = round(alarm_threshold(alarm_obj)[1], 6)
+            alarm_obj['expires_at'] = int(time.time() + (ttl if ttl and ttl > 0 else Config.ALARM_TTL))
+
+            if not dry_run:
+                tx = redis_client.pipeline(transaction=True)
+                _queue_add(tx, user_key, alarm_obj)
+                tx.expire(user_key_name(user_key), Config.ALARM_TTL)
+                tx.delete(key)
+                tx.execute()
+            stats["migrated"] += 1
+
+    if stats["migrated"] and not dry_run:
+        rebuild_stats(redis_client)
+
+    logger.info(
+        f"🚚 [ALARM STORE] Migration: {stats['migrated']}/{stats['found']} taşındı, "
+        f"{stats['skipped']} atlandı{' (dry-run)' if dry_run else ''}"
+    )
+    return stats
+
+
+if __name__ == "__main__":
+    import sys
+    from utils.cache import get_redis_client
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    command = sys.argv[1] if len(sys.argv) > 1 else None
+    if command not in ("migrate", "reconcile", "reindex-tokens"):
+        print("Kullanım: python -m services.alarm_store migrate [--dry-run] | reconcile [--rebuild-registry] | reindex-tokens")
+        sys.exit(1)
+
+    client = get_redis_client()
+    if not client:
+        print("❌ Redis bağlantısı yok (REDIS_URL)")
+        sys.exit(1)
+
+    if command == "migrate":
+        print(json.dumps(migrate_legacy_alarms(client, dry_run="--dry-run" in sys.argv), indent=2))
+    elif command == "reindex-tokens":
+        print(json.dumps(rebuild_token_index(client), indent=2))
+    else:
+        result = reconcile_store(client, rebuild_registry="--rebuild-registry" in sys.argv)
+        result.pop("removed_members", None)
+        print(json.dumps(result, indent=2))
@@ -0,0 +1,334 @@
+"""
+Alarm Table - Tam tarama için kolon bazlı alarm tablosu
+========================================================
+✅ Paralel diziler: (code, profile) index, mod, yön, hedef, başlangıç, yüzde
+✅ check_alarm_trigger kuralları tek seferde vektörel karşılaştırma (NumPy varsa)
+✅ NumPy yoksa aynı kolonlar üzerinde saf Python döngüsü (JSON/dict yok)
+✅ create/delete/sync olaylarıyla artımlı bakım (silinen satırlar yeniden kullanılır); diğer process'ler
+   aynı değişiklikleri change stream'den uygular, tam tarama öncesi her seferinde yeniden yükleme yok
+✅ Partition kolonu: node sadece sahip olduğu parçaların satırlarını değerlendirir
+
+Benchmark:
+    python -m services.alarm_table [--alarms 1000000]
+"""
+
+import logging
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from services.alarm_partitions import partition_of
+from services.market_service import normalize_code
+from services.alarm_index import AlarmView, register_view, alarm_threshold, HIGH
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+logger = logging.getLogger("KuraBak.AlarmTable")
+
+MODE_PRICE   = 0
+MODE_PERCENT = 1
+
+DIR_UP   = 0  # HIGH / UP
+DIR_DOWN = 1  # LOW / DOWN
+
+_INITIAL_CAPACITY = 1024
+
+
+def encode_alarm(alarm_obj: dict):
+    """Alarm → (code, profile, mode, direction, target, start, percent); geçersizse None."""
+    try:
+        code    = normalize_code(alarm_obj.get('currency_code') or '')
+        profile = alarm_obj.get('profile', 'jeweler')
+        mode    = (alarm_obj.get('alarm_mode') or 'PRICE').upper()
+        start   = float(alarm_obj.get('start_price') or 0)
+
+        if not code:
+            return None
+
+        # Normalize edilmiş PERCENT alarmı: mutlak eşik, PRICE gibi değerlendirilir
+        if alarm_obj.get('trigger_price'):
+            threshold = alarm_threshold(alarm_obj)
+            if threshold is None:
+                return None
+            side, trigger_price = threshold
+            return code, profile, MODE_PRICE, DIR_UP if side == HIGH else DIR_DOWN, trigger_price, start, 0.0
+
+        if mode == 'PERCENT':
+            percent   = float(alarm_obj.get('percent_value') or 0)
+            direction = (alarm_obj.get('percent_direction') or '').upper()
+            if start <= 0 or percent <= 0 or direction not in ('UP', 'DOWN'):
+                return None
+            return code, profile, MODE_PERCENT, DIR_UP if direction == 'UP' else DIR_DOWN, 0.0, start, percent
+
+        target     = float(alarm_obj.get('target_price') or 0)
+        alarm_type = (alarm_obj.get('alarm_type') or '').upper()
+        if alarm_type not in ('HIGH', 'LOW'):
+            return None
+        return code, profile, MODE_PRICE, DIR_UP if alarm_type == 'HIGH' else DIR_DOWN, target, start, 0.0
+
+    except (TypeError, ValueError):
+        return None
+
+
+class _Columns:
+    """Sabit tipli kolonlar: NumPy varsa ndarray (kapasite ikiye katlanır), yoksa list."""
+
+    _SPEC = (("key", "int32"), ("partition", "int32"), ("mode", "int8"), ("direction", "int8"),
+             ("target", "float64"), ("start", "float64"), ("percent", "float64"), ("alive", "bool"))
+
+    def __init__(self):
+        self.capacity = 0
+        for name, dtype in self._SPEC:
+            setattr(self, name, np.zeros(0, dtype=dtype) if np is not None else [])
+
+    def ensure(self, size: int):
+        if size <= self.capacity:
+            return
+        new_capacity = max(_INITIAL_CAPACITY, self.capacity * 2, size)
+        for name, dtype in self._SPEC:
+            column = getattr(self, name)
+            if np is not None:
+                grown = np.zeros(new_capacity, dtype=dtype)
+                grown[:self.capacity] = column
+                setattr(self, name, grown)
+            else:
+                column.extend([False if dtype == "bool" else 0] * (new_capacity - self.capacity))
+        self.capacity = new_capacity
+
+
+class AlarmTable(AlarmView):
+    name = "ALARM TABLE"
+
+    def __init__(self):
+        super().__init__()
+        self._clear_locked()
+
+    # ─── Bakım ────────────────────────────────────────────────────────────────
+
+    def _clear_locked(self):
+        self._cols                            = _Columns()
+        self._size                            = 0
+        self._free: List[int]                 = []
+        self._members: List[str]              = []
+        self._objects: List[dict]             = []
+        self._row_of: Dict[str, int]          = {}
+        self._keys: Dict[Tuple[str, str], int] = {}
+
+    def _key_index(self, code: str, profile: str) -> int:
+        key = (code, profile)
+        if key not in self._keys:
+            self._keys[key] = len(self._keys)
+        return self._keys[key]
+
+    def _add_locked(self, key: str, alarm_obj: dict):
+        self._remove_locked(key)
+
+        encoded = encode_alarm(alarm_obj)
+        if encoded is None:
+            return
+        code, profile, mode, direction, target, start, percent = encoded
+
+        if self._free:
+            row = self._free.pop()
+            self._members[row] = key
+            self._objects[row] = alarm_obj
+        else:
+            row = self._size
+            self._size += 1
+            self._cols.ensure(self._size)
+            self._members.append(key)
+            self._objects.append(alarm_obj)
+
+        cols = self._cols
+        cols.key[row]       = self._key_index(code, profile)
+        cols.partition[row] = partition_of(key)
+        cols.mode[row]      = mode
+        cols.direction[row] = direction
+        cols.target[row]    = target
+        cols.start[row]     = start
+        cols.percent[row]   = percent
+        cols.alive[row]     = True
+        self._row_of[key]   = row
+
+    def _remove_locked(self, key: str):
+        row = self._row_of.pop(key, None)
+        if row is None:
+            return
+        self._cols.alive[row] = False
+        self._members[row]    = None
+        self._objects[row]    = None
+        self._free.append(row)
+
+    def __len__(self):
+        return len(self._row_of)
+
+    # ─── Değerlendirme ────────────────────────────────────────────────────────
+
+    def _price_vector(self, prices: Dict[Tuple[str, str], float]) -> list:
+        """(code, profile) index'i → fiyat; fiyatı olmayan key NaN (hiçbir karşılaştırma tutmaz)."""
+        vector = [float('nan')] * len(self._keys)
+        for key, i in self._keys.items():
+            price = prices.get(key)
+            if price and price > 0:
+                vector[i] = float(price)
+        return vector
+
+    def evaluate(self, prices: Dict[Tuple[str, str], float],
+                 partitions: Optional[Iterable[int]] = None) -> List[Tuple[str, dict, float]]:
+        """
+        check_alarm_trigger'ın vektörel karşılığı:
+        PRICE   → UP: p >= hedef, DOWN: p <= hedef
+        PERCENT → değişim = (p - start) / start * 100; UP: >= yüzde, DOWN: <= -yüzde
+        partitions verilirse sadece bu parçaların satırları karşılaştırılır.
+        Dönüş: [(member id, alarm_obj, fiyat)]
+        """
+        with self._lock:
+            n = self._size
+            if n == 0:
+                return []
+
+            vector = self._price_vector(prices)
+            owned  = None if partitions is None else set(partitions)
+            if np is not None:
+                rows, current = self._evaluate_numpy(np.asarray(vector, dtype="float64"), n, owned)
+            else:
+                rows, current = self._evaluate_python(vector, n, owned)
+
+            return [(self._members[row], self._objects[row], price) for row, price in zip(rows, current)]
+
+    def _evaluate_numpy(self, vector, n: int, owned: Optional[set]):
+        cols = self._cols
+        # Sahip olunan parçalar: önce satırlar seçilir, karşılaştırma sadece onlarda
+        if owned is None:
+            rows = slice(0, n)
+        else:
+            rows = np.nonzero(cols.alive[:n] & np.isin(cols.partition[:n], list(owned)))[0]
+        p = vector[cols.key[rows]]
+
+        mode, direction = cols.mode[rows], cols.direction[rows]
+        target, start, percent = cols.target[rows], cols.start[rows], cols.percent[rows]
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            change = (p - start) / start * 100
+
+            up   = direction == DIR_UP
+            down = direction == DIR_DOWN
+
+            price_hit   = (mode == MODE_PRICE) & ((up & (p >= target)) | (down & (p <= target)))
+            percent_hit = (mode == MODE_PERCENT) & ((up & (change >= percent)) | (down & (change <= -percent)))
+
+        hits = np.nonzero(cols.alive[rows] & (price_hit | percent_hit))[0]
+        selected = hits if owned is None else rows[hits]
+        return selected.tolist(), p[hits].tolist()
+
+    def _evaluate_python(self, vector: list, n: int, owned: Optional[set]):
+        cols = self._cols
+        rows, current = [], []
+        for row in range(n):
+            if not cols.alive[row]:
+                continue
+            if owned is not None and cols.partition[row] not in owned:
+                continue
+            p = vector[cols.key[row]]
+            if p != p:  # NaN
+                continue
+            if cols.mode[row] == MODE_PERCENT:
+                change = (p - cols.start[row]) / cols.start[row] * 100
+                hit = change >= cols.percent[row] if cols.direction[row] == DIR_UP else change <= -cols.percent[row]
+            else:
+                hit = p >= cols.target[row] if cols.direction[row] == DIR_UP else p <= cols.target[row]
+            if hit:
+                rows.append(row)
+                current.append(p)
+        return rows, current
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {
+                "alarms":   len(self._row_of),
+                "rows":     self._size,
+                "free":     len(self._free),
+                "keys":     len(self._keys),
+                "backend":  "numpy" if np is not None else "python",
+                "version":  self._version,
+                "built_at": self._built_at,
+            }
+
+
+alarm_table = register_view(AlarmTable())
+
+
+def benchmark(alarm_count: int = 100_000, seed: int = 42) -> dict:
+    """
+    Sentetik alarmlarla kolon tablosu vs eski döngü (alarm başına json.loads + check_alarm_trigger).
+    Redis yok; sadece değerlendirme maliyeti ölçülür.
+    """
+    import json
+    import random
+    from services.alarm_service import check_alarm_trigger
+
+    rng    = random.Random(seed)
+    codes  = ["USD", "EUR", "GBP", "CHF", "GRA", "C22", "CUM", "ATA", "AG"]
+    prices = {(code, profile): rng.uniform(30, 4000) for code in codes for profile in ("raw", "jeweler")}
+
+    raw_alarms = []
+    for i in range(alarm_count):
+        code, profile = rng.choice(codes), rng.choice(("raw", "jeweler"))
+        base = prices[(code, profile)]
+        # Gerçekçi dağılım: eşiklerin çoğu güncel fiyatın uzağında, ~%1'i geçilmiş
+        if rng.random() < 0.3:
+            alarm = {"currency_code": code, "profile": profile, "alarm_mode": "PERCENT", "alarm_type": "HIGH",
+                     "start_price": base * rng.uniform(0.99, 1.01), "percent_value": rng.uniform(0.5, 10),
+                     "percent_direction": rng.choice(("UP", "DOWN"))}
+        else:
+            alarm_type = rng.choice(("HIGH", "LOW"))
+            offset     = rng.uniform(-0.002, 0.2)
+            alarm = {"currency_code": code, "profile": profile, "alarm_mode": "PRICE", "alarm_type": alarm_type,
+                     "target_price": base * (1 + offset if alarm_type == "HIGH" else 1 - offset),
+                     "start_price": base}
+        raw_alarms.append((f"u{i}:{code}:{alarm['alarm_type']}:{profile}:{i}", json.dumps(alarm)))
+
+    # Eski döngü: her alarm için decode + tek tek kontrol
+    start = time.perf_counter()
+    legacy_hits = 0
+    for _, raw in raw_alarms:
+        alarm = json.loads(raw)
+        price = prices.get((alarm["currency_code"], alarm["profile"]))
+        if price and check_alarm_trigger(alarm, price):
+            legacy_hits += 1
+    legacy_ms = (time.perf_counter() - start) * 1000
+
+    table = AlarmTable()
+    start = time.perf_counter()
+    with table._lock:
+        for member, raw in raw_alarms:
+            table._add_locked(member, json.loads(raw))
+    load_ms = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    hits  = table.evaluate(prices)
+    table_ms = (time.perf_counter() - start) * 1000
+
+    return {
+        "alarms":        alarm_count,
+        "backend":       "numpy" if np is not None else "python",
+        "legacy_ms":     round(legacy_ms, 2),
+        "table_load_ms": round(load_ms, 2),
+        "table_eval_ms": round(table_ms, 2),
+        "speedup":       round(legacy_ms / table_ms, 1) if table_ms else None,
+        "legacy_hits":   legacy_hits,
+        "table_hits":    len(hits),
+    }
+
+
+if __name__ == "__main__":
+    import json
+    import sys
+
+    count = 100_000
+    if "--alarms" in sys.argv:
+        count = int(sys.argv[sys.argv.index("--alarms") + 1])
+
+    print(json.dumps(benchmark(count), indent=2))
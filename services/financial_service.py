@@ -8,11 +8,12 @@ import time
 import json
 import pytz
 import copy
-from datetime import datetime
+from datetime import datetime, timedelta
 from typing import Optional, List, Dict, Any, Tuple
 
-from utils.cache import set_cache, get_cache, delete_cache, incr_cache
+from utils.cache import set_cache, get_cache, delete_cache, incr_cache, cache_exists
 from utils.event_manager import get_todays_banner
+from services.market_service import publish_market_views
 from config import Config
 
 logger = logging.getLogger(__name__)
@@ -477,6 +478,9 @@ def save_daily_snapshot() -> bool:
             force_disk_backup=True
         )
         logger.info(f"✅ [SNAPSHOT] JEWELER kaydedildi: {len(jeweler_snapshot)} varlık")
+
+        archive_daily_close(raw_snapshot, jeweler_snapshot)
+        refresh_change_baselines()
         
         try:
             from utils.telegram_monitor import telegram_instance
@@ -569,6 +573,18 @@ def rebuild_jeweler_cache() -> bool:
         set_cache(Config.CACHE_KEYS['currencies_jeweler'], {**base_meta, "data": currencies_jeweler}, ttl=0)
         set_cache(Config.CACHE_KEYS['golds_jeweler'],      {**base_meta, "data": golds_jeweler},      ttl=0)
         set_cache(Config.CACHE_KEYS['silvers_jeweler'],    {**base_meta, "data": silvers_jeweler},    ttl=0)
+
+        publish_market_views(
+            {
+                "raw": {
+                    "currencies": currencies_raw.get("data", []),
+                    "golds":      golds_raw.get("data", [])   if golds_raw   else [],
+                    "silvers":    silvers_raw.get("data", []) if silvers_raw else [],
+                },
+                "jeweler": {"currencies": currencies_jeweler, "golds": golds_jeweler, "silvers": silvers_jeweler},
+            },
+            base_meta
+        )
         
         logger.info(
             f"✅ [JEWELER REBUILD] Tamamlandı: "
@@ -623,6 +639,96 @@ def update_jeweler_snapshot() -> bool:
         logger.error(f"❌ [JEWELER SNAPSHOT] Hata: {e}", exc_info=True)
         return False
 
+def _daily_close_key(profile: str, close_date: str) -> str:
+    return f"{Config.CACHE_KEYS['daily_close']}:{profile}:{close_date}"
+
+
+def archive_daily_close(raw_snapshot: dict, jeweler_snapshot: dict, close_date: Optional[str] = None) -> bool:
+    """
+    Gün sonu kapanışlarını tarih bazlı arşive yazar (1W/1M/YTD baseline'ları için).
+    00:00 snapshot'ı bir önceki günün kapanışıdır. Gün içi acil snapshot'lar
+    (Şef, Pazartesi yenileme) mevcut kapanışı ezmez.
+    """
+    try:
+        tz = pytz.timezone('Europe/Istanbul')
+        if close_date is None:
+            close_date = (datetime.now(tz) - timedelta(days=1)).strftime("%Y-%m-%d")
+
+        ttl = Config.DAILY_CLOSE_ARCHIVE_DAYS * 86400
+        for profile, snapshot in (("raw", raw_snapshot), ("jeweler", jeweler_snapshot)):
+            key = _daily_close_key(profile, close_date)
+            if snapshot and not cache_exists(key):
+                set_cache(key, snapshot, ttl=ttl)
+
+        logger.info(f"🗄️ [ARŞİV] {close_date} kapanışı arşivlendi")
+        return True
+
+    except Exception as e:
+        logger.error(f"❌ [ARŞİV] Kapanış arşivleme hatası: {e}")
+        return False
+
+
+def _find_daily_close(profile: str, target_date) -> Tuple[Optional[str], Optional[dict]]:
+    """target_date veya öncesindeki en yakın arşiv kapanışını bulur (hafta sonu/tatil boşlukları için)."""
+    for back in range(Config.DAILY_CLOSE_LOOKBACK_DAYS + 1):
+        day      = (target_date - timedelta(days=back)).strftime("%Y-%m-%d")
+        snapshot = get_cache(_daily_close_key(profile, day))
+        if snapshot:
+            return day, snapshot
+    return None, None
+
+
+def refresh_change_baselines() -> Optional[dict]:
+    """
+    1W/1M/YTD baseline vektörlerini arşivden çözer ve tek cache entry'sine yazar.
+    Günde bir kez çalışır; worker her dakika sadece bu küçük dict'i okur.
+    """
+    try:
+        tz    = pytz.timezone('Europe/Istanbul')
+        today = datetime.now(tz).date()
+
+        targets = {
+            name: today - timedelta(days=days)
+            for name, days in Config.CHANGE_BASELINE_DAYS.items()
+        }
+        targets["ytd"] = today.replace(month=1, day=1) - timedelta(days=1)
+
+        profiles = {}
+        dates    = {}
+        for profile in ("raw", "jeweler"):
+            profiles[profile] = {}
+            for name, target_date in targets.items():
+                close_date, snapshot = _find_daily_close(profile, target_date)
+                if snapshot:
+                    profiles[profile][name] = snapshot
+                    dates[name] = close_date
+
+        baselines = {
+            "date":     today.strftime("%Y-%m-%d"),
+            "dates":    dates,
+            "profiles": profiles,
+        }
+        set_cache(Config.CACHE_KEYS['change_baselines'], baselines, ttl=0)
+
+        logger.info(f"📐 [BASELINE] Güncellendi: {dates or 'arşiv boş'}")
+        return baselines
+
+    except Exception as e:
+        logger.error(f"❌ [BASELINE] Hata: {e}", exc_info=True)
+        return None
+
+
+def get_change_baselines() -> dict:
+    tz        = pytz.timezone('Europe/Istanbul')
+    today_str = datetime.now(tz).strftime("%Y-%m-%d")
+
+    baselines = get_cache(Config.CACHE_KEYS['change_baselines'])
+    if not baselines or baselines.get("date") != today_str:
+        baselines = refresh_change_baselines()
+
+    return baselines or {}
+
+
 def check_maintenance_mode() -> Tuple[bool, str, Optional[str]]:
     maintenance_data = get_cache("system_maintenance")
     if not maintenance_data:
@@ -818,18 +924,28 @@ def update_financial_data():
         
         raw_snapshot     = get_cache(Config.CACHE_KEYS['raw_snapshot'])     or {}
         jeweler_snapshot = get_cache(Config.CACHE_KEYS['jeweler_snapshot']) or {}
+
+        # 1W/1M/YTD baseline'ları günde bir çözülür, burada sadece okunur
+        baseline_profiles = get_change_baselines().get("profiles", {})
+        raw_baselines     = {"1d": raw_snapshot,     **baseline_profiles.get("raw", {})}
+        jeweler_baselines = {"1d": jeweler_snapshot, **baseline_profiles.get("jeweler", {})}
         
-        def enrich_with_calculation(items, snapshot):
+        def enrich_with_calculation(items, baselines):
             enriched = []
             for item in items:
                 code = item['code']
                 current_price = item['selling']
-                change_percent = 0.0
-                
-                if code in snapshot:
-                    old_price = snapshot[code]
+
+                # Tüm baseline'lara karşı değişim tek geçişte: O(varlık × baseline)
+                changes = {}
+                for name in Config.CHANGE_BASELINES:
+                    old_price = baselines.get(name, {}).get(code, 0)
                     if old_price > 0:
-                        change_percent = ((current_price - old_price) / old_price) * 100
+                        changes[name] = round(((current_price - old_price) / old_price) * 100, 2)
+                    else:
+                        changes[name] = None
+
+                change_percent = changes.get("1d") or 0.0
                 
                 trend = "NORMAL"
                 if change_percent >= Config.TREND_HIGH_THRESHOLD:
@@ -838,14 +954,15 @@ def update_financial_data():
                     trend = "HIGH_DOWN"
                 
                 item['change_percent'] = round(change_percent, 2)
+                item['changes'] = changes
                 item['trend'] = trend
                 if current_price > 0:
                     enriched.append(item)
             return enriched
         
-        currencies_raw_e = enrich_with_calculation(currencies, raw_snapshot)
-        golds_raw_e      = enrich_with_calculation(golds, raw_snapshot)
-        silvers_raw_e    = enrich_with_calculation(silvers, raw_snapshot)
+        currencies_raw_e = enrich_with_calculation(currencies, raw_baselines)
+        golds_raw_e      = enrich_with_calculation(golds, raw_baselines)
+        silvers_raw_e    = enrich_with_calculation(silvers, raw_baselines)
         
         if not currencies_raw_e:
             logger.error("❌ Tüm veriler zehirli!")
@@ -881,13 +998,21 @@ def update_financial_data():
         jeweler_golds_items      = _apply_margins(copy.deepcopy(golds),      margin_map)
         jeweler_silvers_items    = _apply_margins(copy.deepcopy(silvers),     margin_map)
         
-        jeweler_currencies = enrich_with_calculation(jeweler_currencies_items, jeweler_snapshot)
-        jeweler_golds      = enrich_with_calculation(jeweler_golds_items,      jeweler_snapshot)
-        jeweler_silvers    = enrich_with_calculation(jeweler_silvers_items,    jeweler_snapshot)
+        jeweler_currencies = enrich_with_calculation(jeweler_currencies_items, jeweler_baselines)
+        jeweler_golds      = enrich_with_calculation(jeweler_golds_items,      jeweler_baselines)
+        jeweler_silvers    = enrich_with_calculation(jeweler_silvers_items,    jeweler_baselines)
         
         set_cache(Config.CACHE_KEYS['currencies_jeweler'], {**base_meta, "data": jeweler_currencies}, ttl=0)
         set_cache(Config.CACHE_KEYS['golds_jeweler'],      {**base_meta, "data": jeweler_golds},      ttl=0)
         set_cache(Config.CACHE_KEYS['silvers_jeweler'],    {**base_meta, "data": jeweler_silvers},    ttl=0)
+
+        publish_market_views(
+            {
+                "raw":     {"currencies": currencies_raw_e,   "golds": golds_raw_e,   "silvers": silvers_raw_e},
+                "jeweler": {"currencies": jeweler_currencies, "golds": jeweler_golds, "silvers": jeweler_silvers},
+            },
+            base_meta
+        )
         
         set_cache("kurabak:last_worker_run", time.time(), ttl=0)
         
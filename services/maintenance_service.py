@@ -394,28 +394,27 @@ def cleanup_old_backups():
         raise
 
 
-def fcm_token_cleanup_job():
+def fcm_token_validation_job():
     try:
-        logger.info("🧹 [FCM CLEANUP] Haftalık geçersiz token temizliği başlıyor...")
-        from utils.notification_service import cleanup_invalid_tokens
-        result = cleanup_invalid_tokens()
-        if result.get('success'):
+        from utils.token_validator import validate_token_slice
+        result = validate_token_slice()
+        if not result.get('success'):
+            logger.error(f"❌ [TOKEN CHECK] Hata: {result.get('error')}")
+            return
+        if result.get('pass_complete'):
+            summary = result['pass']
             logger.info(
-                f"✅ [FCM CLEANUP] Tamamlandı: "
-                f"{result.get('checked', 0)} kontrol edildi, "
-                f"{result.get('removed', 0)} silindi, "
-                f"{result.get('remaining', 0)} kaldı"
+                f"✅ [TOKEN CHECK] Tur tamamlandı: {summary['checked']} kontrol edildi, "
+                f"{summary['removed']} silindi ({summary['duration_h']} saat)"
             )
             _send_telegram(
-                f"🧹 *FCM Token Temizliği Tamamlandı*\n\n"
-                f"✅ Kontrol: {result.get('checked', 0)}\n"
-                f"🗑️ Silinen: {result.get('removed', 0)}\n"
-                f"📱 Kalan: {result.get('remaining', 0)}"
+                f"🧹 *FCM Token Doğrulama Turu Tamamlandı*\n\n"
+                f"✅ Kontrol: {summary['checked']}\n"
+                f"🗑️ Silinen: {summary['removed']}\n"
+                f"⏱️ Süre: {summary['duration_h']} saat"
             )
-        else:
-            logger.error(f"❌ [FCM CLEANUP] Hata: {result.get('error')}")
     except Exception as e:
-        logger.error(f"❌ [FCM CLEANUP] Beklenmeyen hata: {e}")
+        logger.error(f"❌ [TOKEN CHECK] Beklenmeyen hata: {e}")
         raise
 
 
@@ -452,6 +451,64 @@ def alarm_check_job():
         raise
 
 
+def alarm_event_job():
+    """Worker yeni fiyat seti yayınlayınca: sadece fiyatı değişen kodlar değerlendirilir."""
+    try:
+        if _is_weekend_alarm_now():
+            return
+
+        from services.alarm_service import evaluate_moved_alarms
+        result = evaluate_moved_alarms()
+
+        if result.get('triggered', 0) or result.get('failed', 0):
+            logger.info(
+                f"⚡ [ALARM EVENT] {result.get('moved', 0)} fiyat değişti, "
+                f"{result.get('triggered', 0)} tetiklendi, {result.get('failed', 0)} hata "
+                f"({result.get('duration_ms', 0):.2f}ms)"
+            )
+
+        set_cache(Config.CACHE_KEYS['alarm_last_check'], str(time.time()), ttl=0)
+
+    except Exception as e:
+        logger.error(f"❌ [ALARM EVENT] Hata: {e}")
+        raise
+
+
+def alarm_reconcile_job():
+    """Alarm store uzlaştırma: TTL ile düşen hash'lerin ZSET / kayıt artıklarını temizler."""
+    try:
+        from utils.cache import get_redis_client
+        from services.alarm_store import reconcile_store
+        from services.alarm_index import notify_alarm_change
+
+        redis_client = get_redis_client()
+        if not redis_client:
+            logger.warning("⚠️ [ALARM RECONCILE] Redis bağlantısı yok, atlandı")
+            return
+
+        result = reconcile_store(redis_client)
+        if result['removed_members']:
+            notify_alarm_change(redis_client, removals=result['removed_members'])
+
+    except Exception as e:
+        logger.error(f"❌ [ALARM RECONCILE] Hata: {e}")
+        raise
+
+
+def _on_new_generation(generation: int):
+    """Worker thread'ini bekletmemek için alarm değerlendirmesi tek seferlik job olarak kuyruğa alınır."""
+    if not scheduler or not scheduler.running:
+        return
+    scheduler.add_job(
+        alarm_event_job,
+        id='alarm_event',
+        name=f'Alarm Event (gen {generation})',
+        replace_existing=True,
+        max_instances=1,
+        misfire_grace_time=30
+    )
+
+
 def prepare_morning_news_job():
     try:
         logger.info("🌅 [SABAH HAZIRLIK] Sabah haberlerini hazırlama başlıyor...")
@@ -590,7 +647,10 @@ def push_notification_daily():
         from utils.notification_service import send_daily_summary
         result = send_daily_summary()
         if result.get('success'):
-            logger.info(f"✅ [PUSH] {result.get('type', 'bildirim').upper()} gönderildi ({result.get('recipient_count', 0)} kullanıcı)")
+            if result.get('queued'):
+                logger.info(f"✅ [PUSH] {result.get('type', 'bildirim').upper()} kuyruğa alındı (iş: {result.get('job_id')})")
+            else:
+                logger.info(f"✅ [PUSH] {result.get('type', 'bildirim').upper()} gönderildi ({result.get('recipient_count', 0)} kullanıcı)")
         else:
             logger.warning(f"⚠️ [PUSH] Gönderim başarısız: {result.get('error')}")
     except Exception as e:
@@ -614,9 +674,9 @@ def bayram_notification_job():
         else:
             logger.info("ℹ️ [BAYRAM] Bugün bayram yok, bildirim gönderilmeyecek")
             return
-        from utils.notification_service import send_to_all
-        send_to_all(title, body, data={"type": "bayram"})
-        logger.info(f"✅ [BAYRAM] Bildirim gönderildi: {title}")
+        from utils.notification_outbox import enqueue_broadcast
+        enqueue_broadcast(title, body, data={"type": "bayram"})
+        logger.info(f"✅ [BAYRAM] Bildirim gönderime alındı: {title}")
     except Exception as e:
         logger.error(f"❌ [BAYRAM] Hata: {e}")
         raise
@@ -630,9 +690,9 @@ def kasim_notification_job():
         logger.info("🕯️ [10 KASIM] Atatürk'ü Anma bildirimi gönderiliyor...")
         title = "10 Kasım — Atatürk'ü Anma"
         body  = "Mustafa Kemal Atatürk'ü saygı, minnet ve özlemle anıyoruz."
-        from utils.notification_service import send_to_all
-        send_to_all(title, body, data={"type": "anma"})
-        logger.info("✅ [10 KASIM] Bildirim gönderildi")
+        from utils.notification_outbox import enqueue_broadcast
+        enqueue_broadcast(title, body, data={"type": "anma"})
+        logger.info("✅ [10 KASIM] Bildirim gönderime alındı")
     except Exception as e:
         logger.error(f"❌ [10 KASIM] Hata: {e}")
         raise
@@ -948,20 +1008,33 @@ def start_scheduler():
         )
 
         scheduler.add_job(
-            fcm_token_cleanup_job,
-            trigger=CronTrigger(day_of_week='sun', hour=3, minute=30),
-            id='fcm_token_cleanup',
-            name='FCM Token Temizliği (Haftalık)',
+            fcm_token_validation_job,
+            trigger=CronTrigger(minute=30),
+            id='fcm_token_validation',
+            name='FCM Token Doğrulama (Saatlik Dilim)',
             replace_existing=True,
             max_instances=1,
             coalesce=True
         )
 
+        # Partition modunda alarm değerlendirmesi her process'in partition worker'ında
+        from services.alarm_partitions import partitions_enabled
+        if not partitions_enabled():
+            scheduler.add_job(
+                alarm_check_job,
+                trigger=IntervalTrigger(minutes=alarm_interval_minutes),
+                id='alarm_check',
+                name='Alarm Check (Fiyat Alarmları)',
+                replace_existing=True,
+                max_instances=1,
+                coalesce=True
+            )
+
         scheduler.add_job(
-            alarm_check_job,
-            trigger=IntervalTrigger(minutes=alarm_interval_minutes),
-            id='alarm_check',
-            name='Alarm Check (Fiyat Alarmları)',
+            alarm_reconcile_job,
+            trigger=IntervalTrigger(hours=Config.ALARM_RECONCILE_INTERVAL_HOURS),
+            id='alarm_reconcile',
+            name='Alarm Store Uzlaştırma (TTL Kayması)',
             replace_existing=True,
             max_instances=1,
             coalesce=True
@@ -1097,14 +1170,21 @@ def start_scheduler():
             coalesce=True
         )
 
+        if not partitions_enabled():
+            from services.market_service import add_generation_listener
+            add_generation_listener(_on_new_generation)
+
         scheduler.start()
         logger.info("✅ Scheduler başlatıldı!")
         logger.info(f"   👷 Worker:          Her {worker_interval} saniyede")
         logger.info("   👮 Şef:             Her 10 dakikada (+ Sanity Check)")
-        logger.info(f"   🔔 Alarm:           Her {alarm_interval_minutes} dakikada (Cuma 18:00 → Pazartesi 00:10 duraklatılır)")
+        logger.info(f"   🔔 Alarm:           Her yeni fiyat setinde (değişen kodlar) + her {alarm_interval_minutes} dakikada tam tarama (Cuma 18:00 → Pazartesi 00:10 duraklatılır)")
+        if partitions_enabled():
+            logger.info(f"   🧩 Alarm Parçaları: {Config.ALARM_PARTITIONS} parça, lease'li process'ler arasında")
+        logger.info(f"   🧽 Alarm Uzlaştırma: Her {Config.ALARM_RECONCILE_INTERVAL_HOURS} saatte (TTL kayması)")
         logger.info("   📊 Rapor:           Her gün 09:00")
         logger.info("   🧹 Cleanup:         Her gün 03:00")
-        logger.info("   🧹 FCM Cleanup:     Her Pazar 03:30 (dry_run ile geçersiz token temizliği)")
+        logger.info("   🧹 FCM Doğrulama:   Her saat :30 (dry_run ile dilim dilim, haftada bir tam tur)")
         logger.info("   💰 Her 6 saatte → Marj Sağlık + Kademeli Güncelleme")
 
 
@@ -1136,9 +1216,16 @@ def get_scheduler_status() -> Dict[str, Any]:
         last_alarm_check = get_cache(Config.CACHE_KEYS['alarm_last_check'])
         worker_interval  = getattr(Config, 'UPDATE_INTERVAL', 60)
 
+        from services.alarm_partitions import get_partition_status
+        from utils.notification_outbox import get_outbox_status
+        from utils.token_validator import get_validation_status
+
         return {
             'running':          scheduler.running,
             'jobs':             jobs,
+            'alarm_partitions': get_partition_status(),
+            'notify_outbox':    get_outbox_status(),
+            'fcm_validation':   get_validation_status(),
             'last_worker_run':  last_worker_run,
             'last_cleanup_run': last_cleanup_run,
             'last_alarm_check': last_alarm_check,
@@ -1165,10 +1252,10 @@ def get_scheduler_status() -> Dict[str, Any]:
                 'weekend_margin_guard':       True,
                 'weekend_alarm_guard':        True,
                 'monday_snapshot_refresh':    True,
-                'fcm_weekly_cleanup':         True,
+                'fcm_hourly_validation':      True,
                 'weekend_alarm_safe_window':  'Cuma 18:00 → Pazartesi 00:10',
                 'monday_baseline_snapshot':   'Pazartesi 00:15',
-                'fcm_cleanup_schedule':       'Pazar 03:30',
+                'fcm_validation_schedule':    'Her saat :30 (dilim)',
                 'margin_max_step_per_cycle':  _MAX_STEP_PER_CYCLE,
                 'static_override_first':      True,
                 'timezone_aware':             True,
@@ -0,0 +1,481 @@
+"""
+Market Service - Worker tarafında önceden hesaplanan piyasa görünümleri
+=======================================================================
+Her worker güncellemesinde bir kez çalışır, endpoint'ler sadece okur:
+✅ Generation sayacı (her yeni fiyat seti +1) + yeni generation dinleyicileri
+✅ Top movers (yükselen/düşen) + piyasa özeti
+✅ Çapraz kur matrisi (N×N, tek lookup ile çeviri)
+✅ Quote index (code → item, per-code önceden serialize edilmiş fragment)
+✅ Fiyat / snapshot vektörleri (portföy değerleme için dot product)
+✅ Kod başına son fiyat değişimleri ve yayın anları (alarm gecikme ölçümü için, sadece değişenler yazılır)
+✅ Push payload'u için boyutu sınırlı, generation'lı kompakt fiyat özeti
+"""
+
+import heapq
+import json
+import logging
+import operator
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from config import Config
+from utils.cache import set_cache, get_cache, incr_cache, set_raw_cache, get_raw_cache, get_redis_client, ram_cache
+
+logger = logging.getLogger(__name__)
+
+ASSET_CLASSES = ("currencies", "golds", "silvers")
+
+BASE_CURRENCY = "TRY"
+
+_CODE_PREFIXES = ("FOREX_", "GOLD_", "SILVER_")
+_CODE_ALIASES  = {"GUMUS": "AG", "SILVER": "AG", "TL": "TRY"}
+
+_QUOTE_GENERATION_FIELD = "__generation__"
+
+_SNAPSHOT_KEYS = {"raw": Config.CACHE_KEYS['raw_snapshot'], "jeweler": Config.CACHE_KEYS['jeweler_snapshot']}
+
+# Yeni generation yayınlandığında çağrılır (ör. alarm değerlendirmesi)
+_generation_listeners: List = []
+
+# Worker tarafı: (code, profile) → son ALARM_LATENCY_PRICE_HISTORY fiyat değişimi [(yayın anı, fiyat), ...]
+_price_history: Dict[Tuple[str, str], List[Tuple[float, float]]] = {}
+
+# Endpoint tarafı: Redis'ten okunan görünümler generation değişene kadar process içinde tutulur
+_view_memo: Dict[Tuple[str, str], Tuple[int, dict]] = {}
+_view_memo_lock = threading.Lock()
+
+# (profile, kodlar) → (generation, serialize edilmiş push özeti)
+_push_snapshot_memo: Dict[Tuple[str, Tuple[str, ...]], Tuple[int, str]] = {}
+
+
+def normalize_code(code: str) -> str:
+    """Mobil uygulamanın FOREX_/GOLD_/SILVER_ önekli kodlarını standart koda çevirir."""
+    code = (code or "").strip().upper()
+    for prefix in _CODE_PREFIXES:
+        if code.startswith(prefix):
+            code = code[len(prefix):]
+            break
+    return _CODE_ALIASES.get(code, code)
+
+
+def next_generation() -> int:
+    return incr_cache(Config.CACHE_KEYS['price_generation'])
+
+
+def current_generation() -> int:
+    try:
+        return int(get_cache(Config.CACHE_KEYS['price_generation']) or 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+def add_generation_listener(callback):
+    """callback(generation) — worker her yeni fiyat setini yayınladıktan sonra."""
+    if callback not in _generation_listeners:
+        _generation_listeners.append(callback)
+
+
+def _notify_generation(generation: int):
+    for callback in list(_generation_listeners):
+        try:
+            callback(generation)
+        except Exception as e:
+            logger.error(f"❌ [MARKET] Generation dinleyici hatası ({getattr(callback, '__name__', callback)}): {e}")
+
+
+def _load_view(name: str, profile: str, cache_key: str, prepare=None) -> Optional[dict]:
+    """
+    Görünümü generation bazlı memo'dan döner; generation değiştiyse Redis'ten bir kez
+    okuyup (isteğe bağlı prepare ile indeksleyip) memo'yu yeniler.
+    """
+    generation = current_generation()
+    memo_key   = (name, profile)
+
+    cached = _view_memo.get(memo_key)
+    if cached and generation and cached[0] == generation:
+        return cached[1]
+
+    view = get_cache(cache_key)
+    if not view:
+        return None
+    if prepare:
+        view = prepare(view)
+
+    with _view_memo_lock:
+        _view_memo[memo_key] = (view.get("generation", generation), view)
+    return view
+
+
+def _mover_item(item: dict) -> dict:
+    return {
+        "code":           item.get("code"),
+        "name":           item.get("name"),
+        "selling":        item.get("selling"),
+        "change_percent": item.get("change_percent", 0.0),
+        "trend":          item.get("trend", "NORMAL"),
+    }
+
+
+def _summarize(items: List[dict], top_k: int) -> dict:
+    """
+    Heap seçimi ile top-K: O(n log k), tam sıralama yok. Tasarım gereği NumPy yok: item'lar dict ve
+    sınıf başına birkaç düzine; diziye çevirmek seçimin kendisinden pahalı.
+    """
+    change = lambda item: item.get("change_percent", 0.0) or 0.0
+
+    gainers = heapq.nlargest(top_k, (i for i in items if change(i) > 0), key=change)
+    losers  = heapq.nsmallest(top_k, (i for i in items if change(i) < 0), key=change)
+
+    advancers = sum(1 for i in items if change(i) > 0)
+    decliners = sum(1 for i in items if change(i) < 0)
+    total     = len(items)
+
+    return {
+        "gainers": [_mover_item(i) for i in gainers],
+        "losers":  [_mover_item(i) for i in losers],
+        "stats": {
+            "count":      total,
+            "advancers":  advancers,
+            "decliners":  decliners,
+            "unchanged":  total - advancers - decliners,
+            "avg_change": round(sum(change(i) for i in items) / total, 2) if total else 0.0,
+        },
+    }
+
+
+def compute_movers(lists: Dict[str, List[dict]], top_k: int) -> dict:
+    movers = {asset_class: _summarize(lists.get(asset_class) or [], top_k) for asset_class in ASSET_CLASSES}
+    movers["all"] = _summarize(
+        [item for asset_class in ASSET_CLASSES for item in (lists.get(asset_class) or [])],
+        top_k
+    )
+    return movers
+
+
+def compute_cross_rates(lists: Dict[str, List[dict]]) -> Tuple[List[str], List[List[float]]]:
+    """
+    Tüm fiyatlar TRY cinsinden: rate[i][j] = price[i] / price[j] → 1 birim i kaç birim j eder.
+    TRY de matrise dahil (price = 1.0), böylece USD→TRY / TRY→GRA da tek lookup.
+    """
+    codes  = [BASE_CURRENCY]
+    prices = [1.0]
+    for asset_class in ASSET_CLASSES:
+        for item in lists.get(asset_class) or []:
+            price = item.get("selling", 0) or 0
+            if item.get("code") and price > 0:
+                codes.append(item["code"])
+                prices.append(float(price))
+
+    # Tasarım gereği iç içe liste: ~30×30 matris JSON olarak cache'lenir ve endpoint'te tek index ile
+    # okunur; ndarray hem her encode/decode'da dönüşüm ister hem de skaler erişimde listeden yavaştır
+    matrix = [[p_from / p_to for p_to in prices] for p_from in prices]
+    return codes, matrix
+
+
+def compute_price_vectors(lists: Dict[str, List[dict]], snapshot: dict) -> Tuple[List[str], List[float], List[float]]:
+    """Aynı sırada güncel fiyat ve dünkü kapanış vektörleri (snapshot yoksa güncel fiyat → P/L 0)."""
+    codes, prices, previous = [], [], []
+    for asset_class in ASSET_CLASSES:
+        for item in lists.get(asset_class) or []:
+            price = item.get("selling", 0) or 0
+            if item.get("code") and price > 0:
+                codes.append(item["code"])
+                prices.append(float(price))
+                previous.append(float(snapshot.get(item["code"]) or price))
+    return codes, prices, previous
+
+
+def _track_price_history(profile: str, codes: List[str], prices: List[float], published_at: float,
+                         changed: Dict[str, str]):
+    """Fiyatı önceki yayından farklı olan kodlara yeni (yayın anı, fiyat); changed'e Redis alanı olarak eklenir."""
+    for code, price in zip(codes, prices):
+        history = _price_history.setdefault((code, profile), [])
+        if not history or history[-1][1] != price:
+            history.append((round(published_at, 3), price))
+            del history[:-Config.ALARM_LATENCY_PRICE_HISTORY]
+            changed[f"{code}:{profile}"] = json.dumps(history, separators=(",", ":"))
+
+
+def publish_market_views(profile_lists: Dict[str, Dict[str, List[dict]]], meta: dict) -> bool:
+    """
+    profile_lists: {"raw": {"currencies": [...], "golds": [...], "silvers": [...]}, "jeweler": {...}}
+    Her profil için cevap zarfı burada bir kez serialize edilir.
+    """
+    try:
+        top_k      = Config.MARKET_MOVERS_TOP_K
+        timestamp  = datetime.now().isoformat()
+        generation = next_generation()
+        published  = time.time()
+        changed    = {}
+
+        for profile, lists in profile_lists.items():
+            movers = compute_movers(lists, top_k)
+            envelope = {
+                "success":   True,
+                "data":      movers,
+                "meta": {
+                    "profile":     profile,
+                    "top_k":       top_k,
+                    "generation":  generation,
+                    "last_update": meta.get("update_date"),
+                    "status":      meta.get("status", "OPEN"),
+                },
+                "timestamp": timestamp,
+                "message":   f"Piyasa özeti getirildi ({profile})",
+            }
+            set_raw_cache(f"{Config.CACHE_KEYS['market_movers']}:{profile}", json.dumps(envelope, default=str), ttl=0)
+
+            codes, matrix = compute_cross_rates(lists)
+            set_cache(
+                f"{Config.CACHE_KEYS['cross_rates']}:{profile}",
+                {
+                    "generation":  generation,
+                    "timestamp":   time.time(),
+                    "last_update": meta.get("update_date"),
+                    "codes":       codes,
+                    "matrix":      matrix,
+                },
+                ttl=0
+            )
+
+            _publish_quote_index(profile, lists, generation)
+
+            codes, prices, previous = compute_price_vectors(lists, get_cache(_SNAPSHOT_KEYS[profile]) or {})
+            set_cache(
+                f"{Config.CACHE_KEYS['price_vectors']}:{profile}",
+                {"generation": generation, "last_update": meta.get("update_date"),
+                 "codes": codes, "prices": prices, "previous": previous},
+                ttl=0
+            )
+            _track_price_history(profile, codes, prices, published, changed)
+
+        if changed:
+            redis_client = get_redis_client()
+            if redis_client:
+                redis_client.hset(Config.CACHE_KEYS['price_history'], mapping=changed)
+
+        logger.debug(f"📈 [MARKET] Görünümler yayınlandı: gen={generation} {list(profile_lists.keys())}")
+        _notify_generation(generation)
+        return True
+
+    except Exception as e:
+        logger.error(f"❌ [MARKET] Görünüm yayınlama hatası: {e}", exc_info=True)
+        return False
+
+
+def get_market_movers_raw(profile: str) -> Optional[str]:
+    return get_raw_cache(f"{Config.CACHE_KEYS['market_movers']}:{profile}")
+
+
+def get_market_movers(profile: str) -> Optional[dict]:
+    raw = get_market_movers_raw(profile)
+    if not raw:
+        return None
+    try:
+        return json.loads(raw).get("data")
+    except Exception:
+        return None
+
+
+def _index_codes(view: dict) -> dict:
+    view["index"] = {code: i for i, code in enumerate(view.get("codes", []))}
+    return view
+
+
+def get_cross_rates(profile: str) -> Optional[dict]:
+    return _load_view("cross_rates", profile, f"{Config.CACHE_KEYS['cross_rates']}:{profile}", prepare=_index_codes)
+
+
+def convert_amount(view: dict, from_code: str, to_code: str, amount: float) -> Optional[dict]:
+    """Tek dizi lookup'ı; bilinmeyen kodda None döner."""
+    index = view["index"]
+    i = index.get(normalize_code(from_code))
+    j = index.get(normalize_code(to_code))
+    if i is None or j is None:
+        return None
+
+    rate = view["matrix"][i][j]
+    return {
+        "from":   view["codes"][i],
+        "to":     view["codes"][j],
+        "amount": amount,
+        "rate":   rate,
+        "result": amount * rate,
+    }
+
+
+def _quote_index_key(profile: str) -> str:
+    return f"{Config.CACHE_KEYS['quote_index']}:{profile}"
+
+
+def _build_quote_index(generation: int, fragments: Dict[str, str], items: Optional[Dict[str, dict]] = None) -> dict:
+    if items is None:
+        items = {code: json.loads(fragment) for code, fragment in fragments.items()}
+    return {"generation": generation, "fragments": fragments, "items": items}
+
+
+def _publish_quote_index(profile: str, lists: Dict[str, List[dict]], generation: int):
+    """
+    Redis HASH: field = code, value = item JSON'u (fragment). Endpoint fragment'ı
+    decode/encode etmeden zarfa gömer. Yazan process index'i ayrıca memo'ya koyar.
+    """
+    items     = {item["code"]: item for asset_class in ASSET_CLASSES for item in (lists.get(asset_class) or []) if item.get("code")}
+    fragments = {code: json.dumps(item, default=str) for code, item in items.items()}
+    key       = _quote_index_key(profile)
+
+    client = get_redis_client()
+    if client:
+        try:
+            pipe = client.pipeline(transaction=True)
+            pipe.delete(key)
+            pipe.hset(key, mapping={**fragments, _QUOTE_GENERATION_FIELD: str(generation)})
+            pipe.execute()
+        except Exception as e:
+            logger.error(f"❌ [MARKET] Quote index yazma hatası ({profile}): {e}")
+    ram_cache.set(key, {**fragments, _QUOTE_GENERATION_FIELD: str(generation)}, 0)
+
+    with _view_memo_lock:
+        _view_memo[("quotes", profile)] = (generation, _build_quote_index(generation, fragments, items))
+
+
+def _read_quote_fragments(profile: str) -> Optional[Dict[str, str]]:
+    key    = _quote_index_key(profile)
+    client = get_redis_client()
+    if client:
+        try:
+            fragments = client.hgetall(key)
+            if fragments:
+                return {
+                    (k.decode('utf-8') if isinstance(k, bytes) else k): (v.decode('utf-8') if isinstance(v, bytes) else v)
+                    for k, v in fragments.items()
+                }
+        except Exception as e:
+            logger.warning(f"⚠️ [MARKET] Quote index okuma hatası ({profile}): {e}")
+    fragments = ram_cache.get(key)
+    return dict(fragments) if fragments else None
+
+
+def get_quote_index(profile: str) -> Optional[dict]:
+    """{'generation': int, 'fragments': {code: json_str}, 'items': {code: dict}} — generation değişene kadar memo'dan."""
+    generation = current_generation()
+    memo_key   = ("quotes", profile)
+
+    cached = _view_memo.get(memo_key)
+    if cached and generation and cached[0] == generation:
+        return cached[1]
+
+    fragments = _read_quote_fragments(profile)
+    if not fragments:
+        return None
+
+    try:
+        index_generation = int(fragments.pop(_QUOTE_GENERATION_FIELD, generation) or 0)
+    except (TypeError, ValueError):
+        index_generation = generation
+
+    index = _build_quote_index(index_generation, fragments)
+    with _view_memo_lock:
+        _view_memo[memo_key] = (index_generation, index)
+    return index
+
+
+def get_quote_item(code: str, profile: str = "jeweler") -> Optional[dict]:
+    index = get_quote_index(profile)
+    if not index:
+        return None
+    return index["items"].get(normalize_code(code))
+
+
+def get_price_vectors(profile: str) -> Optional[dict]:
+    return _load_view("price_vectors", profile, f"{Config.CACHE_KEYS['price_vectors']}:{profile}", prepare=_index_codes)
+
+
+def value_portfolio(view: dict, holdings: List[Tuple[str, float]]) -> dict:
+    """
+    holdings: [(code, quantity), ...]. Aynı kodlar birleştirilir, bilinmeyen kodlar 'unknown'a düşer.
+    Toplamlar miktar vektörünün fiyat / snapshot vektörleriyle dot product'ı. Tasarım gereği
+    map(operator.mul): portföy birkaç pozisyon, NumPy dizisi kurmak çarpımın kendisinden pahalı.
+    """
+    index = view["index"]
+    quantities: Dict[int, float] = {}
+    unknown = []
+    for code, quantity in holdings:
+        i = index.get(normalize_code(code))
+        if i is None:
+            unknown.append(code)
+        else:
+            quantities[i] = quantities.get(i, 0.0) + quantity
+
+    positions = list(quantities.keys())
+    qty       = list(quantities.values())
+    prices    = [view["prices"][i] for i in positions]
+    previous  = [view["previous"][i] for i in positions]
+
+    values      = list(map(operator.mul, qty, prices))
+    prev_values = list(map(operator.mul, qty, previous))
+    total       = sum(values)
+    prev_total  = sum(prev_values)
+
+    return {
+        "positions": [
+            {
+                "code":           view["codes"][i],
+                "quantity":       qty[n],
+                "price":          prices[n],
+                "value":          values[n],
+                "daily_pl":       values[n] - prev_values[n],
+                "daily_pl_percent": round((values[n] - prev_values[n]) / prev_values[n] * 100, 2) if prev_values[n] else 0.0,
+            }
+            for n, i in enumerate(positions)
+        ],
+        "total_value":      total,
+        "previous_value":   prev_total,
+        "daily_pl":         total - prev_total,
+        "daily_pl_percent": round((total - prev_total) / prev_total * 100, 2) if prev_total else 0.0,
+        "unknown":          unknown,
+    }
+
+
+def push_snapshot_codes() -> List[str]:
+    """Broadcast özeti: majör dövizler, altınlar, gümüş, sonra kalan dövizler; ilk PUSH_SNAPSHOT_TOP_N."""
+    ordered = Config.MOBILE_CURRENCIES[:5] + Config.MOBILE_GOLDS + [Config.MOBILE_SILVER] + Config.MOBILE_CURRENCIES[5:]
+    return ordered[:Config.PUSH_SNAPSHOT_TOP_N]
+
+
+def get_push_snapshot(profile: str = "jeweler", codes: Optional[List[str]] = None) -> Optional[str]:
+    """
+    FCM data alanı için JSON string: {"g": generation, "p": profile, "q": {code: [fiyat, günlük %]}}.
+    Generation başına bir kez serialize edilir; PUSH_SNAPSHOT_MAX_BYTES'ı aşarsa sondaki kodlar düşer.
+    """
+    view = get_price_vectors(profile)
+    if not view:
+        return None
+
+    codes      = tuple(normalize_code(code) for code in (codes or push_snapshot_codes()))
+    generation = view.get("generation", 0)
+    memo_key   = (profile, codes)
+
+    cached = _push_snapshot_memo.get(memo_key)
+    if cached and cached[0] == generation:
+        return cached[1]
+
+    index  = view["index"]
+    quotes = {}
+    for code in codes:
+        i = index.get(code)
+        if i is None:
+            continue
+        price, previous = view["prices"][i], view["previous"][i]
+        quotes[code] = [round(price, 4), round((price - previous) / previous * 100, 2) if previous else 0.0]
+
+    encode  = lambda: json.dumps({"g": generation, "p": profile, "q": quotes}, separators=(",", ":"))
+    encoded = encode()
+    while quotes and len(encoded.encode()) > Config.PUSH_SNAPSHOT_MAX_BYTES:
+        quotes.popitem()
+        encoded = encode()
+
+    with _view_memo_lock:
+        _push_snapshot_memo[memo_key] = (generation, encoded)
+    return encoded
@@ -345,6 +345,33 @@ def set_cache(key: str, data: Any, ttl: int = 300, force_disk_backup: bool = Fal
     return success or True
 
 
+def set_raw_cache(key: str, text: str, ttl: int = 0) -> bool:
+    """Önceden serialize edilmiş JSON string'i olduğu gibi yazar (endpoint tekrar encode etmez)."""
+    client = redis_wrapper.get_client()
+    if client:
+        try:
+            if ttl and ttl > 0:
+                client.setex(key, ttl, text)
+            else:
+                client.set(key, text)
+        except Exception as e:
+            logger.error(f"❌ Redis Yazma Hatası (raw): {e}")
+    ram_cache.set(key, text, ttl)
+    return True
+
+
+def get_raw_cache(key: str) -> Optional[str]:
+    client = redis_wrapper.get_client()
+    if client:
+        try:
+            data = client.get(key)
+            if data:
+                return data.decode('utf-8') if isinstance(data, bytes) else data
+        except Exception as e:
+            logger.warning(f"⚠️ Redis Okuma Hatası (raw): {e}")
+    return ram_cache.get(key)
+
+
 def incr_cache(key: str, ttl: int = 0) -> int:
     client = redis_wrapper.get_client()
     if client:
@@ -0,0 +1,336 @@
+"""
+FCM Dispatcher - Eşzamanlı, hız sınırlı multicast gönderimi
+=============================================================
+✅ 500 token'lık multicast batch'leri (FCM limiti) sınırlı thread havuzunda paralel
+✅ Token bucket: saniyedeki mesaj sayısı FCM kotasının altında tutulur — bucket Redis'te, tüm
+   process / node'lar aynı kotadan çeker (Redis yoksa process içi bucket)
+✅ Öncelik: urgent (alarm) bekleyen varken broadcast kota alamaz, son reserve token'a hiç dokunamaz
+✅ 429 / 5xx: üstel backoff + jitter (Retry-After varsa o), tüm thread'ler birlikte bekler
+✅ Batch içinde geçici hata alan token'lar sadece kendileri yeniden denenir
+✅ Sonuçta throughput (mesaj/sn) raporlanır
+"""
+
+import logging
+import random
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from firebase_admin import messaging
+
+from config import Config
+
+logger = logging.getLogger("KuraBak.FcmDispatcher")
+
+_RETRYABLE_CODES = {"RESOURCE_EXHAUSTED", "UNAVAILABLE", "INTERNAL", "DEADLINE_EXCEEDED"}
+
+_BUCKET_TTL = 60  # Boşta kalan paylaşılan bucket'ın silinmesi (sn)
+
+
+def _status_code(error: Exception) -> Optional[int]:
+    return getattr(getattr(error, "http_response", None), "status_code", None)
+
+
+def is_retryable(error: Exception) -> bool:
+    """429 (kota) ve 5xx geçicidir; geçersiz token / hatalı istek tekrar denenmez."""
+    status = _status_code(error)
+    if status is not None:
+        return status == 429 or status >= 500
+    return str(getattr(error, "code", "")).upper() in _RETRYABLE_CODES
+
+
+def retry_after(error: Exception) -> Optional[float]:
+    headers = getattr(getattr(error, "http_response", None), "headers", None) or {}
+    try:
+        value = headers.get("Retry-After")
+        return float(value) if value else None
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """
+    rate token/sn dolar, en fazla capacity birikir; pause() tüm bekleyenleri durdurur.
+    urgent olmayan çağrılar urgent bekleyen varken yol verir ve bucket'ı reserve altına indiremez.
+    """
+
+    def __init__(self, rate: float, capacity: int, reserve: int = 0):
+        self.rate            = float(rate)
+        self.capacity        = capacity
+        self.reserve         = reserve
+        self._tokens         = float(capacity)
+        self._updated        = time.monotonic()
+        self._paused_until   = 0.0
+        self._urgent_waiting = 0
+        self._lock           = threading.Lock()
+
+    def acquire(self, amount: int, urgent: bool = False):
+        """capacity'den büyük istek capacity'lik parçalar halinde alınır (bucket eksiye düşmez)."""
+        while amount > 0:
+            chunk   = min(amount, self.capacity)
+            amount -= chunk
+            self._acquire_chunk(chunk, urgent)
+
+    def _acquire_chunk(self, amount: int, urgent: bool):
+        needed = amount + (0 if urgent else min(self.reserve, self.capacity - amount))
+        if urgent:
+            with self._lock:
+                self._urgent_waiting += 1
+        try:
+            while True:
+                with self._lock:
+                    yielding = not urgent and self._urgent_waiting
+                # _take lock dışında: Redis bucket'ında round trip sırasında diğer thread'ler beklemez
+                delay = max(needed, 1) / self.rate if yielding else self._take(needed, amount)
+                if not yielding and delay <= 0:
+                    return
+                time.sleep(delay)
+        finally:
+            if urgent:
+                with self._lock:
+                    self._urgent_waiting -= 1
+
+    def _take(self, needed: int, amount: int) -> float:
+        """needed token varsa amount düşer ve 0, yoksa beklenecek süre."""
+        with self._lock:
+            now = time.monotonic()
+            if now < self._paused_until:
+                return self._paused_until - now
+            self._tokens  = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= needed:
+                self._tokens -= amount
+                return 0.0
+            return max(needed - self._tokens, 1) / self.rate
+
+    def pause(self, seconds: float):
+        """Kota / sunucu hatası: bucket boşaltılır, süre dolana kadar kimse gönderemez."""
+        with self._lock:
+            until = time.monotonic() + seconds
+            if until > self._paused_until:
+                self._paused_until = until
+                self._updated      = until
+                self._tokens       = 0.0
+
+
+# KEYS: bucket hash — ARGV: rate, capacity, needed, amount, ttl. Dönüş: beklenecek süre (sn, string)
+# Saat Redis'in (TIME): process / node saatleri arasındaki kayma kotayı bozmaz
+_TAKE_LUA = """
+local t   = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local rate, capacity = tonumber(ARGV[1]), tonumber(ARGV[2])
+local needed, amount = tonumber(ARGV[3]), tonumber(ARGV[4])
+local state  = redis.call('HMGET', KEYS[1], 'tokens', 'updated', 'paused_until')
+local paused = tonumber(state[3]) or 0
+if now < paused then
+    return tostring(paused - now)
+end
+local tokens  = tonumber(state[1]) or capacity
+local updated = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+local delay = 0
+if tokens >= needed then
+    tokens = tokens - amount
+else
+    delay = math.max(needed - tokens, 1) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+redis.call('EXPIRE', KEYS[1], ARGV[5])
+return tostring(delay)
+"""
+
+# KEYS: bucket hash — ARGV: süre (sn), ttl
+_PAUSE_LUA = """
+local t     = redis.call('TIME')
+local resume = tonumber(t[1]) + tonumber(t[2]) / 1000000 + tonumber(ARGV[1])
+if resume > (tonumber(redis.call('HGET', KEYS[1], 'paused_until')) or 0) then
+    redis.call('HSET', KEYS[1], 'paused_until', tostring(resume), 'updated', tostring(resume), 'tokens', '0')
+    redis.call('EXPIRE', KEYS[1], math.ceil(tonumber(ARGV[1])) + tonumber(ARGV[2]))
+end
+return 1
+"""
+
+
+class RedisTokenBucket(TokenBucket):
+    """
+    Kota Redis'teki tek bucket'tan: tüm process'lerin toplamı rate'i aşmaz. Urgent önceliği process içi,
+    reserve ise bucket geneli geçerlidir. Redis'e ulaşılamazsa process içi bucket'a düşülür.
+    """
+
+    def __init__(self, rate: float, capacity: int, reserve: int = 0, key: str = "", redis_client=None):
+        super().__init__(rate, capacity, reserve)
+        self.key           = key or Config.CACHE_KEYS['fcm_rate_bucket']
+        self._redis_client = redis_client
+        self._scripts      = None
+
+    def _redis(self):
+        if self._redis_client is not None:
+            return self._redis_client
+        from utils.cache import get_redis_client
+        return get_redis_client()
+
+    def _script(self, redis_client):
+        if self._scripts is None or self._scripts[0] is not redis_client:
+            self._scripts = (redis_client,
+                             redis_client.register_script(_TAKE_LUA), redis_client.register_script(_PAUSE_LUA))
+        return self._scripts
+
+    def _take(self, needed: int, amount: int) -> float:
+        redis_client = self._redis()
+        if redis_client is not None:
+            try:
+                _, take, _ = self._script(redis_client)
+                return float(take(keys=[self.key],
+                                  args=[self.rate, self.capacity, needed, amount, _BUCKET_TTL]))
+            except Exception as e:
+                logger.warning(f"⚠️ [FCM] Paylaşılan kota okunamadı, process içi bucket: {e}")
+        return super()._take(needed, amount)
+
+    def pause(self, seconds: float):
+        super().pause(seconds)
+        redis_client = self._redis()
+        if redis_client is None:
+            return
+        try:
+            _, _, pause = self._script(redis_client)
+            pause(keys=[self.key], args=[seconds, _BUCKET_TTL])
+        except Exception as e:
+            logger.warning(f"⚠️ [FCM] Paylaşılan kota durdurulamadı: {e}")
+
+
+class FcmDispatcher:
+    def __init__(self, rate: float, burst: int, threads: int, max_retries: int, reserve: int = 0,
+                 bucket: Optional[TokenBucket] = None):
+        self.bucket      = bucket or TokenBucket(rate, burst, reserve)
+        self.threads     = threads
+        self.max_retries = max_retries
+
+    @staticmethod
+    def backoff_delay(attempt: int, error: Optional[Exception]) -> float:
+        """Retry-After varsa o, yoksa üstel backoff + jitter (FCM_BACKOFF_MAX ile sınırlı)."""
+        delay = retry_after(error) if error is not None else None
+        if delay is None:
+            delay = min(Config.FCM_BACKOFF_MAX, Config.FCM_BACKOFF_BASE * (2 ** attempt))
+            delay *= random.uniform(0.5, 1.0)
+        return delay
+
+    def _backoff(self, attempt: int, error: Optional[Exception]) -> float:
+        """Bucket'ı bekleme süresince durdurur, süreyi döner (outbox gecikmeli yeniden deneme için)."""
+        delay = self.backoff_delay(attempt, error)
+        logger.warning(f"⏳ [FCM] Geçici hata ({_status_code(error) or getattr(error, 'code', error)}), "
+                       f"{delay:.1f}s bekleniyor (deneme {attempt + 1})")
+        self.bucket.pause(delay)
+        return delay
+
+    def send_with_retry(self, tokens: List[str],
+                        make_message: Callable[[List[str]], "messaging.MulticastMessage"],
+                        dry_run: bool = False) -> dict:
+        """
+        Tek batch: rate limit + geçici hatalarda yeniden deneme. Token bazlı kalıcı hatalar failures'a,
+        batch'in tamamı gönderilemediyse token'lar unsent'e (hata error'a) yazılır.
+        """
+        pending  = tokens
+        result   = {"success": 0, "failure": 0, "retries": 0, "failures": [], "unsent": [], "error": None}
+
+        for attempt in range(self.max_retries + 1):
+            self.bucket.acquire(len(pending))
+            last_attempt = attempt == self.max_retries
+            try:
+                response = messaging.send_each_for_multicast(make_message(pending), dry_run=dry_run)
+            except Exception as e:
+                if not last_attempt and is_retryable(e):
+                    result["retries"] += 1
+                    self._backoff(attempt, e)
+                    continue
+                logger.error(f"❌ [FCM] Batch hatası ({len(pending)} token): {e}")
+                result["failure"] += len(pending)
+                result["unsent"]   = pending
+                result["error"]    = e
+                return result
+
+            retry_tokens, retry_error = [], None
+            for token, send_response in zip(pending, response.responses):
+                if send_response.success:
+                    result["success"] += 1
+                elif not last_attempt and send_response.exception is not None and is_retryable(send_response.exception):
+                    retry_tokens.append(token)
+                    retry_error = send_response.exception
+                else:
+                    result["failure"] += 1
+                    result["failures"].append((token, send_response.exception))
+
+            if not retry_tokens:
+                break
+            result["retries"] += 1
+            self._backoff(attempt, retry_error)
+            pending = retry_tokens
+
+        return result
+
+    def dispatch(self, batches: Iterable[List[str]],
+                 make_message: Callable[[List[str]], "messaging.MulticastMessage"],
+                 on_failures: Optional[Callable[[List[Tuple[str, Exception]]], None]] = None,
+                 dry_run: bool = False,
+                 on_sent: Optional[Callable[[List[str]], None]] = None) -> Dict:
+        """
+        batches: token listeleri (≤ FCM_BATCH_SIZE), generator olabilir — en fazla 2×threads batch
+        havada tutulur, tüm token'lar belleğe alınmaz.
+        on_failures: kalıcı hata alan (token, exception) listesi ile ana thread'de çağrılır.
+        on_sent: başarıyla gönderilen (dry_run'da geçerli) token'lar ile ana thread'de çağrılır.
+        dry_run: FCM mesajı doğrular ama cihaza göndermez (geçersiz token taraması).
+        """
+        start  = time.time()
+        totals = Counter()
+
+        def collect(done):
+            for future in done:
+                result = future.result()
+                batch  = in_flight.pop(future)
+                if on_sent:
+                    failed = set(result["unsent"]) | {token for token, _ in result["failures"]}
+                    on_sent([token for token in batch if token not in failed])
+                totals["success_count"] += result["success"]
+                totals["failure_count"] += result["failure"]
+                totals["retries"]       += result["retries"]
+                if result["failures"] and on_failures:
+                    on_failures(result["failures"])
+
+        with ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix="FcmDispatch") as pool:
+            in_flight = {}
+            for batch in batches:
+                if not batch:
+                    continue
+                totals["batch_count"]  += 1
+                totals["total_tokens"] += len(batch)
+                in_flight[pool.submit(self.send_with_retry, batch, make_message, dry_run)] = batch
+                if len(in_flight) >= self.threads * 2:
+                    collect(wait(in_flight, return_when=FIRST_COMPLETED)[0])
+            collect(wait(in_flight)[0])
+
+        duration = time.time() - start
+        stats = {
+            "total_tokens":     totals["total_tokens"],
+            "success_count":    totals["success_count"],
+            "failure_count":    totals["failure_count"],
+            "batch_count":      totals["batch_count"],
+            "retries":          totals["retries"],
+            "duration_s":       round(duration, 2),
+            "messages_per_sec": round(totals["success_count"] / duration, 1) if duration > 0 else 0.0,
+        }
+        logger.info(
+            f"🚚 [FCM] {stats['batch_count']} batch, {stats['success_count']}/{stats['total_tokens']} başarılı, "
+            f"{stats['retries']} yeniden deneme, {stats['duration_s']}s → {stats['messages_per_sec']} mesaj/sn"
+        )
+        return stats
+
+
+fcm_dispatcher = FcmDispatcher(
+    rate=Config.FCM_RATE_PER_SEC,
+    burst=Config.FCM_RATE_BURST,
+    threads=Config.FCM_DISPATCH_THREADS,
+    max_retries=Config.FCM_MAX_RETRIES,
+    reserve=Config.FCM_RATE_URGENT_RESERVE,
+    bucket=RedisTokenBucket(Config.FCM_RATE_PER_SEC, Config.FCM_RATE_BURST, Config.FCM_RATE_URGENT_RESERVE),
+)
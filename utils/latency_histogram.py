@@ -0,0 +1,136 @@
+"""
+Latency Histogram - Sabit kovalı gecikme histogramı
+====================================================
+✅ Aşama başına kovalar process içinde biriktirilir, flush'ta tek pipeline ile saatlik Redis hash'ine
+   yazılır (tüm process / node'lar aynı hash'e HINCRBY)
+✅ p50/p95/p99 kovalardan doğrusal interpolasyonla
+✅ flush_all(): process'teki tüm histogramlar (alarm gecikmesi, outbox lane bekleme süresi) tek çağrıda
+"""
+
+import bisect
+import logging
+import threading
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional
+
+from config import Config
+
+logger = logging.getLogger("KuraBak.LatencyHistogram")
+
+# Process'te oluşturulan histogramlar (flush_all için)
+_histograms: List["LatencyHistogram"] = []
+_registry_lock = threading.Lock()
+
+_INF = "inf"
+
+
+def _bucket(ms: float) -> str:
+    buckets = Config.ALARM_LATENCY_BUCKETS_MS
+    i = bisect.bisect_left(buckets, ms)
+    return str(buckets[i]) if i < len(buckets) else _INF
+
+
+def _percentile(histogram: Dict[str, int], total: int, q: float) -> Optional[float]:
+    """Kovalardan yüzdelik: hedef sıranın düştüğü kova içinde doğrusal interpolasyon."""
+    if not total:
+        return None
+    rank, seen, lower = q * total, 0, 0.0
+    for bound in Config.ALARM_LATENCY_BUCKETS_MS:
+        count = histogram.get(str(bound), 0)
+        if count and seen + count >= rank:
+            return round(lower + (bound - lower) * (rank - seen) / count, 1)
+        seen += count
+        lower = float(bound)
+    return lower  # Son kovanın üstü: alt sınır
+
+
+class LatencyHistogram:
+    """Aşama başına sabit kovalı histogram; process içinde biriktirilir, saatlik Redis hash'lerinde toplanır."""
+
+    def __init__(self, key_prefix: str, stages: Iterable[str]):
+        self.key_prefix = key_prefix
+        self.stages     = tuple(stages)
+        self._pending   = Counter()
+        self._lock      = threading.Lock()
+        with _registry_lock:
+            _histograms.append(self)
+
+    def _hour_key(self, moment: datetime) -> str:
+        return f"{self.key_prefix}:{moment.strftime('%Y%m%d%H')}"
+
+    def observe_ms(self, stage: str, ms: float):
+        ms = max(ms, 0)
+        with self._lock:
+            self._pending[f"{stage}:{_bucket(ms)}"] += 1
+            self._pending[f"{stage}:count"]         += 1
+            self._pending[f"{stage}:sum_ms"]        += int(ms)
+
+    def flush(self, redis_client):
+        """Biriken ölçümler tek pipeline ile saatlik hash'e; hata olursa bir sonraki flush'a bırakılır."""
+        with self._lock:
+            pending, self._pending = self._pending, Counter()
+        if not pending:
+            return
+
+        key = self._hour_key(datetime.now())
+        try:
+            pipe = redis_client.pipeline(transaction=False)
+            for field, amount in pending.items():
+                pipe.hincrby(key, field, amount)
+            pipe.expire(key, (Config.ALARM_LATENCY_WINDOW_HOURS + 1) * 3600)
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"⚠️ [LATENCY] Ölçümler yazılamadı ({self.key_prefix}): {e}")
+            with self._lock:
+                self._pending.update(pending)
+
+    def report(self, redis_client=None, hours: Optional[int] = None) -> dict:
+        """Son N saatin (varsayılan ALARM_LATENCY_WINDOW_HOURS) aşama başına histogram ve p50/p95/p99 değerleri."""
+        hours = hours or Config.ALARM_LATENCY_WINDOW_HOURS
+        try:
+            if redis_client is None:
+                from utils.cache import get_redis_client
+                redis_client = get_redis_client()
+            if not redis_client:
+                return {"window_hours": hours, "stages": {}}
+
+            now  = datetime.now()
+            pipe = redis_client.pipeline(transaction=False)
+            for i in range(hours):
+                pipe.hgetall(self._hour_key(now - timedelta(hours=i)))
+
+            totals = Counter()
+            for hour in pipe.execute():
+                for field, value in (hour or {}).items():
+                    totals[field] += int(value)
+
+            stages = {}
+            for stage in self.stages:
+                count = totals.get(f"{stage}:count", 0)
+                histogram = {
+                    str(bound): totals.get(f"{stage}:{bound}", 0)
+                    for bound in (*Config.ALARM_LATENCY_BUCKETS_MS, _INF)
+                }
+                stages[stage] = {
+                    "count":     count,
+                    "mean_ms":   round(totals.get(f"{stage}:sum_ms", 0) / count, 1) if count else None,
+                    "p50_ms":    _percentile(histogram, count, 0.50),
+                    "p95_ms":    _percentile(histogram, count, 0.95),
+                    "p99_ms":    _percentile(histogram, count, 0.99),
+                    "histogram": histogram,
+                }
+
+            return {"window_hours": hours, "buckets_ms": list(Config.ALARM_LATENCY_BUCKETS_MS), "stages": stages}
+
+        except Exception as e:
+            logger.error(f"❌ [LATENCY] Rapor hatası ({self.key_prefix}): {e}")
+            return {"window_hours": hours, "stages": {}, "error": str(e)}
+
+
+def flush_all(redis_client):
+    """Process'teki tüm histogramların biriken ölçümleri Redis'e."""
+    with _registry_lock:
+        histograms = list(_histograms)
+    for histogram in histograms:
+        histogram.flush(redis_client)
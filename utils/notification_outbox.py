@@ -0,0 +1,582 @@
+"""
+Notification Outbox - Redis Streams tabanlı kalıcı bildirim kuyruğu
+====================================================================
+✅ Üreticiler (günlük push, bayram, alarm) işi stream'e yazar; gönderim scheduler thread'inde yapılmaz
+✅ Öncelik lane'leri: alarm ve broadcast ayrı stream + ayrı consumer thread'leri (eşzamanlılık bütçesi);
+   FCM kotasında alarm önceliklidir, 100k'lık broadcast alarm push'larını bekletemez
+✅ Consumer group: her process lane başına NOTIFY_LANE_CONSUMERS thread ile okur, iş bitince XACK;
+   broadcast lane'inde okunan batch'ler FCM_DISPATCH_THREADS'lik havuzda paralel gönderilir
+✅ Broadcast işi 500'lük batch işlerine açılır; SSCAN cursor'ı batch'lerle aynı MULTI'de saklanır,
+   restart sonrası kalınan yerden devam edilir
+✅ Sahibi ölen (ack'lenmemiş) işler idle süresi dolunca devralınır (XPENDING + XCLAIM)
+✅ Geçici hatada yeniden kuyruğa, NOTIFY_OUTBOX_MAX_ATTEMPTS denemeden sonra dead-letter stream'e
+✅ Alarm push'u: sadece geçici FCM hatası backoff ile (gecikmeli ZSET) yeniden denenir; geçersiz token
+   silinir, hatalı alarm gövdesi hemen dead-letter'a
+✅ Broadcast başına sayaçlar (batch, token, başarılı, başarısız, dead): kime ne gittiği izlenebilir
+✅ Lane başına kuyruk derinliği (lag + pending), en eski işin yaşı ve bekleme süresi histogramı
+✅ Kademeli broadcast: token'lar tek SSCAN geçişinde hash ile NOTIFY_BROADCAST_BUCKETS kovaya bölünür,
+   kovaların batch'leri NOTIFY_BROADCAST_SPREAD_S penceresine yayılır (gecikmeli ZSET → vakti gelince stream);
+   push sonrası uygulama açılış dalgası tek dakikaya yığılmaz
+
+Teslim en az bir kez: consumer batch ortasında ölürse o batch yeniden gönderilebilir.
+NOTIFY_OUTBOX=false veya Redis yoksa üreticiler eskisi gibi doğrudan gönderir.
+"""
+
+import json
+import logging
+import math
+import os
+import socket
+import threading
+import time
+import uuid
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+from config import Config
+from utils.cache import get_redis_client
+from utils.latency_histogram import LatencyHistogram, flush_all as flush_histograms
+
+logger = logging.getLogger("KuraBak.Outbox")
+
+KIND_BROADCAST = "broadcast"
+KIND_BATCH     = "batch"
+KIND_ALARM     = "alarm"
+
+# Öncelik sırasıyla
+LANE_ALARM     = "alarm"
+LANE_BROADCAST = "broadcast"
+LANES          = (LANE_ALARM, LANE_BROADCAST)
+
+_LANE_OF = {KIND_ALARM: LANE_ALARM, KIND_BROADCAST: LANE_BROADCAST, KIND_BATCH: LANE_BROADCAST}
+
+# Kuyruğa yazılma → consumer'ın işi alması
+lane_wait = LatencyHistogram(Config.CACHE_KEYS['notify_lane_wait'], LANES)
+
+# Vakti gelen gecikmeli işler lane stream'ine; ZREM + XADD atomik (birden çok consumer aynı işi taşımaz)
+# KEYS: gecikmeli ZSET, alarm stream, broadcast stream
+_PROMOTE_LUA = """
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, tonumber(ARGV[2]))
+for _, member in ipairs(due) do
+    redis.call('ZREM', KEYS[1], member)
+    local entry  = cjson.decode(member)
+    local stream = entry.kind == 'alarm' and KEYS[2] or KEYS[3]
+    redis.call('XADD', stream, 'MAXLEN', '~', ARGV[3], '*',
+               'kind', entry.kind, 'payload', entry.payload, 'job', entry.job,
+               'attempt', entry.attempt, 'queued_at', ARGV[1])
+end
+return #due
+"""
+
+
+def outbox_enabled() -> bool:
+    return Config.NOTIFY_OUTBOX and get_redis_client() is not None
+
+
+def lane_stream(lane: str) -> str:
+    return f"{Config.CACHE_KEYS['notify_outbox']}:{lane}"
+
+
+def job_key(job_id: str) -> str:
+    return f"{Config.CACHE_KEYS['notify_outbox_jobs']}:{job_id}"
+
+
+def _entry(kind: str, payload: dict, job_id: str = "", attempt: int = 0) -> Dict[str, str]:
+    return {
+        "kind":      kind,
+        "payload":   json.dumps(payload, default=str),
+        "job":       job_id,
+        "attempt":   str(attempt),
+        "queued_at": f"{time.time():.3f}",
+    }
+
+
+def _xadd(target, fields: Dict[str, str]):
+    target.xadd(lane_stream(_LANE_OF[fields["kind"]]), fields,
+                maxlen=Config.NOTIFY_OUTBOX_MAXLEN, approximate=True)
+
+
+def _bucket_of(token: str, buckets: int) -> int:
+    """hash() process'e göre değişir; crc32 ile cihaz her broadcast'te aynı kovaya düşer."""
+    return zlib.crc32(token.encode()) % buckets
+
+
+def _ensure_groups(redis_client):
+    for lane in LANES:
+        try:
+            redis_client.xgroup_create(lane_stream(lane), Config.NOTIFY_OUTBOX_GROUP, id="0", mkstream=True)
+        except Exception as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+
+# ─── Üretici ──────────────────────────────────────────────────────────────────
+
+def enqueue_broadcast(title: str, body: str, data: Optional[Dict] = None, priority: str = "high",
+                      spread_s: Optional[int] = None) -> Dict:
+    """
+    Tüm cihazlara bildirim işi. Outbox kapalıysa / yazılamazsa send_to_all ile doğrudan gönderilir.
+    spread_s: teslimin yayılacağı pencere (varsayılan NOTIFY_BROADCAST_SPREAD_S, 0: hepsi hemen).
+    """
+    redis_client = get_redis_client()
+    if Config.NOTIFY_OUTBOX and redis_client:
+        try:
+            job_id   = uuid.uuid4().hex[:12]
+            spread_s = Config.NOTIFY_BROADCAST_SPREAD_S if spread_s is None else spread_s
+            buckets  = Config.NOTIFY_BROADCAST_BUCKETS if spread_s > 0 else 1
+            payload  = {"title": title, "body": body, "data": dict(data or {}), "priority": priority,
+                        "spread_s": spread_s, "buckets": buckets}
+
+            pipe = redis_client.pipeline(transaction=True)
+            pipe.hset(job_key(job_id), mapping={"title": title, "state": "queued", "created_at": f"{time.time():.0f}",
+                                                "spread_s": spread_s, "buckets": buckets})
+            pipe.expire(job_key(job_id), Config.NOTIFY_OUTBOX_JOB_TTL)
+            pipe.set(Config.CACHE_KEYS['notify_last_broadcast'], job_id)
+            _xadd(pipe, _entry(KIND_BROADCAST, payload, job_id))
+            pipe.execute()
+
+            logger.info(f"📮 [OUTBOX] Broadcast kuyruğa alındı: {title} ({job_id})")
+            return {"success": True, "queued": True, "job_id": job_id}
+
+        except Exception as e:
+            logger.error(f"❌ [OUTBOX] Kuyruğa yazılamadı, doğrudan gönderiliyor: {e}")
+
+    from utils.notification_service import send_to_all
+    return send_to_all(title, body, data, priority)
+
+
+def enqueue_alarms(redis_client, jobs: List[dict]) -> bool:
+    """
+    Claim edilmiş alarm push'ları: {token, alarm, price, published_at, detected_at}, tek pipeline.
+    False: yazılamadı, çağıran doğrudan göndermeli (alarm zaten store'dan silindi).
+    """
+    if not jobs:
+        return True
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        for job in jobs:
+            _xadd(pipe, _entry(KIND_ALARM, job))
+        pipe.execute()
+        return True
+    except Exception as e:
+        logger.error(f"❌ [OUTBOX] {len(jobs)} alarm kuyruğa yazılamadı: {e}")
+        return False
+
+
+# ─── İşleyiciler ──────────────────────────────────────────────────────────────
+# handler(redis_client, fields, payload, pipe): takip işleri / sayaçlar pipe'a yazılır,
+# pipe XACK ile aynı MULTI'de çalışır. Exception: ack yok, idle sonrası başka consumer devralır.
+
+def _retry_later(pipe, fields: Dict[str, str], payload: dict, error: str, delay: float):
+    """Geçici hata: iş delay saniye sonra gecikmeli ZSET'ten stream'e döner; NOTIFY_OUTBOX_MAX_ATTEMPTS'te dead-letter."""
+    attempt = int(fields.get("attempt") or 0) + 1
+    if attempt >= Config.NOTIFY_OUTBOX_MAX_ATTEMPTS:
+        _dead(pipe, fields, payload, error)
+        return
+    entry = _entry(fields.get("kind", ""), payload, fields.get("job", ""), attempt)
+    pipe.zadd(Config.CACHE_KEYS['notify_outbox_delayed'], {json.dumps(entry, sort_keys=True): time.time() + delay})
+
+
+def _dead(pipe, fields: Dict[str, str], payload: Optional[dict], error: str):
+    dead = dict(fields)
+    if payload is not None:
+        dead["payload"] = json.dumps(payload, default=str)
+    dead.update({"error": error[:500], "failed_at": f"{time.time():.3f}"})
+    pipe.xadd(Config.CACHE_KEYS['notify_outbox_dead'], dead,
+              maxlen=Config.NOTIFY_OUTBOX_DEAD_MAXLEN, approximate=True)
+    if fields.get("job"):
+        try:
+            tokens = (payload if payload is not None else json.loads(fields.get("payload") or "{}")).get("tokens", [])
+        except ValueError:
+            tokens = []
+        pipe.hincrby(job_key(fields["job"]), "dead", len(tokens) or 1)
+    logger.warning(f"☠️ [OUTBOX] Dead-letter: {fields.get('kind')} ({fields.get('job') or '-'}) → {error[:100]}")
+
+
+def _handle_broadcast(redis_client, fields: Dict[str, str], payload: dict, pipe):
+    """Broadcast işi tek SSCAN geçişiyle batch işlerine açılır; kovalıysa her batch kovasının vaktinde stream'e."""
+    _expand(redis_client, fields, payload, int(payload.get("buckets") or 1))
+
+
+def _expand(redis_client, fields: Dict[str, str], payload: dict, buckets: int):
+    """
+    Token set'i tek geçişte taranır; her token crc32 ile kovasına, kova tamponları birkaç batch'lik toplam
+    dolana kadar biriktirilip eşit boyutlu batch'lere bölünür. Kova i'nin batch'leri başlangıçtan
+    i × spread / buckets sonra vadeli: vakti gelmişse doğrudan stream'e, gelmemişse gecikmeli ZSET'e.
+    Cursor yalnızca tüm tamponlar boşaltılırken batch'lerle aynı MULTI'de yazılır (restart'ta kaldığı yerden).
+    """
+    from utils.notification_service import FCM_BATCH_SIZE
+
+    key           = job_key(fields["job"])
+    state, cursor = redis_client.hmget(key, ["state", "cursor"])
+    if state == "expanded":
+        return
+    cursor = int(cursor or 0)
+
+    redis_client.hsetnx(key, "started_at", f"{time.time():.3f}")
+    started_at = float(redis_client.hget(key, "started_at"))
+    step       = float(payload.get("spread_s") or 0) / buckets if buckets > 1 else 0.0
+
+    flush_at = FCM_BATCH_SIZE if buckets == 1 else FCM_BATCH_SIZE * 2 * buckets
+    buffers  = [[] for _ in range(buckets)]
+    buffered = 0
+    while True:
+        cursor, tokens = redis_client.sscan(Config.CACHE_KEYS['fcm_tokens'], cursor=cursor, count=FCM_BATCH_SIZE)
+        for token in tokens:
+            buffers[_bucket_of(token, buckets) if buckets > 1 else 0].append(token)
+        buffered += len(tokens)
+        if cursor and buffered < flush_at:
+            continue
+
+        now   = time.time()
+        multi = redis_client.pipeline(transaction=True)
+        for bucket, buffer in enumerate(buffers):
+            if not buffer:
+                continue
+            due  = started_at + bucket * step
+            size = math.ceil(len(buffer) / math.ceil(len(buffer) / FCM_BATCH_SIZE))
+            for i in range(0, len(buffer), size):
+                entry = _entry(KIND_BATCH, {**payload, "tokens": buffer[i:i + size]}, fields["job"])
+                if due <= now:
+                    _xadd(multi, entry)
+                else:
+                    multi.zadd(Config.CACHE_KEYS['notify_outbox_delayed'], {json.dumps(entry, sort_keys=True): due})
+                multi.hincrby(key, "batches", 1)
+        multi.hincrby(key, "tokens", buffered)
+        multi.hset(key, mapping={"cursor": cursor, "state": "expanding" if cursor else "expanded"})
+        multi.execute()
+        buffers  = [[] for _ in range(buckets)]
+        buffered = 0
+        if cursor == 0:
+            break
+
+    batches = redis_client.hget(key, "batches") or 0
+    if buckets > 1:
+        logger.info(f"📦 [OUTBOX] Broadcast {fields['job']} {batches} batch'e açıldı, {buckets} kova "
+                    f"{payload.get('spread_s')}s'ye yayılıyor")
+    else:
+        logger.info(f"📦 [OUTBOX] Broadcast {fields['job']} {batches} batch'e açıldı")
+
+
+def _handle_batch(redis_client, fields: Dict[str, str], payload: dict, pipe):
+    from utils.fcm_dispatcher import fcm_dispatcher, is_retryable
+    from utils.notification_service import _multicast_factory, _drop_invalid_tokens, with_price_snapshot
+
+    # Özet gönderim anında eklenir: yayılmış broadcast'in son kovaları da güncel generation'ı taşır
+    data_payload = with_price_snapshot(dict(payload.get("data") or {}))
+    data_payload["title"] = payload.get("title", "")
+    data_payload["body"]  = payload.get("body", "")
+
+    result = fcm_dispatcher.send_with_retry(
+        payload["tokens"], _multicast_factory(data_payload, payload.get("priority", "high"))
+    )
+
+    retry     = [token for token, err in result["failures"] if err is not None and is_retryable(err)]
+    permanent = [(token, err) for token, err in result["failures"] if err is None or not is_retryable(err)]
+    retry    += result["unsent"]
+    _drop_invalid_tokens(permanent)
+
+    if fields.get("job"):
+        key = job_key(fields["job"])
+        pipe.hincrby(key, "success", result["success"])
+        pipe.hincrby(key, "failure", len(permanent))
+    if retry:
+        # send_with_retry kendi denemelerini bitirdi: iş hemen değil backoff kadar sonra stream'e döner
+        error = result["error"] or next((err for _, err in result["failures"] if err is not None and is_retryable(err)), None)
+        delay = fcm_dispatcher.backoff_delay(int(fields.get("attempt") or 0) + fcm_dispatcher.max_retries, error)
+        _retry_later(pipe, fields, {**payload, "tokens": retry}, str(error or "geçici FCM hatası"), delay)
+
+
+def _handle_alarm(redis_client, fields: Dict[str, str], payload: dict, pipe):
+    from services.alarm_service import deliver_alarm_notification
+    from utils.fcm_dispatcher import fcm_dispatcher
+    from utils.notification_service import ALARM_SENT, ALARM_RETRY, ALARM_INVALID_TOKEN, _drop_invalid_tokens
+
+    status, error = deliver_alarm_notification(
+        payload["token"], payload["alarm"], float(payload["price"]),
+        published_at=payload.get("published_at"), detected_at=payload.get("detected_at")
+    )
+    if status == ALARM_SENT:
+        return
+    if status == ALARM_RETRY:
+        # 429 / 5xx: kota tüm gönderimler için durur, iş backoff kadar sonra yeniden denenir
+        delay = fcm_dispatcher._backoff(int(fields.get("attempt") or 0), error)
+        _retry_later(pipe, fields, payload, f"geçici FCM hatası: {error}", delay)
+    elif status == ALARM_INVALID_TOKEN:
+        _drop_invalid_tokens([(payload["token"], error)])
+    else:
+        _dead(pipe, fields, payload, f"alarm bildirimi gönderilemedi ({status}): {error or '-'}")
+
+
+_HANDLERS = {
+    KIND_BROADCAST: _handle_broadcast,
+    KIND_BATCH:     _handle_batch,
+    KIND_ALARM:     _handle_alarm,
+}
+
+
+# ─── Consumer ─────────────────────────────────────────────────────────────────
+
+class OutboxConsumer(threading.Thread):
+    """Tek lane'in stream'ini okur; lane'ler birbirini beklemez."""
+
+    def __init__(self, redis_client, lane: str, name: str):
+        super().__init__(daemon=True, name=f"Outbox-{lane}-{name}")
+        self.redis_client = redis_client
+        self.lane         = lane
+        self.stream       = lane_stream(lane)
+        self.consumer     = name
+        self._stop_event  = threading.Event()
+        self._last_claim  = 0.0
+        self._promote     = redis_client.register_script(_PROMOTE_LUA)
+
+    def run(self):
+        import firebase_admin
+
+        logger.info(f"📬 [OUTBOX] Consumer başladı: {self.lane}/{self.consumer}")
+        while not self._stop_event.is_set():
+            try:
+                # Firebase yokken iş alınmaz: gönderilemeyen batch'ler boşa dead-letter'a düşmesin
+                if not firebase_admin._apps:
+                    self._stop_event.wait(10)
+                    continue
+
+                if time.time() - self._last_claim >= Config.NOTIFY_OUTBOX_CLAIM_IDLE_MS / 2000:
+                    self._last_claim = time.time()
+                    self._reclaim()
+
+                # Her lane taşır: alarm consumer'ları broadcast yokken de gecikmeli alarm denemelerini alır
+                self._promote(keys=[Config.CACHE_KEYS['notify_outbox_delayed'],
+                                    lane_stream(LANE_ALARM), lane_stream(LANE_BROADCAST)],
+                              args=[time.time(), 100, Config.NOTIFY_OUTBOX_MAXLEN])
+
+                response = self.redis_client.xreadgroup(
+                    Config.NOTIFY_OUTBOX_GROUP, self.consumer, {self.stream: ">"},
+                    count=Config.NOTIFY_OUTBOX_READ_COUNT, block=Config.NOTIFY_OUTBOX_BLOCK_MS,
+                )
+                for _, entries in response or []:
+                    self._process_all(entries)
+
+            except Exception as e:
+                logger.error(f"❌ [OUTBOX] Consumer hatası ({self.lane}/{self.consumer}): {e}")
+                self._stop_event.wait(5)
+
+    def stop(self, timeout: float = 10.0):
+        self._stop_event.set()
+        self.join(timeout)
+        try:
+            # Bekleyen işi yoksa group'tan çıkar; varsa başka consumer devralsın diye bırakılır
+            mine = self.redis_client.xpending_range(
+                self.stream, Config.NOTIFY_OUTBOX_GROUP, "-", "+", 1, consumername=self.consumer
+            )
+            if not mine:
+                self.redis_client.xgroup_delconsumer(self.stream, Config.NOTIFY_OUTBOX_GROUP, self.consumer)
+        except Exception as e:
+            logger.warning(f"⚠️ [OUTBOX] Consumer kapanış hatası ({self.consumer}): {e}")
+
+    def _process_all(self, entries):
+        live = []
+        for entry_id, fields in entries:
+            if fields:
+                live.append((entry_id, fields))
+            else:
+                # MAXLEN ile kırpılmış entry: PEL'den düşür
+                self.redis_client.xack(self.stream, Config.NOTIFY_OUTBOX_GROUP, entry_id)
+
+        if self.lane == LANE_BROADCAST and len(live) > 1:
+            # Okunan batch'ler dispatcher'ın thread bütçesiyle paralel; kota yine ortak bucket'tan
+            list(_batch_pool().map(lambda entry: self._process(*entry), live))
+        else:
+            for entry_id, fields in live:
+                self._process(entry_id, fields)
+        # Alarm gecikmesi (deliver_alarm_notification'da ölçülür) + lane bekleme süreleri
+        flush_histograms(self.redis_client)
+
+    def _process(self, entry_id: str, fields: Dict[str, str]):
+        pipe = self.redis_client.pipeline(transaction=True)
+        kind = fields.get("kind")
+
+        try:
+            lane_wait.observe_ms(self.lane, (time.time() - float(fields.get("queued_at") or 0)) * 1000)
+        except ValueError:
+            pass
+
+        try:
+            payload = json.loads(fields.get("payload") or "{}")
+        except ValueError:
+            payload = None
+
+        handler = _HANDLERS.get(kind)
+        if payload is None or handler is None:
+            _dead(pipe, fields, None, f"geçersiz iş: {kind}")
+        else:
+            try:
+                handler(self.redis_client, fields, payload, pipe)
+            except Exception as e:
+                logger.error(f"❌ [OUTBOX] {kind} işlenemedi ({entry_id}): {e}")
+                return
+
+        pipe.xack(self.stream, Config.NOTIFY_OUTBOX_GROUP, entry_id)
+        pipe.execute()
+
+    def _reclaim(self):
+        """Idle süresini aşan bekleyen işler: çok denenmişse dead-letter, değilse bu consumer'a alınır."""
+        stream, group = self.stream, Config.NOTIFY_OUTBOX_GROUP
+        idle    = Config.NOTIFY_OUTBOX_CLAIM_IDLE_MS
+        pending = self.redis_client.xpending_range(stream, group, "-", "+", 100, idle=idle)
+        if not pending:
+            return
+
+        exhausted = [p["message_id"] for p in pending if p["times_delivered"] >= Config.NOTIFY_OUTBOX_MAX_ATTEMPTS]
+        stale     = [p["message_id"] for p in pending if p["times_delivered"] < Config.NOTIFY_OUTBOX_MAX_ATTEMPTS]
+
+        for entry_id in exhausted:
+            entries = self.redis_client.xrange(stream, entry_id, entry_id)
+            pipe    = self.redis_client.pipeline(transaction=True)
+            if entries:
+                _dead(pipe, entries[0][1], None, "teslim denemeleri tükendi")
+            pipe.xack(stream, group, entry_id)
+            pipe.execute()
+
+        if stale:
+            claimed = self.redis_client.xclaim(stream, group, self.consumer, idle, stale)
+            logger.warning(f"🔁 [OUTBOX] {len(claimed)} sahipsiz iş devralındı ({self.lane}/{self.consumer})")
+            self._process_all(claimed)
+
+
+_consumers: List[OutboxConsumer] = []
+_consumers_lock = threading.Lock()
+_pool: Optional[ThreadPoolExecutor] = None
+
+
+def _batch_pool() -> ThreadPoolExecutor:
+    """Broadcast consumer'larının ortak gönderim havuzu (process başına FCM_DISPATCH_THREADS)."""
+    global _pool
+    with _consumers_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=Config.FCM_DISPATCH_THREADS, thread_name_prefix="OutboxBatch")
+        return _pool
+
+
+def start_outbox_consumers() -> bool:
+    """Her process çağırır; consumer'lar aynı group'ta işi paylaşır."""
+    if not Config.NOTIFY_OUTBOX:
+        return False
+
+    redis_client = get_redis_client()
+    if not redis_client:
+        logger.warning("⚠️ [OUTBOX] Redis yok, consumer başlatılmadı (doğrudan gönderim)")
+        return False
+
+    with _consumers_lock:
+        if any(consumer.is_alive() for consumer in _consumers):
+            return True
+        _ensure_groups(redis_client)
+        prefix = f"{socket.gethostname()}:{os.getpid()}"
+        _consumers[:] = [
+            OutboxConsumer(redis_client, lane, f"{prefix}:{i}")
+            for lane in LANES
+            for i in range(Config.NOTIFY_LANE_CONSUMERS.get(lane, 1))
+        ]
+        for consumer in _consumers:
+            consumer.start()
+    return True
+
+
+def stop_outbox_consumers():
+    global _pool
+    with _consumers_lock:
+        consumers = list(_consumers)
+        for consumer in consumers:
+            consumer._stop_event.set()
+    # Consumer'lar havuzdaki batch'lerini bitirirken _batch_pool'a erişebilsin diye lock dışında
+    for consumer in consumers:
+        consumer.stop()
+    with _consumers_lock:
+        _consumers.clear()
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=True)
+
+
+def _entry_age(entry_id: Optional[str], now_ms: int) -> Optional[float]:
+    """Stream id'sinin ms kısmı kuyruğa yazılma anıdır."""
+    if not entry_id:
+        return None
+    return round(max(now_ms - int(str(entry_id).split("-")[0]), 0) / 1000, 1)
+
+
+def _lane_status(redis_client, lane: str) -> dict:
+    stream = lane_stream(lane)
+    group  = next((g for g in redis_client.xinfo_groups(stream) if g["name"] == Config.NOTIFY_OUTBOX_GROUP), {})
+    lag    = group.get("lag") or 0
+    now_ms = int(time.time() * 1000)
+
+    # En eski bekleyen: ack'lenmemiş en eski iş veya henüz dağıtılmamış ilk iş
+    oldest = []
+    if group.get("pending"):
+        oldest.append(_entry_age(redis_client.xpending(stream, Config.NOTIFY_OUTBOX_GROUP).get("min"), now_ms))
+    if lag:
+        first = redis_client.xrange(stream, f"({group.get('last-delivered-id')}", "+", count=1)
+        if first:
+            oldest.append(_entry_age(first[0][0], now_ms))
+
+    return {
+        "depth":            (group.get("pending") or 0) + lag,
+        "pending":          group.get("pending", 0),
+        "lag":              lag,
+        "oldest_wait_s":    max((age for age in oldest if age is not None), default=0.0),
+        "consumers":        group.get("consumers", 0),
+        "local_consumers":  sum(c.is_alive() for c in _consumers if c.lane == lane),
+    }
+
+
+def get_outbox_status() -> dict:
+    status = {"enabled": Config.NOTIFY_OUTBOX}
+    redis_client = get_redis_client()
+    if not Config.NOTIFY_OUTBOX or not redis_client:
+        return status
+    try:
+        wait = lane_wait.report(redis_client, hours=1)["stages"]
+        status["lanes"] = {
+            lane: {
+                **_lane_status(redis_client, lane),
+                "wait_p50_ms_1h": wait.get(lane, {}).get("p50_ms"),
+                "wait_p95_ms_1h": wait.get(lane, {}).get("p95_ms"),
+            }
+            for lane in LANES
+        }
+        status["dead_letter"] = redis_client.xlen(Config.CACHE_KEYS['notify_outbox_dead'])
+        status["delayed"]     = redis_client.zcard(Config.CACHE_KEYS['notify_outbox_delayed'])
+    except Exception as e:
+        status["error"] = str(e)
+    return status
+
+
+def get_job_status(job_id: str) -> Optional[dict]:
+    """
+    Broadcast sayaçları: state, batches, tokens, success, failure, dead.
+    api_traffic: gönderim öncesi 15 dk (taban) ile yayılma penceresi + 15 dk'nın dakikalık istek dağılımı.
+    """
+    from utils.request_rate import traffic_around
+
+    redis_client = get_redis_client()
+    if not redis_client:
+        return None
+    status = redis_client.hgetall(job_key(job_id))
+    if not status:
+        return None
+    if status.get("started_at"):
+        after_min = int(status.get("spread_s") or 0) // 60 + 15
+        status["api_traffic"] = traffic_around(float(status["started_at"]), 15, after_min, redis_client=redis_client)
+    return status
+
+
+def get_last_broadcast_status() -> Optional[dict]:
+    redis_client = get_redis_client()
+    job_id = redis_client.get(Config.CACHE_KEYS['notify_last_broadcast']) if redis_client else None
+    status = get_job_status(job_id) if job_id else None
+    if status:
+        status["job_id"] = job_id
+    return status
@@ -1,16 +1,24 @@
 import logging
 import time
 import json
-from typing import List, Dict, Optional, Generator
+from typing import Callable, Dict, Generator, Iterable, List, Optional, Tuple
 from datetime import datetime
 import firebase_admin
 from firebase_admin import messaging
 from config import Config
 from utils.cache import get_cache, set_cache, get_redis_client
+from utils.fcm_dispatcher import fcm_dispatcher, is_retryable
 
 logger = logging.getLogger("KuraBak.Notification")
 
-FCM_BATCH_SIZE = 25
+FCM_BATCH_SIZE = Config.FCM_BATCH_SIZE
+
+# send_alarm_notification_status durumları
+ALARM_SENT          = "sent"
+ALARM_RETRY         = "retry"          # 429 / 5xx: gecikmeli yeniden deneme
+ALARM_INVALID_TOKEN = "invalid_token"  # token silinir, tekrar denenmez
+ALARM_BAD_BODY      = "bad_body"       # alarm gövdesi eksik / hatalı: hemen dead-letter
+ALARM_FAILED        = "failed"         # diğer kalıcı FCM hataları
 
 _FIREBASE_NOT_INIT_ERRORS = [
     "the default firebase app does not exist",
@@ -41,7 +49,10 @@ def register_fcm_token(token: str) -> bool:
         if not redis_client:
             logger.error("Redis bağlantısı yok!")
             return False
-        redis_client.sadd(Config.CACHE_KEYS['fcm_tokens'], token)
+        pipe = redis_client.pipeline(transaction=False)
+        pipe.sadd(Config.CACHE_KEYS['fcm_tokens'], token)
+        pipe.zadd(Config.CACHE_KEYS['fcm_token_seen'], {token: time.time()})
+        pipe.execute()
         logger.info(f"✅ [FCM] Token kaydedildi: {token[:20]}...")
         return True
     except Exception as e:
@@ -50,55 +61,61 @@ def register_fcm_token(token: str) -> bool:
 
 
 def unregister_fcm_token(token: str) -> bool:
-    try:
-        redis_client = get_redis_client()
-        if not redis_client:
-            return False
-
-        redis_client.srem(Config.CACHE_KEYS['fcm_tokens'], token)
+    result = unregister_many([token])
+    if result["tokens"]:
         logger.info(f"🗑️ [FCM] Token silindi: {token[:20]}...")
+    return result["success"]
 
-        cursor = 0
-        device_hash = None
-        while True:
-            cursor, keys = redis_client.scan(cursor, match="fcm_token_map:*", count=100)
-            for key in keys:
-                val = redis_client.get(key)
-                if val:
-                    val_str = val.decode('utf-8') if isinstance(val, bytes) else val
-                    if val_str == token:
-                        key_str = key.decode('utf-8') if isinstance(key, bytes) else key
-                        device_hash = key_str.replace("fcm_token_map:", "")
-                        break
-            if device_hash or cursor == 0:
-                break
 
-        if device_hash:
-            redis_client.delete(f"fcm_token_map:{device_hash}")
-            logger.info(f"🗑️ [FCM] Token map silindi: {device_hash}")
+def unregister_many(tokens: List[str]) -> Dict:
+    """
+    Token'ları toplu siler: token set'i, son görülme kaydı, ters index, cihaz mapping'i ve cihazın alarmları.
+    Token → cihaz ters index'ten bulunur (SCAN yok); token sayısından bağımsız sabit round trip.
+    """
+    result = {"success": False, "tokens": 0, "devices": 0, "alarms": 0}
+    tokens = list(dict.fromkeys(token for token in tokens if token))
+    if not tokens:
+        result["success"] = True
+        return result
 
-            alarm_cursor   = 0
-            deleted_alarms = 0
-            while True:
-                alarm_cursor, alarm_keys = redis_client.scan(
-                    alarm_cursor, match=f"alarm:{device_hash}:*", count=100
-                )
-                if alarm_keys:
-                    redis_client.delete(*alarm_keys)
-                    deleted_alarms += len(alarm_keys)
-                if alarm_cursor == 0:
-                    break
-
-            if deleted_alarms > 0:
-                logger.info(f"🗑️ [FCM] {deleted_alarms} alarm silindi (cihaz: {device_hash})")
-        else:
-            logger.debug(f"🔍 [FCM] Token map bulunamadı, alarm temizleme atlandı")
+    try:
+        from services import alarm_store
+        from services.alarm_index import notify_alarm_change
 
-        return True
+        redis_client = get_redis_client()
+        if not redis_client:
+            return result
+
+        rev_keys = [alarm_store.token_rev_key(token) for token in tokens]
+        devices  = [alarm_store._text(device) for device in redis_client.mget(rev_keys)]
+        found    = [(token, device) for token, device in zip(tokens, devices) if device]
+
+        # Cihaz token'ını yenilediyse eski token'ın ters kaydı o cihazın alarmlarını silmemeli
+        current = redis_client.mget([alarm_store.token_map_key(device) for _, device in found]) if found else []
+        owners  = list(dict.fromkeys(
+            device for (token, device), mapped in zip(found, current) if alarm_store._text(mapped) == token
+        ))
+
+        pipe = redis_client.pipeline(transaction=False)
+        pipe.srem(Config.CACHE_KEYS['fcm_tokens'], *tokens)
+        pipe.zrem(Config.CACHE_KEYS['fcm_token_seen'], *tokens)
+        pipe.delete(*rev_keys)
+        if owners:
+            pipe.delete(*[alarm_store.token_map_key(device) for device in owners])
+        result["tokens"] = pipe.execute()[0]
+
+        removed = alarm_store.delete_alarms_for_users(redis_client, owners)
+        if removed:
+            notify_alarm_change(redis_client, removals=removed)
+
+        result.update(success=True, devices=len(owners), alarms=len(removed))
+        if owners:
+            logger.info(f"🗑️ [FCM] {len(owners)} cihaz mapping'i ve {len(removed)} alarm silindi")
+        return result
 
     except Exception as e:
-        logger.error(f"❌ [FCM] Token silme hatası: {e}")
-        return False
+        logger.error(f"❌ [FCM] Toplu token silme hatası: {e}")
+        return result
 
 
 def is_token_registered(token: str) -> bool:
@@ -115,7 +132,14 @@ def is_token_registered(token: str) -> bool:
         return False
 
 
-def cleanup_invalid_tokens() -> Dict:
+def cleanup_invalid_tokens(batches: Optional[Iterable[List[str]]] = None,
+                           on_valid: Optional[Callable[[List[str]], None]] = None) -> Dict:
+    """
+    Token'lar SSCAN ile akar (bellek sınırlı), 500'lük dry-run multicast'ler dispatcher'da paralel,
+    geçersizler FCM_CLEANUP_DELETE_BATCH'lik gruplar halinde unregister_many ile (pipeline) silinir.
+    batches verilmezse tüm token set'i; saatlik doğrulama dilimi kendi batch'lerini verir.
+    on_valid: dry-run'ı geçen token'lar (son görülme kaydı için).
+    """
     try:
         if not firebase_admin._apps:
             logger.error("❌ [CLEANUP] Firebase başlatılmamış, temizlik atlanıyor")
@@ -123,54 +147,50 @@ def cleanup_invalid_tokens() -> Dict:
 
         logger.info("🧹 [CLEANUP] Geçersiz token temizliği başlıyor...")
 
-        all_tokens = get_all_tokens()
-        if not all_tokens:
+        invalid = []
+        removed = 0
+
+        def flush():
+            nonlocal removed
+            if invalid:
+                result   = unregister_many(invalid)
+                removed += result.get("tokens", 0) if result.get("success") else 0
+                logger.info(f"🗑️ [CLEANUP] {len(invalid)} geçersiz token silindi "
+                            f"({result.get('devices', 0)} cihaz, {result.get('alarms', 0)} alarm)")
+                invalid.clear()
+
+        def collect(failures):
+            invalid.extend(token for token, err in failures if err and _is_invalid_token_error(err))
+            if len(invalid) >= Config.FCM_CLEANUP_DELETE_BATCH:
+                flush()
+
+        stats = fcm_dispatcher.dispatch(
+            get_tokens_generator(batch_size=FCM_BATCH_SIZE) if batches is None else batches,
+            _multicast_factory({"type": "dry_run"}, "normal"),
+            on_failures=collect,
+            dry_run=True,
+            on_sent=on_valid
+        )
+        flush()
+
+        if stats["total_tokens"] == 0:
             logger.info("ℹ️ [CLEANUP] Kontrol edilecek token yok")
             return {"success": True, "checked": 0, "removed": 0}
 
-        total_checked = 0
-        total_removed = 0
-
-        for i in range(0, len(all_tokens), FCM_BATCH_SIZE):
-            batch = all_tokens[i:i + FCM_BATCH_SIZE]
-
-            messages = [
-                messaging.Message(
-                    data={"type": "dry_run"},
-                    token=token,
-                    android=messaging.AndroidConfig(priority="normal")
-                )
-                for token in batch
-            ]
-
-            try:
-                response = messaging.send_each(messages, dry_run=True)
-                total_checked += len(batch)
-
-                for idx, send_response in enumerate(response.responses):
-                    if not send_response.success:
-                        err = send_response.exception
-                        if err and _is_invalid_token_error(err):
-                            unregister_fcm_token(batch[idx])
-                            total_removed += 1
-                            logger.info(f"🗑️ [CLEANUP] Geçersiz token silindi: {batch[idx][:20]}...")
-
-            except Exception as batch_err:
-                if _is_firebase_init_error(batch_err):
-                    logger.error(f"❌ [CLEANUP] Firebase init hatası: {batch_err}")
-                    break
-                logger.error(f"❌ [CLEANUP] Batch hatası: {batch_err}")
-
-            time.sleep(0.2)
-
-        logger.info(f"✅ [CLEANUP] Temizlik tamamlandı: {total_checked} kontrol edildi, {total_removed} silindi")
+        rate = round(stats["total_tokens"] / stats["duration_s"], 1) if stats["duration_s"] else 0.0
+        logger.info(
+            f"✅ [CLEANUP] Temizlik tamamlandı: {stats['total_tokens']} kontrol edildi, {removed} silindi "
+            f"({stats['duration_s']}s, {rate} token/sn)"
+        )
 
         return {
-            "success":   True,
-            "checked":   total_checked,
-            "removed":   total_removed,
-            "remaining": total_checked - total_removed,
-            "timestamp": datetime.now().isoformat()
+            "success":          True,
+            "checked":          stats["total_tokens"],
+            "removed":          removed,
+            "remaining":        stats["total_tokens"] - removed,
+            "duration_s":       stats["duration_s"],
+            "tokens_per_sec":   rate,
+            "timestamp":        datetime.now().isoformat()
         }
 
     except Exception as e:
@@ -180,7 +200,7 @@ def cleanup_invalid_tokens() -> Dict:
         return {"success": False, "error": str(e)}
 
 
-def get_tokens_generator(batch_size: int = 25) -> Generator[List[str], None, None]:
+def get_tokens_generator(batch_size: int = FCM_BATCH_SIZE) -> Generator[List[str], None, None]:
     redis_client = get_redis_client()
     if not redis_client:
         return
@@ -237,57 +257,22 @@ def get_token_count() -> int:
         return 0
 
 
-def _send_batch(
-    batch_tokens: List[str],
-    data_payload: Dict,
-    priority: str,
-    batch_num: int,
-    batch_count: int
-) -> Dict:
-    """Tek bir batch'i FCM'e gönderir. send_notification ve send_to_all tarafından ortak kullanılır."""
-    total_success     = 0
-    total_failure     = 0
-    failed_tokens     = []
-
-    logger.info(f"📤 [FCM] Batch {batch_num}/{batch_count} gönderiliyor ({len(batch_tokens)} token)...")
-
-    try:
-        response = messaging.send_each_for_multicast(
-            messaging.MulticastMessage(
-                tokens=batch_tokens,
-                data=data_payload,
-                android=messaging.AndroidConfig(priority=priority)
-            )
-        )
-
-        total_success += response.success_count
-        total_failure += response.failure_count
-
-        if response.failure_count > 0:
-            for idx, send_response in enumerate(response.responses):
-                if not send_response.success:
-                    err = send_response.exception
-                    if err and _is_invalid_token_error(err):
-                        failed_tokens.append(batch_tokens[idx])
-                        logger.debug(f"   ❌ Geçersiz token {idx+1}: {err}")
-                    else:
-                        logger.debug(f"   ⚠️ Geçici hata token {idx+1}: {err} (token korunuyor)")
-
-        logger.info(f"   ✅ Batch {batch_num}: {response.success_count} başarılı, {response.failure_count} başarısız")
-
-    except Exception as batch_error:
-        if _is_firebase_init_error(batch_error):
-            logger.error(f"❌ [FCM] Batch {batch_num} Firebase init hatası: {batch_error}")
-        else:
-            logger.error(f"❌ [FCM] Batch {batch_num} kritik hata: {batch_error}")
-        total_failure += len(batch_tokens)
+def _multicast_factory(data_payload: Dict, priority: str):
+    return lambda tokens: messaging.MulticastMessage(
+        tokens=tokens,
+        data=data_payload,
+        android=messaging.AndroidConfig(priority=priority)
+    )
 
-    if failed_tokens:
-        logger.warning(f"🗑️ [FCM] {len(failed_tokens)} geçersiz token temizleniyor...")
-        for token in failed_tokens:
-            unregister_fcm_token(token)
 
-    return {"success_count": total_success, "failure_count": total_failure}
+def _drop_invalid_tokens(failures: List) -> None:
+    """Dispatcher'ın kalıcı hataları: sadece geçersiz token'lar silinir, diğerleri korunur."""
+    invalid = [token for token, err in failures if err and _is_invalid_token_error(err)]
+    if len(invalid) < len(failures):
+        logger.debug(f"   ⚠️ {len(failures) - len(invalid)} token kalıcı hata aldı (token korunuyor)")
+    if invalid:
+        logger.warning(f"🗑️ [FCM] {len(invalid)} geçersiz token temizleniyor...")
+        unregister_many(invalid)
 
 
 def send_notification(
@@ -311,40 +296,34 @@ def send_notification(
         data_payload["title"] = title
         data_payload["body"]  = body
 
-        total_success = 0
-        total_failure = 0
-        total_tokens  = len(tokens)
-        batch_count   = (total_tokens + FCM_BATCH_SIZE - 1) // FCM_BATCH_SIZE
+        total_tokens = len(tokens)
+        logger.info(f"📦 [FCM] {total_tokens} token, {(total_tokens + FCM_BATCH_SIZE - 1) // FCM_BATCH_SIZE} batch'e bölünüyor...")
 
-        logger.info(f"📦 [FCM] {total_tokens} token, {batch_count} batch'e bölünüyor...")
-
-        for i in range(0, total_tokens, FCM_BATCH_SIZE):
-            batch_tokens = tokens[i:i + FCM_BATCH_SIZE]
-            batch_num    = (i // FCM_BATCH_SIZE) + 1
-
-            result         = _send_batch(batch_tokens, data_payload, priority, batch_num, batch_count)
-            total_success += result["success_count"]
-            total_failure += result["failure_count"]
-
-            if batch_num < batch_count:
-                time.sleep(0.1)
+        stats = fcm_dispatcher.dispatch(
+            (tokens[i:i + FCM_BATCH_SIZE] for i in range(0, total_tokens, FCM_BATCH_SIZE)),
+            _multicast_factory(data_payload, priority),
+            on_failures=_drop_invalid_tokens
+        )
 
         logger.info(f"🎉 [FCM] Gönderim tamamlandı!")
         logger.info(f"   📊 Toplam: {total_tokens} token")
-        logger.info(f"   ✅ Başarılı: {total_success}")
-        logger.info(f"   ❌ Başarısız: {total_failure}")
+        logger.info(f"   ✅ Başarılı: {stats['success_count']}")
+        logger.info(f"   ❌ Başarısız: {stats['failure_count']}")
         logger.info(f"   📝 Başlık: {title}")
         logger.info(f"   📄 Mesaj: {body[:50]}...")
 
         set_cache(Config.CACHE_KEYS['fcm_last_notification'], str(datetime.now().timestamp()), ttl=86400)
 
         return {
-            "success":       True,
-            "success_count": total_success,
-            "failure_count": total_failure,
-            "total_tokens":  total_tokens,
-            "batch_count":   batch_count,
-            "timestamp":     datetime.now().isoformat()
+            "success":          True,
+            "success_count":    stats["success_count"],
+            "failure_count":    stats["failure_count"],
+            "total_tokens":     total_tokens,
+            "batch_count":      stats["batch_count"],
+            "retries":          stats["retries"],
+            "duration_s":       stats["duration_s"],
+            "messages_per_sec": stats["messages_per_sec"],
+            "timestamp":        datetime.now().isoformat()
         }
 
     except Exception as e:
@@ -354,6 +333,23 @@ def send_notification(
         return {"success": False, "error": str(e)}
 
 
+def with_price_snapshot(data: Dict, profile: str = "jeweler", codes: Optional[List[str]] = None) -> Dict:
+    """
+    data["prices"]: generation'lı kompakt fiyat özeti; uygulama push'la açılınca listeyi yeniden çekmeden
+    çizer, generation'ı eskiyse arka planda yeniler. Özet yoksa payload olduğu gibi kalır.
+    """
+    if not Config.PUSH_PRICE_SNAPSHOT:
+        return data
+    try:
+        from services.market_service import get_push_snapshot
+        snapshot = get_push_snapshot(profile, codes)
+        if snapshot:
+            data["prices"] = snapshot
+    except Exception as e:
+        logger.warning(f"⚠️ [FCM] Fiyat özeti eklenemedi: {e}")
+    return data
+
+
 def send_to_all(title: str, body: str, data: Optional[Dict] = None, priority: str = "high") -> Dict:
     try:
         if not firebase_admin._apps:
@@ -362,50 +358,39 @@ def send_to_all(title: str, body: str, data: Optional[Dict] = None, priority: st
 
         logger.info("📢 [FCM] Toplu bildirim gönderiliyor (Generator modu)...")
 
-        data_payload          = dict(data) if data else {}
+        data_payload          = with_price_snapshot(dict(data) if data else {})
         data_payload["title"] = title
         data_payload["body"]  = body
 
-        total_success = 0
-        total_failure = 0
-        total_tokens  = 0
-        batch_num     = 0
-
-        # Toplam token sayısını batch sayısı için önceden al
-        total_token_count = get_token_count()
-        batch_count       = (total_token_count + FCM_BATCH_SIZE - 1) // FCM_BATCH_SIZE if total_token_count else 1
-
-        for batch_tokens in get_tokens_generator(batch_size=FCM_BATCH_SIZE):
-            if not batch_tokens:
-                continue
-
-            batch_num    += 1
-            total_tokens += len(batch_tokens)
-
-            result         = _send_batch(batch_tokens, data_payload, priority, batch_num, batch_count)
-            total_success += result["success_count"]
-            total_failure += result["failure_count"]
-
-            time.sleep(0.2)
+        # SSCAN batch'leri doğrudan dispatcher'a akar, tüm token'lar belleğe alınmaz
+        stats = fcm_dispatcher.dispatch(
+            get_tokens_generator(batch_size=FCM_BATCH_SIZE),
+            _multicast_factory(data_payload, priority),
+            on_failures=_drop_invalid_tokens
+        )
 
-        if total_tokens == 0:
+        if stats["total_tokens"] == 0:
             logger.warning("⚠️ [FCM] Hiç kayıtlı cihaz yok!")
             return {"success": False, "error": "No registered devices"}
 
         logger.info(f"🏁 [FCM] Toplu gönderim tamamlandı!")
-        logger.info(f"   📊 Toplam: {total_tokens} token")
-        logger.info(f"   ✅ Başarılı: {total_success}")
-        logger.info(f"   ❌ Başarısız: {total_failure}")
+        logger.info(f"   📊 Toplam: {stats['total_tokens']} token")
+        logger.info(f"   ✅ Başarılı: {stats['success_count']}")
+        logger.info(f"   ❌ Başarısız: {stats['failure_count']}")
+        logger.info(f"   🚚 Hız: {stats['messages_per_sec']} mesaj/sn ({stats['duration_s']}s)")
 
         set_cache(Config.CACHE_KEYS['fcm_last_notification'], str(datetime.now().timestamp()), ttl=86400)
 
         return {
-            "success":       True,
-            "total_sent":    total_tokens,
-            "success_count": total_success,
-            "failure_count": total_failure,
-            "batch_count":   batch_num,
-            "timestamp":     datetime.now().isoformat()
+            "success":          True,
+            "total_sent":       stats["total_tokens"],
+            "success_count":    stats["success_count"],
+            "failure_count":    stats["failure_count"],
+            "batch_count":      stats["batch_count"],
+            "retries":          stats["retries"],
+            "duration_s":       stats["duration_s"],
+            "messages_per_sec": stats["messages_per_sec"],
+            "timestamp":        datetime.now().isoformat()
         }
 
     except Exception as e:
@@ -415,7 +400,7 @@ def send_to_all(title: str, body: str, data: Optional[Dict] = None, priority: st
         return {"success": False, "error": str(e)}
 
 
-def send_alarm_notification(
+def send_alarm_notification_status(
     fcm_token: str,
     currency_code: str,
     currency_name: str,
@@ -425,15 +410,20 @@ def send_alarm_notification(
     start_price: Optional[float] = None,
     alarm_type: Optional[str] = None,
     percent_value: Optional[float] = None,
-    percent_direction: Optional[str] = None
-) -> bool:
+    percent_direction: Optional[str] = None,
+    profile: str = "jeweler"
+) -> Tuple[str, Optional[Exception]]:
+    """
+    Alarm push'u; dönüş (durum, hata). Outbox yeniden denemeyi duruma göre yapar:
+    ALARM_RETRY geçici (429 / 5xx), ALARM_INVALID_TOKEN token silinmeli, ALARM_BAD_BODY / ALARM_FAILED kalıcı.
+    """
     try:
         alarm_mode = alarm_mode.upper()
 
         if alarm_mode == "PRICE":
             if not target_price or not alarm_type:
                 logger.error("❌ [ALARM] PRICE modunda target_price ve alarm_type gerekli!")
-                return False
+                return ALARM_BAD_BODY, None
 
             if not start_price:
                 start_price = current_price
@@ -462,7 +452,7 @@ def send_alarm_notification(
         elif alarm_mode == "PERCENT":
             if not start_price or not percent_value or not percent_direction:
                 logger.error("❌ [ALARM] PERCENT modunda start_price, percent_value, percent_direction gerekli!")
-                return False
+                return ALARM_BAD_BODY, None
 
             change_from_start = current_price - start_price
             actual_percent    = (change_from_start / start_price) * 100 if start_price > 0 else 0
@@ -485,15 +475,27 @@ def send_alarm_notification(
 
         else:
             logger.error(f"❌ [ALARM] Geçersiz alarm_mode: {alarm_mode}")
-            return False
+            return ALARM_BAD_BODY, None
 
-        messaging.send(
-            messaging.Message(
-                data=data,
-                token=fcm_token,
-                android=messaging.AndroidConfig(priority='high')
+        with_price_snapshot(data, profile, [currency_code])
+
+        # Alarm push'ları aynı FCM kotasında önceliklidir: broadcast bekleyen alarm varken kota alamaz
+        fcm_dispatcher.bucket.acquire(1, urgent=True)
+        try:
+            messaging.send(
+                messaging.Message(
+                    data=data,
+                    token=fcm_token,
+                    android=messaging.AndroidConfig(priority='high')
+                )
             )
-        )
+        except Exception as e:
+            logger.error(f"❌ [ALARM] FCM gönderim hatası ({currency_code}): {e}")
+            if is_retryable(e):
+                return ALARM_RETRY, e
+            if _is_invalid_token_error(e):
+                return ALARM_INVALID_TOKEN, e
+            return ALARM_FAILED, e
 
         logger.info(f"✅ [ALARM] Bildirim gönderildi: {currency_name} ({currency_code}) - {alarm_status}")
 
@@ -502,13 +504,34 @@ def send_alarm_notification(
         else:
             logger.info(f"   📊 Başlangıç: ₺{start_price:.2f} | Anlık: ₺{current_price:.2f} | Değişim: {change_symbol}{change_from_start:.2f} TL ({change_symbol}{actual_percent:.2f}%)")
 
-        return True
+        return ALARM_SENT, None
 
     except Exception as e:
+        # Gönderim öncesi hata: gövde biçimlendirilemedi, tekrar denemek aynı sonucu verir
         logger.error(f"❌ [ALARM] Bildirim gönderme hatası: {e}")
         import traceback
         logger.error(f"   Traceback: {traceback.format_exc()}")
-        return False
+        return ALARM_BAD_BODY, e
+
+
+def send_alarm_notification(
+    fcm_token: str,
+    currency_code: str,
+    currency_name: str,
+    current_price: float,
+    alarm_mode: str = "PRICE",
+    target_price: Optional[float] = None,
+    start_price: Optional[float] = None,
+    alarm_type: Optional[str] = None,
+    percent_value: Optional[float] = None,
+    percent_direction: Optional[str] = None,
+    profile: str = "jeweler"
+) -> bool:
+    status, _ = send_alarm_notification_status(
+        fcm_token, currency_code, currency_name, current_price, alarm_mode, target_price, start_price,
+        alarm_type, percent_value, percent_direction, profile
+    )
+    return status == ALARM_SENT
 
 
 def send_price_alert(currency_code: str, price: float, change_percent: float) -> Dict:
@@ -547,7 +570,9 @@ def send_daily_summary() -> Dict:
             "timestamp":    str(datetime.now().timestamp())
         }
 
-        result = send_to_all(
+        # Outbox açıksa kuyruğa yazılır (restart'a dayanıklı), değilse doğrudan send_to_all
+        from utils.notification_outbox import enqueue_broadcast
+        result = enqueue_broadcast(
             title=notification_content['title'],
             body=notification_content['body'],
             data=data
@@ -556,13 +581,15 @@ def send_daily_summary() -> Dict:
         if result.get('success'):
             recipient_count = result.get('success_count', 0)
             logger.info(
-                f"✅ [DAILY SUMMARY] {notification_content['type'].upper()} bildirimi gönderildi "
-                f"({recipient_count} kullanıcı)"
+                f"✅ [DAILY SUMMARY] {notification_content['type'].upper()} bildirimi "
+                + (f"kuyruğa alındı (iş: {result['job_id']})" if result.get('queued') else f"gönderildi ({recipient_count} kullanıcı)")
             )
             return {
                 'success':         True,
                 'type':            notification_content['type'],
                 'recipient_count': recipient_count,
+                'queued':          result.get('queued', False),
+                'job_id':          result.get('job_id'),
                 'title':           notification_content['title'],
                 'body':            notification_content['body']
             }
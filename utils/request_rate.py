@@ -0,0 +1,105 @@
+"""
+Request Rate - Dakikalık API istek sayaçları
+=============================================
+✅ after_request'te process içinde sayılır, en fazla REQUEST_RATE_FLUSH_S'de bir tek pipeline ile
+   dakikalık Redis hash'ine (tüm worker'lar aynı hash'e HINCRBY)
+✅ Alanlar: total + route kuralı (/api/currency/all gibi; kardinalite route sayısıyla sınırlı)
+✅ traffic_around(): bir anın öncesi / sonrası dakikalık seri, ortalama, varyans ve tepe
+   (broadcast sonrası uygulama açılış dalgasını ölçmek için)
+"""
+
+import logging
+import statistics
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from config import Config
+from utils.cache import get_redis_client
+
+logger = logging.getLogger("KuraBak.RequestRate")
+
+_pending    = Counter()
+_lock       = threading.Lock()
+_last_flush = time.time()
+
+
+def _minute_key(moment: float) -> str:
+    return f"{Config.CACHE_KEYS['api_request_stats']}:{datetime.fromtimestamp(moment).strftime('%Y%m%d%H%M')}"
+
+
+def record(rule: str):
+    """Her API isteğinde çağrılır; Redis'e sadece flush aralığında gidilir."""
+    global _last_flush
+    now = time.time()
+    with _lock:
+        minute = _minute_key(now)
+        _pending[(minute, "total")] += 1
+        _pending[(minute, rule)]    += 1
+        if now - _last_flush < Config.REQUEST_RATE_FLUSH_S:
+            return
+        pending, _last_flush = dict(_pending), now
+        _pending.clear()
+    _flush(pending)
+
+
+def _flush(pending: Dict):
+    redis_client = get_redis_client()
+    if not redis_client:
+        return
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        for (minute, field), amount in pending.items():
+            pipe.hincrby(minute, field, amount)
+        for minute in {minute for minute, _ in pending}:
+            pipe.expire(minute, Config.REQUEST_RATE_TTL)
+        pipe.execute()
+    except Exception as e:
+        logger.warning(f"⚠️ [REQ RATE] Sayaçlar yazılamadı: {e}")
+
+
+def _summary(series: List[int]) -> dict:
+    if not series:
+        return {"minutes": 0}
+    mean = statistics.fmean(series)
+    return {
+        "minutes":      len(series),
+        "mean_rpm":     round(mean, 1),
+        "variance":     round(statistics.pvariance(series), 1),
+        "peak_rpm":     max(series),
+        "peak_to_mean": round(max(series) / mean, 2) if mean else None,
+    }
+
+
+def traffic_around(moment: float, before_min: int, after_min: int, field: str = "total",
+                   redis_client=None) -> Optional[dict]:
+    """moment'ten önceki before_min dakika (taban) ile sonraki after_min dakikanın dakikalık istek dağılımı."""
+    try:
+        redis_client = redis_client or get_redis_client()
+        if not redis_client:
+            return None
+
+        start   = int(moment // 60 * 60) - before_min * 60
+        minutes = [start + i * 60 for i in range(before_min + after_min)]
+        pipe    = redis_client.pipeline(transaction=False)
+        for minute in minutes:
+            pipe.hget(_minute_key(minute), field)
+        counts = [int(value or 0) for value in pipe.execute()]
+
+        # Henüz gelmemiş dakikalar seriye girmez
+        now    = time.time()
+        counts = [count for minute, count in zip(minutes, counts) if minute + 60 <= now]
+
+        before, after = counts[:before_min], counts[before_min:]
+        return {
+            "field":  field,
+            "before": _summary(before),
+            "after":  _summary(after),
+            "series": counts,
+        }
+
+    except Exception as e:
+        logger.error(f"❌ [REQ RATE] Trafik okunamadı: {e}")
+        return None
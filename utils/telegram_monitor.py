@@ -203,6 +203,61 @@ class TelegramMonitor:
                 f"• Hatalar: `{metrics.get('errors', 0)}`",
             ]
 
+            # Worker'ın hazırladığı movers özeti (elle sıralama yok)
+            try:
+                from services.market_service import get_market_movers
+                movers = get_market_movers("jeweler")
+                if movers:
+                    summary = movers["all"]["stats"]
+                    lines.append(f"\n📈 *PİYASA ÖZETİ* (Kuyumcu)")
+                    lines.append(
+                        f"• ⬆️ {summary['advancers']} • ⬇️ {summary['decliners']} • "
+                        f"➖ {summary['unchanged']} | Ort: *%{summary['avg_change']:+.2f}*"
+                    )
+                    for label, key in (("🚀 Yükselen", "gainers"), ("🔻 Düşen", "losers")):
+                        top = movers["all"][key][:3]
+                        if top:
+                            lines.append(
+                                f"• {label}: " +
+                                ", ".join(f"{m['code']} %{m['change_percent']:+.2f}" for m in top)
+                            )
+            except Exception as e:
+                logger.warning(f"⚠️ [RAPOR] piyasa özeti bölümü atlandı: {e}")
+
+            # Alarm gecikmesi: fiyat yayını → tespit → FCM kabulü (son 24 saat, tüm node'lar)
+            try:
+                from services.alarm_latency import get_latency_report
+                latency = get_latency_report()
+                total_stage = latency["stages"].get("total") or {}
+                if total_stage.get("count"):
+                    seconds = lambda ms: f"{ms / 1000:.1f}s" if ms is not None else "-"
+                    lines.append(f"\n⏱️ *ALARM GECİKMESİ* ({latency['window_hours']} saat)")
+                    for label, stage in (("Yayın→Tespit", "detect"), ("Tespit→FCM", "deliver"), ("Toplam", "total")):
+                        data = latency["stages"][stage]
+                        lines.append(
+                            f"• {label}: p50 `{seconds(data['p50_ms'])}` • p95 `{seconds(data['p95_ms'])}` "
+                            f"• p99 `{seconds(data['p99_ms'])}` ({data['count']})"
+                        )
+            except Exception as e:
+                logger.warning(f"⚠️ [RAPOR] alarm gecikmesi bölümü atlandı: {e}")
+
+            # Son broadcast'in API trafiğine etkisi: gönderim öncesi taban vs yayılma penceresi
+            try:
+                from utils.notification_outbox import get_last_broadcast_status
+                broadcast = get_last_broadcast_status()
+                traffic   = (broadcast or {}).get("api_traffic") or {}
+                before, after = traffic.get("before") or {}, traffic.get("after") or {}
+                if before.get("minutes") and after.get("minutes"):
+                    lines.append(f"\n📡 *PUSH SONRASI TRAFİK* ({broadcast.get('title', '-')}, "
+                                 f"{broadcast.get('spread_s', 0)}s yayılma)")
+                    for label, data in (("Önce", before), ("Sonra", after)):
+                        lines.append(
+                            f"• {label}: ort `{data['mean_rpm']}`/dk • tepe `{data['peak_rpm']}` "
+                            f"• varyans `{data['variance']}`"
+                        )
+            except Exception as e:
+                logger.warning(f"⚠️ [RAPOR] push sonrası trafik bölümü atlandı: {e}")
+
             if special_events:
                 lines.append(f"\n🔔 *ÖZEL OLAYLAR*")
                 for event in special_events:
@@ -0,0 +1,175 @@
+"""
+Token Validator - Saatlik, kaldığı yerden devam eden FCM token doğrulaması
+===========================================================================
+✅ Pazar gecesi tek seferlik tam tarama yerine her saat bir dilim: set büyüdükçe iş haftaya yayılır
+✅ Dilim = SCARD / FCM_VALIDATE_CYCLE_HOURS (en az FCM_VALIDATE_MIN_SLICE): set haftada bir kez baştan sona
+✅ SSCAN cursor'ı Redis'te saklanır; restart / deploy sonrası kalınan yerden devam edilir
+✅ Son görülme ZSET'i (token kaydı, alarm kurma / sync, başarılı doğrulama):
+   FCM_TOKEN_STALE_DAYS'tir görülmeyenler dilimin önüne alınır, yakın zamanda görülenler taramada atlanır
+✅ Dry-run cleanup_invalid_tokens ile (paralel dispatcher, kota / backoff); geçersizler hemen silinir
+✅ Tur sayaçları (kontrol / silinen) saklanır, tur bitince özet döner
+"""
+
+import logging
+import math
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import firebase_admin
+
+from config import Config
+from utils.cache import get_redis_client
+
+logger = logging.getLogger("KuraBak.TokenValidator")
+
+
+def _text(value) -> str:
+    return value.decode('utf-8') if isinstance(value, bytes) else value
+
+
+def mark_seen(redis_client, tokens: Iterable[str], when: Optional[float] = None):
+    """Token'ların son görülme anını günceller; pipeline da verilebilir."""
+    tokens = [token for token in tokens if token]
+    if not tokens:
+        return
+    try:
+        when = when or time.time()
+        redis_client.zadd(Config.CACHE_KEYS['fcm_token_seen'], {token: when for token in tokens})
+    except Exception as e:
+        logger.warning(f"⚠️ [TOKEN CHECK] Son görülme yazılamadı: {e}")
+
+
+def _slice_size(redis_client) -> int:
+    total = redis_client.scard(Config.CACHE_KEYS['fcm_tokens'])
+    return max(Config.FCM_VALIDATE_MIN_SLICE, math.ceil(total / Config.FCM_VALIDATE_CYCLE_HOURS))
+
+
+def _stale_tokens(redis_client, cutoff: float, limit: int) -> List[str]:
+    """En uzun süredir görülmeyenler önce."""
+    tokens = redis_client.zrangebyscore(Config.CACHE_KEYS['fcm_token_seen'], '-inf', cutoff, start=0, num=limit)
+    return [_text(token) for token in tokens]
+
+
+def _scan_slice(redis_client, cursor: int, budget: int) -> Tuple[List[str], int]:
+    """Kayıtlı cursor'dan en az budget token; cursor 0 dönerse tur tamamlanmıştır."""
+    scanned = []
+    while True:
+        cursor, tokens = redis_client.sscan(Config.CACHE_KEYS['fcm_tokens'], cursor=cursor,
+                                            count=Config.FCM_BATCH_SIZE)
+        scanned.extend(_text(token) for token in tokens)
+        if int(cursor) == 0 or len(scanned) >= budget:
+            return scanned, int(cursor)
+
+
+def _not_recently_seen(redis_client, tokens: List[str], cutoff: float) -> List[str]:
+    """Son görülmesi cutoff'tan yeni olanlar atlanır; kaydı olmayan (eski) token'lar kontrol edilir."""
+    if not tokens:
+        return []
+    pipe = redis_client.pipeline(transaction=False)
+    for token in tokens:
+        pipe.zscore(Config.CACHE_KEYS['fcm_token_seen'], token)
+    return [token for token, seen in zip(tokens, pipe.execute()) if seen is None or float(seen) < cutoff]
+
+
+def validate_token_slice() -> Dict:
+    """Saatlik dilim: önce uzun süredir görülmeyenler, sonra kayıtlı cursor'dan devam eden SSCAN."""
+    try:
+        if not firebase_admin._apps:
+            logger.error("❌ [TOKEN CHECK] Firebase başlatılmamış, doğrulama atlanıyor")
+            return {"success": False, "error": "Firebase not initialized"}
+
+        redis_client = get_redis_client()
+        if not redis_client:
+            return {"success": False, "error": "Redis yok"}
+
+        from utils.notification_service import FCM_BATCH_SIZE, cleanup_invalid_tokens
+
+        start     = time.time()
+        state_key = Config.CACHE_KEYS['fcm_validation']
+        cutoff    = start - Config.FCM_TOKEN_STALE_DAYS * 86400
+        budget    = _slice_size(redis_client)
+        cursor    = int(_text(redis_client.hget(state_key, "cursor")) or 0)
+
+        stale            = _stale_tokens(redis_client, cutoff, budget // 2)
+        scanned, cursor  = _scan_slice(redis_client, cursor, budget - len(stale))
+        candidates       = list(dict.fromkeys(stale + _not_recently_seen(redis_client, scanned, cutoff)))
+        pass_complete    = cursor == 0
+
+        # Tam temizlikle aynı yol: paralel dry-run, geçersizler unregister_many ile hemen silinir
+        valid   = []
+        cleanup = cleanup_invalid_tokens(
+            (candidates[i:i + FCM_BATCH_SIZE] for i in range(0, len(candidates), FCM_BATCH_SIZE)),
+            on_valid=valid.extend,
+        )
+        if not cleanup.get("success"):
+            return {"success": False, "error": cleanup.get("error")}
+        removed = cleanup.get("removed", 0)
+        mark_seen(redis_client, valid, when=time.time())
+
+        pipe = redis_client.pipeline(transaction=False)
+        pipe.hset(state_key, mapping={"cursor": cursor, "last_run": time.time()})
+        pipe.hsetnx(state_key, "pass_started", start)
+        pipe.hincrby(state_key, "pass_checked", len(candidates))
+        pipe.hincrby(state_key, "pass_removed", removed)
+        pipe.execute()
+
+        result = {
+            "success":       True,
+            "checked":       len(candidates),
+            "stale":         len(stale),
+            "scanned":       len(scanned),
+            "removed":       removed,
+            "cursor":        cursor,
+            "pass_complete": pass_complete,
+            "duration_s":    round(time.time() - start, 2),
+        }
+
+        if pass_complete:
+            state = {_text(k): _text(v) for k, v in redis_client.hgetall(state_key).items()}
+            result["pass"] = {
+                "checked":    int(state.get("pass_checked", 0)),
+                "removed":    int(state.get("pass_removed", 0)),
+                "duration_h": round((time.time() - float(state.get("pass_started", start))) / 3600, 1),
+            }
+            pipe = redis_client.pipeline(transaction=False)
+            pipe.hdel(state_key, "pass_started", "pass_checked", "pass_removed")
+            pipe.hset(state_key, mapping={
+                "last_pass_finished": time.time(),
+                "last_pass_checked":  result["pass"]["checked"],
+                "last_pass_removed":  result["pass"]["removed"],
+            })
+            pipe.execute()
+
+        logger.info(
+            f"🔎 [TOKEN CHECK] {len(candidates)} token kontrol edildi ({len(stale)} eski, {len(scanned)} tarandı), "
+            f"{removed} silindi, {result['duration_s']}s" + (" — tur tamamlandı" if pass_complete else "")
+        )
+        return result
+
+    except Exception as e:
+        logger.error(f"❌ [TOKEN CHECK] Doğrulama hatası: {e}")
+        return {"success": False, "error": str(e)}
+
+
+def get_validation_status() -> Dict:
+    try:
+        redis_client = get_redis_client()
+        if not redis_client:
+            return {}
+        state = {_text(k): _text(v) for k, v in redis_client.hgetall(Config.CACHE_KEYS['fcm_validation']).items()}
+        stale = redis_client.zcount(Config.CACHE_KEYS['fcm_token_seen'], '-inf',
+                                    time.time() - Config.FCM_TOKEN_STALE_DAYS * 86400)
+        return {
+            "cursor":             int(state.get("cursor", 0)),
+            "pass_checked":       int(state.get("pass_checked", 0)),
+            "pass_removed":       int(state.get("pass_removed", 0)),
+            "last_run":           float(state["last_run"]) if "last_run" in state else None,
+            "last_pass_finished": float(state["last_pass_finished"]) if "last_pass_finished" in state else None,
+            "last_pass_checked":  int(state.get("last_pass_checked", 0)),
+            "last_pass_removed":  int(state.get("last_pass_removed", 0)),
+            "stale_tokens":       stale,
+            "slice_size":         _slice_size(redis_client),
+        }
+    except Exception as e:
+        logger.error(f"❌ [TOKEN CHECK] Durum hatası: {e}")
+        return {"error": str(e)}